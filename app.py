@@ -1,7 +1,7 @@
 import streamlit as st
 import computervision
 
-from services.supabase_client import supabase
+from services.supabase_client import get_health_monitor
 
 # --------------------------------------------------
 # Page Configuration
@@ -19,12 +19,15 @@ st.divider()
 # --------------------------------------------------
 # Supabase Status
 # --------------------------------------------------
-try:
-    supabase.table("profiles").select("id").limit(1).execute()
+# Probed on a background thread; reruns only read the cached result.
+status = get_health_monitor().status()
+if status["ok"] is None:
+    st.sidebar.info("🟡 Checking Supabase…")
+elif status["ok"]:
     st.sidebar.success("🟢 Supabase Connected")
-
-except Exception:
+else:
     st.sidebar.error("🔴 Supabase Offline")
+    st.sidebar.caption(status["error"])
 
 # --------------------------------------------------
 # Launch Application
@@ -0,0 +1,9 @@
+"""
+Offline throughput benchmarks for face and motion detection.
+
+    python -m benchmarks.run --suite all --save-baseline
+    python -m benchmarks.run --suite all --compare      # exits 1 on regression
+
+Everything is generated locally (or loaded from --images), so the suite runs
+on a CPU-only machine without network access.
+"""
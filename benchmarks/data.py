@@ -0,0 +1,90 @@
+"""Deterministic test inputs for the benchmarks."""
+import glob
+import os
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+
+def _background(width, height, rng):
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 90 + 60 * np.sin(xx / 97.0) * np.cos(yy / 73.0)
+    noise = rng.normal(0, 12, (height, width)).astype(np.float32)
+    gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+
+
+def _draw_face(img, cx, cy, size):
+    """Crude shaded face: the contrast pattern Haar features respond to."""
+    axes = (size // 2, int(size * 0.62))
+    cv2.ellipse(img, (cx, cy), axes, 0, 0, 360, (205, 170, 150), -1)
+    eye_dy, eye_dx = size // 6, size // 5
+    for sx in (-1, 1):
+        cv2.ellipse(img, (cx + sx * eye_dx, cy - eye_dy), (size // 9, size // 16), 0, 0, 360, (40, 30, 30), -1)
+        cv2.line(img, (cx + sx * eye_dx - size // 8, cy - eye_dy - size // 8),
+                 (cx + sx * eye_dx + size // 8, cy - eye_dy - size // 8), (60, 40, 30), max(1, size // 25))
+    cv2.line(img, (cx, cy - size // 12), (cx, cy + size // 8), (150, 110, 100), max(1, size // 30))
+    cv2.ellipse(img, (cx, cy + size // 4), (size // 5, size // 14), 0, 0, 360, (120, 60, 60), -1)
+
+
+def face_image(width, height, faces=4, face_size=None, seed=0) -> np.ndarray:
+    """RGB image with `faces` synthetic faces on a textured background."""
+    rng = np.random.default_rng(seed)
+    img = _background(width, height, rng)
+    size = face_size or max(40, min(width, height) // 6)
+    for _ in range(faces):
+        cx = int(rng.integers(size, max(size + 1, width - size)))
+        cy = int(rng.integers(size, max(size + 1, height - size)))
+        _draw_face(img, cx, cy, size)
+    return img
+
+
+def motion_pair(width, height, moving=5, shift=None, seed=0):
+    """Two RGB frames where `moving` blobs have moved by `shift` pixels."""
+    rng = np.random.default_rng(seed)
+    a = _background(width, height, rng)
+    b = a.copy()
+    shift = shift or max(4, width // 40)
+    for _ in range(moving):
+        w, h = int(rng.integers(width // 30, width // 8)), int(rng.integers(height // 30, height // 8))
+        x, y = int(rng.integers(0, width - w - shift)), int(rng.integers(0, height - h))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(a, (x, y), (x + w, y + h), color, -1)
+        cv2.rectangle(b, (x + shift, y), (x + shift + w, y + h), color, -1)
+    return a, b
+
+
+def write_video(path, width, height, frames=120, fps=25, seed=0) -> str:
+    """MJPG .avi with a few blobs drifting across a static background."""
+    rng = np.random.default_rng(seed)
+    background = cv2.cvtColor(_background(width, height, rng), cv2.COLOR_RGB2BGR)
+    blobs = [(int(rng.integers(0, width)), int(rng.integers(0, height)),
+              int(rng.integers(-6, 7)), int(rng.integers(-4, 5))) for _ in range(4)]
+    size = max(8, width // 20)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for t in range(frames):
+        frame = background.copy()
+        for x, y, dx, dy in blobs:
+            cx, cy = (x + dx * t) % width, (y + dy * t) % height
+            cv2.circle(frame, (cx, cy), size, (40, 200, 240), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def load_images(directory, limit=None):
+    """Yield (name, RGB array) for user-supplied images in `directory`."""
+    paths = sorted(
+        p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(directory, f"*.{ext}"))
+    )
+    for path in paths[:limit]:
+        bgr = cv2.imread(path)
+        if bgr is not None:
+            yield os.path.basename(path), cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
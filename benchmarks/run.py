@@ -0,0 +1,303 @@
+"""
+Parameter-sweep benchmark for the local detectors.
+
+Each case runs the same pipeline the Streamlit modules use (minus widgets and
+drawing) for `--repeats` timed iterations after a warm-up, and reports
+latency percentiles and throughput. Memory is measured in one extra,
+untimed run: peak Python allocations (tracemalloc, which slows Python code
+too much to leave on while timing) and, on Linux, the peak RSS growth,
+which covers OpenCV's native buffers. The process RSS high-water mark is
+reported as well. `--save-baseline` writes the report; `--compare` reruns the
+sweep and fails when a case's p50 regresses by more than `--tolerance`.
+
+    python -m benchmarks.run --suite face --quick
+    python -m benchmarks.run --suite all --save-baseline
+    python -m benchmarks.run --suite all --compare --tolerance 0.25
+"""
+import argparse
+import ctypes
+import ctypes.util
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks import data
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "baseline.json")
+
+FACE_SWEEP = {
+    "resolution": ["480p", "720p", "1080p", "12mp"],
+    "scale_factor": [1.05, 1.1, 1.2],
+    "min_neighbors": [3, 5, 8],
+    "min_size": [30, 60],
+    "faces": [1, 8],
+}
+MOTION_SWEEP = {
+    "resolution": ["480p", "720p", "1080p", "12mp"],
+    "threshold": [15, 25, 50],
+}
+VIDEO_SWEEP = {
+    "resolution": ["480p", "720p", "1080p"],
+    "model": ["Running average", "MOG2", "KNN"],
+}
+QUICK = {
+    "face": {"resolution": ["480p", "1080p"], "scale_factor": [1.1], "min_neighbors": [5],
+             "min_size": [30], "faces": [4]},
+    "motion": {"resolution": ["480p", "1080p"], "threshold": [25]},
+    "video": {"resolution": ["480p"], "model": ["Running average", "MOG2"]},
+}
+
+
+def _grid(sweep):
+    keys = list(sweep)
+    for values in itertools.product(*(sweep[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def _case_id(kind, params):
+    return kind + ":" + ",".join(f"{k}={v}" for k, v in params.items())
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _status_mb(field):
+    """VmRSS / VmHWM from /proc/self/status in MiB, or None off Linux."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _malloc_trim():
+    """Hand freed heap pages back to the OS (glibc), so earlier runs' buffers don't hide new growth."""
+    try:
+        ctypes.CDLL(ctypes.util.find_library("c")).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+def _peak_rss_delta_mb(fn):
+    """Peak RSS growth while `fn` runs, native allocations included (Linux only, else None)."""
+    _malloc_trim()
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")  # resets VmHWM to the current RSS
+    except OSError:
+        return None
+    before = _status_mb("VmRSS")
+    fn()
+    peak = _status_mb("VmHWM")
+    return round(max(0.0, peak - before), 2) if before is not None and peak is not None else None
+
+
+def _memory(fn) -> dict:
+    """Peak traced Python allocation and peak RSS growth of one untimed call."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_traced_mb": round(peak / (1024 * 1024), 2), "peak_rss_delta_mb": _peak_rss_delta_mb(fn)}
+
+
+def _measure(fn, repeats, warmup=1):
+    """Time `fn` untraced, then measure memory in a separate pass; returns (latencies_ms, memory, last_result)."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, _memory(fn), result
+
+
+def _summary(latencies, units_per_call, unit):
+    arr = np.asarray(latencies)
+    p50 = float(np.percentile(arr, 50))
+    return {
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+        f"{unit}_per_s": round(units_per_call * 1000 / p50, 2) if p50 else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Suites
+# ---------------------------------------------------------------------------
+
+def bench_face(sweep, repeats, images=None):
+    from services.faces import find_faces, to_equalized_gray
+
+    if images is not None:
+        # Real images replace the synthetic resolution/face-count axes
+        sweep = {k: v for k, v in sweep.items() if k not in ("resolution", "faces")}
+
+    inputs = {}
+    for params in _grid(sweep):
+        if images is not None:
+            cases = [(dict(params, image=name), img) for name, img in images]
+        else:
+            key = (params["resolution"], params["faces"])
+            if key not in inputs:
+                inputs[key] = data.face_image(*data.RESOLUTIONS[params["resolution"]], faces=params["faces"])
+            cases = [(params, inputs[key])]
+
+        for case, image in cases:
+            fn = lambda: find_faces(  # noqa: E731
+                to_equalized_gray(image), case["scale_factor"], case["min_neighbors"], case["min_size"]
+            )
+            latencies, memory, (faces, _) = _measure(fn, repeats)
+            megapixels = image.shape[0] * image.shape[1] / 1e6
+            yield _case_id("face", case), {
+                **_summary(latencies, 1, "images"),
+                "megapixels_per_s": round(megapixels * 1000 / np.median(latencies), 2),
+                **memory,
+                "faces_found": len(faces),
+            }
+
+
+def bench_motion(sweep, repeats):
+    from services.motion import detect_motion, to_gray_blur
+
+    pairs = {}
+    for params in _grid(sweep):
+        res = params["resolution"]
+        if res not in pairs:
+            pairs[res] = data.motion_pair(*data.RESOLUTIONS[res])
+        frame_a, frame_b = pairs[res]
+        fn = lambda: detect_motion(to_gray_blur(frame_a), to_gray_blur(frame_b), params["threshold"])  # noqa: E731
+        latencies, memory, result = _measure(fn, repeats)
+        yield _case_id("motion", params), {
+            **_summary(latencies, 1, "pairs"),
+            **memory,
+            "motion_pct": round(float(result[3]), 2),
+        }
+
+
+def bench_video(sweep, repeats, frames=60):
+    from services.motion import iter_video_frames, stream_motion
+
+    with tempfile.TemporaryDirectory(prefix="cv-bench-") as tmp:
+        videos = {}
+        for params in _grid(sweep):
+            res = params["resolution"]
+            if res not in videos:
+                videos[res] = data.write_video(os.path.join(tmp, f"{res}.avi"), *data.RESOLUTIONS[res], frames=frames)
+
+            def fn(path=videos[res], model=params["model"]):
+                return sum(1 for _ in stream_motion(iter_video_frames(path), model=model))
+
+            latencies, memory, processed = _measure(fn, max(1, repeats // 5), warmup=0)
+            yield _case_id("video", params), {
+                **_summary(latencies, processed, "frames"),
+                **memory,
+                "frames": frames,
+            }
+
+
+SUITES = {"face": bench_face, "motion": bench_motion, "video": bench_video}
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+    }
+
+
+def compare(report, baseline, tolerance) -> list:
+    """Cases whose p50 exceeds the baseline's by more than `tolerance` (a fraction)."""
+    regressions = []
+    for case, result in report["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append({"case": case, "baseline_ms": base["p50_ms"],
+                                "current_ms": result["p50_ms"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline face/motion detection benchmarks.")
+    parser.add_argument("--suite", choices=[*SUITES, "all"], default="all")
+    parser.add_argument("--quick", action="store_true", help="Small sweep for a fast smoke run")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--images", help="Benchmark faces on images from this directory instead of synthetic ones")
+    parser.add_argument("--threads", type=int, help="Pin OpenCV's thread count for reproducible numbers")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Exit 1 if any case regresses against --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown as a fraction")
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    suites = list(SUITES) if args.suite == "all" else [args.suite]
+    images = list(data.load_images(args.images)) if args.images else None
+    report = {"environment": environment(), "repeats": args.repeats, "cases": {}}
+    for name in suites:
+        sweep = QUICK[name] if args.quick else {"face": FACE_SWEEP, "motion": MOTION_SWEEP, "video": VIDEO_SWEEP}[name]
+        extra = {"images": images} if name == "face" else {}
+        for case, result in SUITES[name](sweep, args.repeats, **extra):
+            report["cases"][case] = result
+            print(f"{case:<70} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms", file=sys.stderr)
+    report["max_rss_mb"] = round(_max_rss_mb(), 1)
+
+    status = 0
+    if args.compare:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        if baseline.get("environment") != report["environment"]:
+            print("warning: baseline was recorded on a different environment", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
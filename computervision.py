@@ -1,5 +1,42 @@
+import json
+
 import streamlit as st
 
+from services import profiling
+
+# Lazy imports — so a failed cv2/mediapipe import only breaks THAT module,
+# not the entire app. Each module handles its own import errors gracefully.
+MODULES = {
+    "🔍 Roboflow Detect": "modules.roboflow_detect",
+    "✨ Gemini 3 Flash":  "modules.gemini3_flash_app",
+    "🏃 Motion Detection": "modules.motion",
+    "🙂 Face Detection":  "modules.face_detect",
+}
+PROFILE_HISTORY = 50
+
+
+def _render_profile_panel(profile):
+    history = st.session_state.setdefault("_profile_history", [])
+    history.append(profile.as_dict())
+    del history[:-PROFILE_HISTORY]
+
+    with st.sidebar.expander("⏱ Profile — this rerun", expanded=True):
+        st.dataframe(profile.as_dict()["stages"], use_container_width=True, hide_index=True)
+        if profile.payloads:
+            st.json(profile.payloads)
+        if profiling.IMPORT_TIMES:
+            st.caption("First-import cost (per worker)")
+            st.dataframe(
+                [{"module": m, **t, "new_packages": ", ".join(t["new_packages"])}
+                 for m, t in profiling.IMPORT_TIMES.items()],
+                use_container_width=True, hide_index=True,
+            )
+        st.download_button(
+            "⬇ Export profiles JSON",
+            json.dumps({"imports": profiling.IMPORT_TIMES, "runs": history}, indent=2),
+            file_name="profiles.json",
+        )
+
 
 def render():
     st.sidebar.header("🧪 CV Lab")
@@ -7,32 +44,22 @@ def render():
 
     tool_name = st.sidebar.radio(
         "Choose a module",
-        [
-            "🔍 Roboflow Detect",
-            "✨ Gemini 3 Flash",
-            "🏃 Motion Detection",
-            "🙂 Face Detection",
-        ],
+        list(MODULES),
         label_visibility="collapsed"
     )
 
     st.sidebar.markdown("---")
+    profiling_on = st.sidebar.toggle("⏱ Profiling mode", False,
+                                     help="Record import, render and per-stage timings")
     st.sidebar.caption("Built with MediaPipe · OpenCV · Roboflow · Google Gemini")
 
-    # Lazy imports — so a failed cv2/mediapipe import only breaks THAT module,
-    # not the entire app. Each module handles its own import errors gracefully.
-    if tool_name == "🔍 Roboflow Detect":
-        from modules import roboflow_detect
-        roboflow_detect.render()
-
-    elif tool_name == "✨ Gemini 3 Flash":
-        from modules import gemini3_flash_app
-        gemini3_flash_app.render()
-
-    elif tool_name == "🏃 Motion Detection":
-        from modules import motion
-        motion.render()
-
-    elif tool_name == "🙂 Face Detection":
-        from modules import face_detect
-        face_detect.render()
\ No newline at end of file
+    profile = profiling.start_run(tool_name) if profiling_on else None
+    try:
+        with profiling.stage("import"):
+            module = profiling.timed_import(MODULES[tool_name])
+        with profiling.stage("render"):
+            module.render()
+    finally:
+        profiling.end_run()
+        if profile is not None:
+            _render_profile_panel(profile)
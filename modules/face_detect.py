@@ -1,12 +1,8 @@
 import streamlit as st
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import io
-
-try:
-    FONT = ImageFont.truetype("arial.ttf", 15)
-except Exception:
-    FONT = ImageFont.load_default()
+import time
 
 _import_error = None
 try:
@@ -15,74 +11,126 @@ except Exception as e:
     cv2 = None
     _import_error = str(e)
 
+from services.annotate import draw_detections, hex_to_rgb
+from services.cascades import CASCADE_PASSES, DEFAULT_PASSES, REGISTRY
+from services.dedup import DEFAULT_MAX_DISTANCE, FrameDeduper, signature
+from services.faces import DEFAULT_FAST_MIN_FACE, fast_path_scale, find_faces, to_equalized_gray
+from services.live import render_live
+from services.nms import iou_matrix, xywh_to_xyxy
+from services.profiling import payload, stage
+from services.stage_cache import session_cache, upload_digest
+from services.telemetry import track
+
 
-def _detect_faces(image: Image.Image, scale_factor: float, min_neighbors: int, min_size: int):
+FACE_COLORS = [hex_to_rgb(c) for c in ("#00FF64", "#00BFFF", "#FFD700", "#FF6B6B", "#DA70D6")]
+
+
+def _compare_paths(image: Image.Image, scale_factor: float, min_neighbors: int, min_size: int,
+                   cascades=DEFAULT_PASSES, fast_max_dim: int = 1024, refine: bool = False,
+                   fast_min_face: int = DEFAULT_FAST_MIN_FACE) -> dict:
+    """
+    Accuracy/latency report for the fast path against the full-resolution path.
+    Full-resolution detections are treated as ground truth; a box counts as
+    matched when its best IoU with the other set is at least 0.5.
+    """
+    gray = to_equalized_gray(image)
+
+    start = time.perf_counter()
+    full, _ = find_faces(gray, scale_factor, min_neighbors, min_size, cascades)
+    full_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    fast, _ = find_faces(gray, scale_factor, min_neighbors, min_size, cascades, fast_max_dim, refine, fast_min_face)
+    fast_ms = (time.perf_counter() - start) * 1000
+
+    iou = iou_matrix(xywh_to_xyxy(full), xywh_to_xyxy(fast))
+    best_full = iou.max(axis=1) if iou.size else np.zeros(len(full))
+    best_fast = iou.max(axis=0) if iou.size else np.zeros(len(fast))
+    matched = best_full >= 0.5
+
+    return {
+        "image_size": f"{gray.shape[1]}×{gray.shape[0]}",
+        "detect_scale": round(fast_path_scale(gray.shape, max(min_size, fast_min_face), fast_max_dim), 3),
+        "full_ms": round(full_ms, 1),
+        "fast_ms": round(fast_ms, 1),
+        "speedup": round(full_ms / fast_ms, 2) if fast_ms else None,
+        "full_faces": len(full),
+        "fast_faces": len(fast),
+        "recall": round(float(matched.mean()), 3) if len(full) else None,
+        "precision": round(float((best_fast >= 0.5).mean()), 3) if len(fast) else None,
+        "mean_iou": round(float(best_full[matched].mean()), 3) if matched.any() else None,
+    }
+
+
+def _detect_faces(image: Image.Image, scale_factor: float, min_neighbors: int, min_size: int,
+                  cascades=DEFAULT_PASSES, fast_max_dim: int = None, refine: bool = False,
+                  fast_min_face: int = DEFAULT_FAST_MIN_FACE, digest: str = None):
     """
     Run OpenCV Haar Cascade face detection.
-    Uses frontalface_default + profileface cascades for better coverage.
-    Returns annotated PIL image and list of detected face rects.
+    Runs the selected cascade passes (frontal, alt2, profile, mirrored profile)
+    in parallel for better coverage. With `digest` set, the decoded image, the
+    equalized gray and the raw detections are memoized in the session's stage
+    cache, so changing a setting only reruns the stages that depend on it.
+    Returns annotated RGB array, list of detected face rects and per-pass timings (ms).
+    """
+    cache = session_cache() if digest else None
+
+    def cached(name, params, compute):
+        return cache.get_or_compute(name, digest, params, compute) if cache else compute()
+
+    with stage("decode"):
+        rgb = cached("decode", (), lambda: np.array(image.convert("RGB")))
+    with stage("preprocess"):
+        gray = cached("equalize", (), lambda: to_equalized_gray(rgb))
+    with stage("detect"):
+        unique, timings = cached(
+            "faces", (scale_factor, min_neighbors, min_size, tuple(cascades), fast_max_dim, refine, fast_min_face),
+            lambda: find_faces(gray, scale_factor, min_neighbors, min_size, cascades, fast_max_dim, refine,
+                               fast_min_face),
+        )
+
+    with stage("draw"):
+        # Cached arrays are read-only; annotate a copy
+        annotated = rgb.copy() if cache else rgb
+        draw_detections(
+            annotated,
+            xywh_to_xyxy(unique),
+            labels=[f"Face {i + 1}" for i in range(len(unique))],
+            colors=[FACE_COLORS[i % len(FACE_COLORS)] for i in range(len(unique))],
+            thickness=3,
+        )
+
+    return annotated, unique, timings
+
+
+def _live_faces(scale_factor: float, min_neighbors: int, min_size: int, cascades, dedup_distance: int = None):
+    """
+    Per-frame processor for the live stream: detects and boxes faces in place.
+    With `dedup_distance`, near-identical frames reuse the previous faces.
     """
-    img_array = np.array(image.convert("RGB"))
-    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-    gray = cv2.equalizeHist(gray)  # Improves detection in varied lighting
-
-    frontal = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    alt     = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_alt2.xml")
-    profile = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_profileface.xml")
-
-    params = dict(
-        scaleFactor=scale_factor,
-        minNeighbors=min_neighbors,
-        minSize=(min_size, min_size),
-        flags=cv2.CASCADE_SCALE_IMAGE,
-    )
-
-    faces_f = frontal.detectMultiScale(gray, **params)
-    faces_a = alt.detectMultiScale(gray, **params)
-    faces_p = profile.detectMultiScale(gray, **params)
-
-    # Merge all detections, deduplicate overlapping boxes
-    all_faces = []
-    for group in [faces_f, faces_a, faces_p]:
-        if len(group):
-            all_faces.extend(group.tolist())
-
-    unique = _deduplicate(all_faces, overlap_thresh=0.3)
-
-    # Draw on a PIL image
-    annotated = image.convert("RGB").copy()
-    draw = ImageDraw.Draw(annotated)
-    colors = ["#00FF64", "#00BFFF", "#FFD700", "#FF6B6B", "#DA70D6"]
-
-    for i, (x, y, w, h) in enumerate(unique):
-        color = colors[i % len(colors)]
-        draw.rectangle([x, y, x + w, y + h], outline=color, width=3)
-        label = f"Face {i + 1}"
-        text_y = max(0, y - 20)
-        draw.rectangle([x, text_y, x + len(label) * 8, text_y + 17], fill=color)
-        draw.text((x + 2, text_y + 1), label, fill="black", font=FONT)
-
-    return annotated, unique
-
-
-def _iou(a, b):
-    """Intersection over union for two (x, y, w, h) boxes."""
-    ax1, ay1, ax2, ay2 = a[0], a[1], a[0] + a[2], a[1] + a[3]
-    bx1, by1, bx2, by2 = b[0], b[1], b[0] + b[2], b[1] + b[3]
-    ix1, iy1 = max(ax1, bx1), max(ay1, by1)
-    ix2, iy2 = min(ax2, bx2), min(ay2, by2)
-    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
-    union = a[2] * a[3] + b[2] * b[3] - inter
-    return inter / union if union > 0 else 0
-
-
-def _deduplicate(boxes, overlap_thresh=0.3):
-    """Remove duplicate overlapping boxes."""
-    unique = []
-    for box in boxes:
-        if not any(_iou(box, u) > overlap_thresh for u in unique):
-            unique.append(box)
-    return unique
+    deduper = FrameDeduper(dedup_distance) if dedup_distance is not None else None
+
+    def detect(frame):
+        return find_faces(to_equalized_gray(frame), scale_factor, min_neighbors, min_size, cascades)[0]
+
+    def process(frame):
+        if deduper is None:
+            faces = detect(frame)
+        else:
+            # Frame size is part of the context: boxes are only valid at the width they were found at
+            faces, _ = deduper.process(signature(frame), lambda: detect(frame), context=frame.shape)
+        draw_detections(
+            frame,
+            xywh_to_xyxy(faces),
+            colors=[FACE_COLORS[i % len(FACE_COLORS)] for i in range(len(faces))],
+            thickness=2,
+        )
+        info = {"Faces": len(faces)}
+        if deduper is not None:
+            info["Reused frames"] = f"{deduper.stats()['hit_rate']:.0%}"
+        return frame, info
+
+    return process
 
 
 def render():
@@ -103,30 +151,80 @@ def render():
                                   help="Higher = fewer false positives")
         min_size      = st.slider("Min face size (px)", 20, 150, 30,
                                   help="Ignore faces smaller than this")
+        cascades      = st.multiselect("Cascades", list(CASCADE_PASSES), list(DEFAULT_PASSES),
+                                       help="Passes run in parallel; profile_mirror catches right-facing profiles")
+        fast_path     = st.checkbox("Fast path for large photos", False,
+                                    help="Detect on a downscaled copy and map boxes back to full resolution")
+        fast_max_dim  = st.slider("Fast path max side (px)", 480, 2048, 1024, 32,
+                                  disabled=not fast_path)
+        fast_min_face = st.slider("Fast path smallest face (px)", 24, 400, DEFAULT_FAST_MIN_FACE, 8,
+                                  disabled=not fast_path,
+                                  help="Faces smaller than this in the original photo may be missed; "
+                                       "larger values allow a smaller copy and a bigger speed-up")
+        refine        = st.checkbox("Refine boxes on full-resolution crops", False,
+                                    disabled=not fast_path)
+
+        stats = REGISTRY.stats()
+        st.caption(
+            "Cascade pool: "
+            + " · ".join(f"{n} {s['loads']} load(s) / {s['hits']} hit(s) / {s['load_ms']:.0f} ms"
+                         for n, s in stats.items())
+        )
 
-    mode = st.radio("Input source", ["Upload Image", "Webcam"], horizontal=True)
-    image = None
-
+    mode = st.radio("Input source", ["Upload Image", "Webcam", "Live Stream"], horizontal=True)
+
+    if mode == "Live Stream":
+        if not cascades:
+            st.info("Select at least one cascade in the detection settings.")
+            return
+        dedup = st.checkbox("Reuse faces on near-identical frames", True,
+                            help="Skip detection when a frame barely differs from the last one analysed")
+        dedup_distance = st.slider("Near-duplicate hash distance (bits)", 0, 16,
+                                   DEFAULT_MAX_DISTANCE) if dedup else None
+        render_live(
+            "face_detect",
+            lambda: _live_faces(scale_factor, min_neighbors, min_size, cascades, dedup_distance),
+            settings=(scale_factor, min_neighbors, min_size, tuple(cascades), dedup_distance),
+        )
+        return
     if mode == "Upload Image":
         f = st.file_uploader("Upload image", type=["jpg", "jpeg", "png"])
-        if f:
-            image = Image.open(f)
     else:
-        cam = st.camera_input("Take a photo")
-        if cam:
-            image = Image.open(cam)
+        f = st.camera_input("Take a photo")
 
-    if image is None:
+    if f is None:
         return
+    image = Image.open(f)  # lazy: pixels are only decoded on a stage-cache miss
+    digest = upload_digest(f)
 
-    with st.spinner("Detecting faces…"):
-        annotated, faces = _detect_faces(image, scale_factor, min_neighbors, min_size)
+    if not cascades:
+        st.info("Select at least one cascade in the detection settings.")
+        return
+
+    with st.spinner("Detecting faces…"), track("face_detect", cascades=list(cascades),
+                                               fast_path=fast_path) as event:
+        annotated, faces, timings = _detect_faces(
+            image, scale_factor, min_neighbors, min_size, cascades,
+            fast_max_dim if fast_path else None, refine, fast_min_face, digest=digest,
+        )
+        event["boxes"] = len(faces)
 
     col1, col2 = st.columns(2)
     with col1:
-        st.image(image, caption="Original", use_container_width=True)
+        st.image(f.getvalue(), caption="Original", use_container_width=True)  # raw bytes, no re-decode
     with col2:
         st.image(annotated, caption=f"Detected — {len(faces)} face(s)", use_container_width=True)
+    cache_stats = session_cache().stats()
+    st.caption("Cascade timings: " + " · ".join(f"{n} {ms:.0f} ms" for n, ms in timings.items())
+               + f" · stage cache {cache_stats['hits']} hit(s) / {cache_stats['misses']} miss(es),"
+                 f" {cache_stats['mb']} MB")
+
+    with st.expander("⏱ Fast path vs full resolution", expanded=False):
+        st.caption("Runs both paths on this image; full-resolution boxes are the reference.")
+        if st.button("Run comparison"):
+            with st.spinner("Comparing…"):
+                st.json(_compare_paths(image, scale_factor, min_neighbors, min_size,
+                                       cascades, fast_max_dim, refine, fast_min_face))
 
     if faces:
         st.success(f"✅ {len(faces)} face(s) detected.")
@@ -144,6 +242,8 @@ def render():
 
     # Download annotated image
     buf = io.BytesIO()
-    annotated.save(buf, format="PNG")
+    with stage("encode"):
+        Image.fromarray(annotated).save(buf, format="PNG")
+    payload("download_bytes", buf.tell())
     buf.seek(0)
     st.download_button("⬇ Download Annotated Image", buf, file_name="faces_detected.png")
\ No newline at end of file
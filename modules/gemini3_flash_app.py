@@ -1,107 +1,136 @@
 import streamlit as st
 import requests
-import base64
 import io
 import os
 import json
-import random
-from PIL import Image, ImageDraw, ImageFont
-from collections import Counter
+import time
+import numpy as np
+from PIL import Image
+
+from services.annotate import class_color, draw_detections
+from services.dedup import dedup_controls, signature
+from services.detections import Detections
+from services.roboflow import WORKFLOW_FLIGHTS, WORKFLOW_LIMITER, run_workflow_shared, workflow_key
+from services.result_cache import get_result_cache, image_digest
+from services.single_flight import RateLimited
+from services.tiling import DEFAULT_MAX_IN_FLIGHT, DEFAULT_OVERLAP, plan_requests, run_tiled
+from services.profiling import stage
+from services.telemetry import streamlit_session_id, track
+
+PARTIAL_REDRAW_S = 0.5  # minimum gap between streamed preview redraws
+
+
+def _price_run(image: Image.Image, classes: list, cache, tiled: bool, tile: int = None,
+               overlap: float = None) -> tuple:
+    """
+    (tile plan or None, {box: digest}, upstream calls): the image, or each
+    tile sent, counts unless already cached. Digests are only taken when
+    there is a cache to check, and are handed on to `run_workflow_shared`
+    so no crop is hashed twice.
+    """
+    plan = plan_requests(image, tile, overlap) if tiled else None
+    jobs = plan[1] if tiled else [None]
+    if cache is None:
+        return plan, {}, len(jobs)
+    digests = {box: image_digest(image if box is None else image.crop(box)) for box in jobs}
+    return plan, digests, sum(not cache.contains(workflow_key(d, classes)) for d in digests.values())
+
+
+def _decode(file) -> Image.Image:
+    with stage("decode"):
+        return Image.open(file).convert("RGB")
+
+
+def _draw_predictions(image: Image.Image, predictions: list, threshold: int, nms_iou: float = None) -> tuple:
+    """Threshold, suppress and draw; returns (annotated array, kept `Detections`)."""
+    dets = Detections.from_predictions(predictions, data_keys=("class_id", "model"), keep_source=True)
+    dets = dets.filter(min_confidence=threshold / 100)
+
+    # Class-aware overlap suppression; None or >= 1.0 leaves boxes untouched
+    if nms_iou is not None and nms_iou < 1.0:
+        dets = dets.nms(nms_iou)
+
+    # One RGB array copy of the original, annotated in place
+    annotated = np.array(image.convert("RGB"))
+    classes = dets.class_names.tolist()
+    draw_detections(
+        annotated,
+        dets.xyxy,
+        labels=classes,
+        colors=[class_color(cls) for cls in classes],
+        thickness=3,
+        fill_alpha=0.15 if len(dets) > 100 else 0.0,
+        scores=dets.confidence,
+    )
+    return annotated, dets
 
-try:
-    FONT = ImageFont.truetype("arial.ttf", 15)
-except Exception:
-    FONT = ImageFont.load_default()
 
-WORKFLOW_ID  = "playground-gemini-3-flash-od"
-WORKSPACE    = "klhinnovation"
-ROBOFLOW_URL = "https://serverless.roboflow.com"
+def _user_id() -> str:
+    """Logged-in user when Streamlit auth is configured, otherwise the browser session."""
+    try:
+        if st.user.is_logged_in:
+            return st.user.email
+    except Exception:
+        pass
+    return streamlit_session_id() or "anonymous"
 
 
-def _image_to_base64(image: Image.Image) -> str:
-    buf = io.BytesIO()
-    image.save(buf, format="JPEG", quality=90)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode("utf-8")
-
-
-def _run_workflow(image: Image.Image, roboflow_key: str, google_key: str,
-                  classes: list, use_cache: bool) -> list:
-    """Call Roboflow Workflow REST endpoint directly."""
-    url = f"{ROBOFLOW_URL}/{WORKSPACE}/workflows/{WORKFLOW_ID}"
-    b64 = _image_to_base64(image)
-
-    payload = {
-        "api_key": roboflow_key,
-        "inputs": {
-            "image": {"type": "base64", "value": b64},
-            "classes": classes,
-            "model_api_key": google_key,
-        },
-        "use_cache": use_cache,
-    }
-
-    resp = requests.post(url, json=payload, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
-
-    # Roboflow workflow responses: {"outputs": [...]} or {"predictions": [...]}
-    if "outputs" in data:
-        outputs = data["outputs"]
-        if isinstance(outputs, list) and outputs:
-            item = outputs[0]
-            for key in ("predictions", "detections", "output"):
-                if key in item:
-                    val = item[key]
-                    if isinstance(val, dict):
-                        return val.get("predictions", [])
-                    if isinstance(val, list):
-                        return val
-    if "predictions" in data:
-        return data["predictions"]
-    return []
-
-
-def _draw_predictions(image: Image.Image, predictions: list, threshold: int) -> tuple:
-    annotated = image.copy()
-    draw = ImageDraw.Draw(annotated)
-    colors = {}
-    filtered = []
-
-    for pred in predictions:
-        conf = pred.get("confidence", 0) * 100
-        if conf < threshold:
-            continue
-
-        cls = pred.get("class", "object")
-        filtered.append(pred)
-
-        if cls not in colors:
-            colors[cls] = tuple(random.choices(range(60, 220), k=3))
-
-        x, y, w, h = pred["x"], pred["y"], pred["width"], pred["height"]
-        left, top     = int(x - w / 2), int(y - h / 2)
-        right, bottom = int(x + w / 2), int(y + h / 2)
-
-        draw.rectangle([left, top, right, bottom], outline=colors[cls], width=3)
-        label = f"{cls} {conf:.1f}%"
-        text_y = max(0, top - 18)
-        draw.rectangle([left, text_y, left + len(label) * 7, text_y + 16], fill=colors[cls])
-        draw.text((left + 2, text_y), label, fill="black", font=FONT)
-
-    return annotated, filtered
+def _partial_preview(image: Image.Image, threshold: int, nms_iou: float):
+    """`run_tiled` progress callback that redraws a placeholder, throttled to PARTIAL_REDRAW_S."""
+    placeholder = st.empty()
+    last = [0.0]
+
+    def show(predictions, done, total):
+        now = time.perf_counter()
+        if done < total and now - last[0] < PARTIAL_REDRAW_S:
+            return
+        last[0] = now
+        annotated, dets = _draw_predictions(image, predictions, threshold, nms_iou)
+        placeholder.image(annotated, caption=f"Partial results — {done}/{total} tile(s), {len(dets)} box(es)",
+                          use_container_width=True)
+
+    return placeholder, show
 
 
 def _download_button(obj, filename, label):
+    if isinstance(obj, Detections):
+        obj = obj.to_predictions()
     if isinstance(obj, (dict, list)):
         buf = io.BytesIO(json.dumps(obj, indent=2).encode())
     else:
         buf = io.BytesIO()
-        obj.save(buf, format="PNG")
+        Image.fromarray(obj).save(buf, format="PNG")
     buf.seek(0)
     st.download_button(label, buf, file_name=filename)
 
 
+def _show_results(image: Image.Image, predictions: list, threshold: int, nms_iou: float):
+    """Annotated image, per-class summary and downloads."""
+    with stage("draw"):
+        annotated, dets = _draw_predictions(image, predictions, threshold, nms_iou)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.image(image, caption="Original", use_container_width=True)
+    with col2:
+        st.image(annotated, caption="Annotated", use_container_width=True)
+
+    counts = dets.counts()
+    st.subheader("Detection Summary")
+    cols = st.columns(min(len(counts), 4))
+    for i, (cls, cnt) in enumerate(counts.items()):
+        cols[i % len(cols)].metric(cls.title(), cnt)
+
+    st.divider()
+    c1, c2 = st.columns(2)
+    with c1:
+        _download_button(annotated, "annotated.png", "⬇ Download Annotated Image")
+    with c2:
+        _download_button(dets, "predictions.json", "⬇ Download Predictions JSON")
+
+    st.success("✅ Detection complete.")
+
+
 def render():
     st.header("✨ Gemini 3 Flash Object Detection")
     st.caption("Google Gemini 3 Flash via Roboflow Workflows — direct REST API.")
@@ -121,19 +150,43 @@ def render():
         default=["fish", "people", "eyes"]
     )
     threshold = st.sidebar.slider("Confidence threshold (%)", 0, 100, 50)
-    use_cache = st.sidebar.checkbox("Cache workflow results", True)
+    nms_iou   = st.sidebar.slider("Overlap suppression (IoU)", 0.05, 1.0, 1.0, 0.05,
+                                  help="Merge overlapping boxes of the same class; 1.0 = off")
+    use_cache = st.sidebar.checkbox("Cache workflow results", True,
+                                    help="Reuse results for an identical image and class set")
+    tiled     = st.sidebar.checkbox("Tiled inference (small objects)", False,
+                                    help="Split large images into overlapping tiles so small objects "
+                                         "such as eyes or fish survive downsampling")
+    if tiled:
+        tile          = st.sidebar.slider("Tile size (px)", 384, 1536, 768, 32)
+        overlap       = st.sidebar.slider("Tile overlap", 0.0, 0.5, DEFAULT_OVERLAP, 0.05)
+        max_in_flight = st.sidebar.slider("Max tiles in flight", 1, 8, DEFAULT_MAX_IN_FLIGHT)
+        stream        = st.sidebar.checkbox("Stream partial results", True,
+                                            help="Draw boxes as each tile returns instead of waiting for all")
+
+    user = _user_id()
+    limit_note = st.sidebar.empty()
+
+    def show_limit():
+        limit_note.caption(f"{int(WORKFLOW_LIMITER.remaining(user))} workflow call(s) available · "
+                           f"{WORKFLOW_FLIGHTS.in_flight()} workflow call(s) in flight")
+
+    show_limit()
 
     mode = st.radio("Input source", ["Upload Image", "Webcam"], horizontal=True)
-    image = None
+    image = source_bytes = deduper = None
 
     if mode == "Upload Image":
         f = st.file_uploader("Upload an image", ["jpg", "jpeg", "png"])
         if f:
-            image = Image.open(f).convert("RGB")
+            source_bytes = f.getvalue()
+            image = _decode(f)
     else:
         cam = st.camera_input("Take a photo")
+        deduper = dedup_controls("gemini3_flash")
         if cam:
-            image = Image.open(cam).convert("RGB")
+            source_bytes = cam.getvalue()
+            image = _decode(cam)
 
     if image is None:
         return
@@ -143,9 +196,52 @@ def render():
     if not st.button("Run Detection 🎯"):
         return
 
+    # A near-identical webcam capture reuses the last analysed frame's detections — no paid call, no rate charge
+    context = (tuple(sorted(classes)), tiled and (tile, overlap))
+    sig = signature(np.asarray(image)) if deduper is not None else None
+    reused = deduper.match(sig, context) if deduper is not None else None
+    if reused is not None:
+        st.caption("♻️ Near-identical to the last analysed frame — reused its detections, no workflow call made.")
+        if reused[0]:
+            _show_results(image, reused[0], threshold, nms_iou)
+        return
+
+    # Charged per upstream call the run will make, so a tiled run pays per tile and a cache hit is free
+    cache = get_result_cache() if use_cache else None
+    plan, digests, calls = _price_run(image, classes, cache, tiled, *((tile, overlap) if tiled else ()))
+    if calls > WORKFLOW_LIMITER.burst:
+        st.warning(f"This run needs {calls} workflow calls, more than the {WORKFLOW_LIMITER.burst:.0f} allowed at "
+                   "once — use larger tiles or turn off tiled inference.")
+        return
+    if calls:
+        try:
+            WORKFLOW_LIMITER.acquire(user, calls)
+        except RateLimited as e:
+            st.warning(f"Too many workflow calls in a short time — try again in {e.retry_after:.0f} s.")
+            return
+        show_limit()
+
+    # Identical concurrent requests from any session share one workflow call
+    source = None
     with st.spinner("Running Gemini 3 Flash workflow…"):
         try:
-            predictions = _run_workflow(image, ROBOFLOW_KEY, GOOGLE_KEY, classes, use_cache)
+            with track("gemini3_flash", classes=classes, tiled=tiled) as event, stage("detect"):
+                if tiled:
+                    placeholder, on_progress = _partial_preview(image, threshold, nms_iou) if stream else (None, None)
+                    predictions, tile_stats = run_tiled(
+                        image,
+                        lambda crop, box: run_workflow_shared(crop, ROBOFLOW_KEY, GOOGLE_KEY, classes, use_cache,
+                                                              cache=cache, digest=digests.get(box))[0],
+                        tile, overlap, max_in_flight, on_progress=on_progress, plan=plan,
+                    )
+                    if placeholder is not None:
+                        placeholder.empty()
+                    event["tiles"] = tile_stats["requests"]
+                else:
+                    predictions, source = run_workflow_shared(image, ROBOFLOW_KEY, GOOGLE_KEY, classes, use_cache,
+                                                              source_bytes, cache, digests.get(None))
+                    event["source"] = source
+                event["boxes"] = len(predictions)
         except requests.HTTPError as e:
             st.error(f"Roboflow API error {e.response.status_code}: {e.response.text[:300]}")
             return
@@ -153,29 +249,24 @@ def render():
             st.error(f"Request failed: {e}")
             return
 
-    if not predictions:
-        st.warning("No predictions returned. Check your workflow configuration or try a different image.")
-        return
-
-    annotated, filtered = _draw_predictions(image, predictions, threshold)
+    if deduper is not None:
+        deduper.store(sig, predictions, context=context)
 
-    col1, col2 = st.columns(2)
-    with col1:
-        st.image(image, caption="Original", use_container_width=True)
-    with col2:
-        st.image(annotated, caption="Annotated", use_container_width=True)
+    if source == "cache":
+        st.caption("⚡ Served from result cache — no workflow call made.")
+    elif source == "shared":
+        st.caption("🔗 An identical request was already running — its result was shared.")
 
-    counts = Counter(p["class"] for p in filtered)
-    st.subheader("Detection Summary")
-    cols = st.columns(min(len(counts), 4))
-    for i, (cls, cnt) in enumerate(counts.items()):
-        cols[i % len(cols)].metric(cls.title(), cnt)
+    if tiled:
+        st.caption(
+            f"🧩 {tile_stats['sent']} of {tile_stats['tiles']} tile(s) sent "
+            f"({tile_stats['skipped']} near-empty skipped){' + full-image pass' if tile_stats['full_pass'] else ''}"
+            f" · {tile_stats['failed']} failed · {tile_stats['raw_boxes']} → {tile_stats['merged_boxes']} boxes"
+            f" after seam NMS · wall {tile_stats['wall_ms']:.0f} ms"
+        )
 
-    st.divider()
-    c1, c2 = st.columns(2)
-    with c1:
-        _download_button(annotated, "annotated.png", "⬇ Download Annotated Image")
-    with c2:
-        _download_button(filtered, "predictions.json", "⬇ Download Predictions JSON")
+    if not predictions:
+        st.warning("No predictions returned. Check your workflow configuration or try a different image.")
+        return
 
-    st.success("✅ Detection complete.")
\ No newline at end of file
+    _show_results(image, predictions, threshold, nms_iou)
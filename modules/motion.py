@@ -1,7 +1,19 @@
 import streamlit as st
 import numpy as np
+import os
+import shutil
+import tempfile
 from PIL import Image
 
+from services.live import render_live
+from services.motion import (
+    BACKGROUND_MODELS, Background, detect_motion, fast_motion, iter_video_frames, parse_regions,
+    stream_motion, to_gray_blur,
+)
+from services.profiling import stage
+from services.stage_cache import session_cache, upload_digest
+from services.telemetry import track
+
 _import_error = None
 try:
     import cv2
@@ -10,29 +22,138 @@ except Exception as e:
     _import_error = str(e)
 
 
-def _to_gray_blur(image_array):
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    return cv2.GaussianBlur(gray, (21, 21), 0)
+def _decode(file, digest):
+    with stage("decode"):
+        return session_cache().get_or_compute(
+            "decode", digest, (), lambda: np.array(Image.open(file).convert("RGB"))
+        )
 
 
-def _detect_motion(frame_a, frame_b, threshold=25):
+def _live_motion(threshold, min_contour_area, model="Running average", learning_rate=0.05):
     """
-    Compare two blurred grayscale frames.
-    Returns: diff image, binary mask, contour-annotated colour image, motion %
+    Per-frame processor for the live stream: boxes moving blobs in place.
+    The background is re-seeded whenever the adaptive resolution changes.
     """
-    diff = cv2.absdiff(frame_a, frame_b)
-    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
-    mask = cv2.dilate(mask, None, iterations=2)
+    state = {"background": None, "shape": None}
+
+    def process(frame):
+        blur = to_gray_blur(frame)
+        if blur.shape != state["shape"]:
+            state["background"], state["shape"] = Background(model, threshold, learning_rate), blur.shape
+        mask = state["background"].mask(blur)
+        if mask is None:
+            return frame, {"Motion": "—", "Regions": 0}
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        significant = [c for c in contours if cv2.contourArea(c) >= min_contour_area]
+        for c in significant:
+            x, y, w, h = cv2.boundingRect(c)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 100), 2)
+        pct = (np.count_nonzero(mask) / mask.size) * 100
+        return frame, {"Motion": f"{pct:.2f}%", "Regions": len(significant)}
+
+    return process
+
+
+def _render_video(threshold, min_contour_area):
+    st.caption("Analyse a video clip frame by frame against a running background model.")
+
+    c1, c2, c3 = st.columns(3)
+    model = c1.selectbox("Background model", BACKGROUND_MODELS)
+    learning_rate = c2.slider("Background learning rate", 0.001, 0.5, 0.05, 0.001,
+                              help="Higher = background adapts faster to scene changes")
+    every_n = c3.number_input("Analyse every Nth frame", 1, 30, 1)
+
+    f = st.file_uploader("Upload video", type=["mp4", "avi", "mov", "mkv"], key="motion_video")
+    if not f:
+        st.info("Upload a video to run streaming motion detection.")
+        return
+
+    if not st.button("Analyse Video 🎞️"):
+        return
+
+    # VideoCapture needs a real path; copy the upload to a temp file in chunks
+    suffix = os.path.splitext(f.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(f, tmp)
+        path = tmp.name
+
+    try:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        cap.release()
+
+        progress = st.progress(0.0, text="Analysing…")
+        preview = st.empty()
+        series, peak, active = [], (0.0, 0), 0
+
+        frames = iter_video_frames(path, every_n=every_n, max_width=640)
+        with track("motion", mode="video", model=model) as event:
+            for result in stream_motion(frames, threshold, min_contour_area, model, learning_rate):
+                pct = result["motion_pct"]
+                series.append(pct)
+                active += pct >= 1
+                if pct > peak[0]:
+                    peak = (pct, result["frame"])
+                if total and len(series) % 25 == 0:
+                    progress.progress(min(result["frame"] / total, 1.0),
+                                      text=f"Frame {result['frame']} / {total}")
+                    preview.image(result["mask"], caption=f"Motion mask — frame {result['frame']}",
+                                  width=320)
+            event["frames"] = len(series)
+        progress.progress(1.0, text="Done")
+    except ValueError as e:
+        st.error(str(e))
+        return
+    finally:
+        os.unlink(path)
+
+    if not series:
+        st.warning("No frames could be analysed.")
+        return
 
-    # Motion percentage
-    motion_pct = (np.count_nonzero(mask) / mask.size) * 100
+    st.divider()
+    st.subheader("Results")
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Frames Analysed", len(series))
+    m2.metric("Frames With Motion (≥1%)", active)
+    m3.metric("Peak Motion", f"{peak[0]:.2f}%", help=f"Frame {peak[1]}")
+    st.line_chart(series, x_label="Analysed frame", y_label="Motion %")
+
+
+def _render_fast(frame_a, frame_b, threshold, min_contour_area, grid_width, regions):
+    with st.spinner("Analysing motion…"), track("motion", mode="fast", regions=len(regions) or 1) as event:
+        with stage("detect"):
+            results = fast_motion(frame_a, frame_b, threshold, min_contour_area, grid_width, regions)
+        event["boxes"] = sum(len(r["areas"]) for r in results.values())
+
+    st.divider()
+    st.subheader("Results")
 
-    # Draw contours on a blank colour canvas
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    canvas = np.zeros((*mask.shape, 3), dtype=np.uint8)
-    cv2.drawContours(canvas, contours, -1, (0, 255, 100), 2)
+    h, w = frame_b.shape[:2]
+    overlay = frame_b.copy()
+    for name, pts in (regions or {}).items():
+        cv2.polylines(overlay, [np.round(pts * (w, h)).astype(np.int32)], True, (255, 215, 0), 2)
+    for r in results.values():
+        for x, y, bw, bh in r["boxes"]:
+            cv2.rectangle(overlay, (int(x), int(y)), (int(x + bw), int(y + bh)), (0, 255, 100), 2)
+    st.image(overlay, caption="Regions and motion blobs", use_container_width=True)
 
-    return diff, mask, canvas, motion_pct, contours
+    rows = [
+        {
+            "Region": name,
+            "Motion %": round(r["motion_pct"], 2),
+            "Blobs": len(r["areas"]),
+            "Largest blob (px²)": int(r["areas"].max()) if len(r["areas"]) else 0,
+        }
+        for name, r in results.items()
+    ]
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    alarms = [name for name, r in results.items() if len(r["areas"])]
+    if alarms:
+        st.error(f"🚨 Motion in: {', '.join(alarms)}")
+    else:
+        st.success("✅ No significant motion in any region.")
 
 
 def render():
@@ -53,11 +174,38 @@ def render():
                               help="Lower = more sensitive to subtle motion")
         min_contour_area = st.slider("Min contour area (px²)", 100, 5000, 500,
                                      help="Filter out tiny noise blobs")
+        fast_mode = st.checkbox("Fast mode (downsampled grid + regions)", False,
+                                help="Coarse per-region answers for motion alarms")
+        grid_width = st.slider("Grid width (px)", 64, 640, 160, 16, disabled=not fast_mode)
+        regions_text = st.text_area(
+            "Regions of interest", "", disabled=not fast_mode,
+            placeholder="door: 0.1,0.2 0.4,0.9\ndriveway: 0.5,0.5 1,0.5 1,1 0.6,1",
+            help="One per line, coordinates as fractions of width/height. "
+                 "Two points = rectangle. Empty = whole frame.",
+        )
 
     # --- Input mode ---
-    mode = st.radio("Input mode", ["Upload Two Images", "Webcam Sequence"], horizontal=True)
+    mode = st.radio("Input mode", ["Upload Two Images", "Webcam Sequence", "Video File", "Live Stream"],
+                    horizontal=True)
+
+    if mode == "Video File":
+        _render_video(threshold, min_contour_area)
+        return
+
+    if mode == "Live Stream":
+        st.caption("Continuous motion detection against a running background model.")
+        c1, c2 = st.columns(2)
+        model = c1.selectbox("Background model", BACKGROUND_MODELS, key="live_model")
+        learning_rate = c2.slider("Background learning rate", 0.001, 0.5, 0.05, 0.001, key="live_lr")
+        render_live(
+            "motion",
+            lambda: _live_motion(threshold, min_contour_area, model, learning_rate),
+            settings=(threshold, min_contour_area, model, learning_rate),
+        )
+        return
 
     frame_a = frame_b = None
+    digest_a = digest_b = None
 
     if mode == "Upload Two Images":
         col1, col2 = st.columns(2)
@@ -66,7 +214,8 @@ def render():
             file_a = st.file_uploader("Reference frame", type=["jpg", "jpeg", "png"],
                                       key="motion_a")
             if file_a:
-                frame_a = np.array(Image.open(file_a).convert("RGB"))
+                digest_a = upload_digest(file_a)
+                frame_a = _decode(file_a, digest_a)
                 st.image(frame_a, use_container_width=True)
 
         with col2:
@@ -74,7 +223,8 @@ def render():
             file_b = st.file_uploader("Comparison frame", type=["jpg", "jpeg", "png"],
                                       key="motion_b")
             if file_b:
-                frame_b = np.array(Image.open(file_b).convert("RGB"))
+                digest_b = upload_digest(file_b)
+                frame_b = _decode(file_b, digest_b)
                 st.image(frame_b, use_container_width=True)
 
     else:
@@ -85,35 +235,55 @@ def render():
             st.markdown("**Frame A — Reference**")
             cam_a = st.camera_input("Reference photo", key="cam_a")
             if cam_a:
-                frame_a = np.array(Image.open(cam_a).convert("RGB"))
+                digest_a = upload_digest(cam_a)
+                frame_a = _decode(cam_a, digest_a)
 
         with col2:
             st.markdown("**Frame B — Comparison**")
             cam_b = st.camera_input("Comparison photo", key="cam_b")
             if cam_b:
-                frame_b = np.array(Image.open(cam_b).convert("RGB"))
+                digest_b = upload_digest(cam_b)
+                frame_b = _decode(cam_b, digest_b)
 
     # --- Run detection ---
     if frame_a is None or frame_b is None:
         st.info("Provide both frames to run motion detection.")
         return
 
+    # Each stage is memoized on its input digest plus the settings it reads,
+    # so e.g. moving the contour-area slider skips decode, resize, blur and diff
+    cache = session_cache()
+
     # Resize B to match A if needed
     if frame_a.shape != frame_b.shape:
-        pil_b = Image.fromarray(frame_b).resize(
-            (frame_a.shape[1], frame_a.shape[0]), Image.LANCZOS
+        size = (frame_a.shape[1], frame_a.shape[0])
+        frame_b = cache.get_or_compute(
+            "resize", digest_b, size,
+            lambda: np.array(Image.fromarray(frame_b).resize(size, Image.LANCZOS)),
         )
-        frame_b = np.array(pil_b)
 
-    with st.spinner("Analysing motion…"):
-        blur_a = _to_gray_blur(frame_a)
-        blur_b = _to_gray_blur(frame_b)
-        diff, mask, contour_canvas, motion_pct, contours = _detect_motion(
-            blur_a, blur_b, threshold
-        )
+    if fast_mode:
+        try:
+            regions = parse_regions(regions_text)
+        except ValueError as e:
+            st.error(f"Invalid regions: {e}")
+            return
+        _render_fast(frame_a, frame_b, threshold, min_contour_area, grid_width, regions)
+        return
+
+    with st.spinner("Analysing motion…"), track("motion", mode="full") as event:
+        with stage("preprocess"):
+            blur_a = cache.get_or_compute("blur", digest_a, frame_a.shape, lambda: to_gray_blur(frame_a))
+            blur_b = cache.get_or_compute("blur", digest_b, frame_b.shape, lambda: to_gray_blur(frame_b))
+        with stage("detect"):
+            diff, mask, contour_canvas, motion_pct, contours = cache.get_or_compute(
+                "motion", f"{digest_a}:{digest_b}", (threshold, frame_a.shape),
+                lambda: detect_motion(blur_a, blur_b, threshold),
+            )
 
         # Filter small contours
         significant = [c for c in contours if cv2.contourArea(c) >= min_contour_area]
+        event.update(boxes=len(significant), motion_pct=round(motion_pct, 2))
 
     st.divider()
     st.subheader("Results")
@@ -126,6 +296,10 @@ def render():
     with c3:
         st.image(contour_canvas, caption="Motion Contours", use_container_width=True)
 
+    cache_stats = cache.stats()
+    st.caption(f"Stage cache: {cache_stats['hits']} hit(s) / {cache_stats['misses']} miss(es),"
+               f" {cache_stats['entries']} entries, {cache_stats['mb']} MB")
+
     st.divider()
     m1, m2 = st.columns(2)
     m1.metric("Motion Coverage", f"{motion_pct:.2f}%")
@@ -1,91 +1,488 @@
 import streamlit as st
 import requests
-import base64
 import io
+import json
 import os
-import random
-from PIL import Image, ImageDraw, ImageFont
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from PIL import Image
 from collections import Counter
 
-try:
-    FONT = ImageFont.truetype("arial.ttf", 15)
-except Exception:
-    FONT = ImageFont.load_default()
-
-ROBOFLOW_INFER_URL = "https://detect.roboflow.com"
-
+from services.annotate import class_color, draw_detections
+from services.backends import DEFAULT_ONNX_PATH, RoboflowBackend, local_backend
+from services.dedup import DEFAULT_MAX_DISTANCE, FrameDeduper, dedup_controls, signature, signature_bytes
+from services.detections import Detections, DetectionsWriter
+from services.encoding import DEFAULT_MAX_SIDE
+from services import jobs
+from services.roboflow import FANOUT_MERGE_IOU, run_fanout, run_inference
+from services.result_cache import encode_side, get_result_cache, image_digest, result_key, supabase_lookup
+from services.profiling import bind, stage
+from services.tiling import DEFAULT_MAX_IN_FLIGHT, DEFAULT_OVERLAP, run_tiled
+from services.telemetry import track
+
+# input_size: the model's training resolution — uploads are shrunk to it
 PRESET_MODELS = {
-    "COCO YOLOv8n — 80 classes": {"model": "coco", "version": "3"},
-    "People Detection":           {"model": "people-detection-o4rdr", "version": "9"},
-    "Face Detection":             {"model": "face-detection-mik1i", "version": "18"},
-    "Vehicle Detection":          {"model": "vehicle-detection-3mmwj", "version": "1"},
+    "COCO YOLOv8n — 80 classes": {"model": "coco", "version": "3", "input_size": 640, "onnx": DEFAULT_ONNX_PATH},
+    "People Detection":           {"model": "people-detection-o4rdr", "version": "9", "input_size": 640},
+    "Face Detection":             {"model": "face-detection-mik1i", "version": "18", "input_size": 640},
+    "Vehicle Detection":          {"model": "vehicle-detection-3mmwj", "version": "1", "input_size": 640},
     "Custom (enter below)":       None,
 }
 
 
-def _image_to_base64(image: Image.Image) -> str:
-    buf = io.BytesIO()
-    image.save(buf, format="JPEG", quality=90)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode("utf-8")
+REMOTE_LOOKUP_TIMEOUT = 3  # seconds; the remote tier must never hold up a paid call for long
+
+
+def _supabase_predictions(cfg: dict, digest: str, model: str, version: str, confidence: int, side: int):
+    """Remote cache tier — a missing or unreachable Supabase is just a miss."""
+    try:
+        client = _lookup_client(cfg["SUPABASE_URL"], cfg["SUPABASE_SERVICE_KEY"])
+        return supabase_lookup(client, cfg["CV_OWNER_ID"], digest, model, version, confidence, side)
+    except Exception:
+        return None
+
+
+def _cached_inference(image: Image.Image, model: str, version: str, api_key: str, confidence: int,
+                      max_side: int = DEFAULT_MAX_SIDE, source_bytes: bytes = None, remote_cfg: dict = None) -> tuple:
+    """
+    `run_inference` behind the content-addressed result cache. With
+    `remote_cfg` (the job queue's service config), completed analyses of the
+    same owner in Supabase are consulted after the local tiers miss.
+    Returns (predictions, served_from_cache).
+    """
+    cache = get_result_cache()
+    digest = image_digest(image)
+    side = encode_side(image.size, max_side)
+    key = result_key(digest, model, version, confidence, side)
+
+    remote = None
+    if remote_cfg is not None:
+        remote = lambda: _supabase_predictions(remote_cfg, digest, model, version, confidence, side)  # noqa: E731
+    predictions = cache.get(key, remote=remote)
+    if predictions is not None:
+        return predictions, True
+
+    predictions = run_inference(image, model, version, api_key, confidence, max_side, source_bytes)
+    cache.put(key, predictions)
+    return predictions, False
+
+
+def _decode(file) -> Image.Image:
+    with stage("decode"):
+        return Image.open(file).convert("RGB")
+
+
+def _draw_predictions(image: Image.Image, predictions: list, threshold: int, nms_iou: float = None) -> tuple:
+    """Threshold, suppress and draw; returns (annotated array, kept `Detections`)."""
+    dets = Detections.from_predictions(predictions, data_keys=("class_id", "model"), keep_source=True)
+    dets = dets.filter(min_confidence=threshold / 100)
+
+    # Class-aware overlap suppression; None or >= 1.0 leaves boxes untouched
+    if nms_iou is not None and nms_iou < 1.0:
+        dets = dets.nms(nms_iou)
+
+    # One RGB array copy of the original, annotated in place
+    annotated = np.array(image.convert("RGB"))
+    classes = dets.class_names.tolist()
+    draw_detections(
+        annotated,
+        dets.xyxy,
+        labels=classes,
+        colors=[class_color(cls) for cls in classes],
+        thickness=3,
+        fill_alpha=0.15 if len(dets) > 100 else 0.0,
+        scores=dets.confidence,
+    )
+    return annotated, dets
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _iter_batch_inputs(files):
+    """
+    Yield (name, loader) for every image in the uploads, expanding ZIP archives.
+    Loaders return raw bytes and are only called when the image is submitted,
+    so at most the in-flight images are held in memory.
+    """
+    for f in files:
+        if f.name.lower().endswith(".zip"):
+            zf = zipfile.ZipFile(f)
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield f"{f.name}/{info.filename}", (lambda zf=zf, info=info: zf.read(info))
+        elif f.name.lower().endswith(IMAGE_EXTENSIONS):
+            yield f.name, f.getvalue
+
+
+def _infer_bytes(data: bytes, model: str, version: str, api_key: str, confidence: int, use_cache: bool,
+                 max_side: int = DEFAULT_MAX_SIDE) -> list:
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    if use_cache:
+        return _cached_inference(image, model, version, api_key, confidence, max_side, data)[0]
+    return run_inference(image, model, version, api_key, confidence, max_side, data)
+
+
+def _run_batch(inputs, model: str, version: str, api_key: str, confidence: int,
+               max_in_flight: int = 4, use_cache: bool = True, max_side: int = DEFAULT_MAX_SIDE):
+    """
+    Run inference over (name, loader) pairs with at most `max_in_flight`
+    requests outstanding. Yields (name, predictions, error) as results arrive,
+    in completion order.
+    """
+    inputs = iter(inputs)
+    infer = bind(_infer_bytes)
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="rf-batch") as pool:
+        pending = {}
+
+        def submit_next():
+            for name, loader in inputs:
+                fut = pool.submit(infer, loader(), model, version, api_key, confidence,
+                                  use_cache, max_side)
+                pending[fut] = name
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = pending.pop(fut)
+                try:
+                    yield name, fut.result(), None
+                except requests.HTTPError as e:
+                    yield name, None, f"HTTP {e.response.status_code}: {e.response.text[:200]}"
+                except Exception as e:
+                    yield name, None, str(e)
+                submit_next()
+
+
+def _run_local_batch(inputs, backend, confidence: int, batch_size: int = 8):
+    """
+    Run a local backend over (name, loader) pairs, `batch_size` images per
+    forward pass. Yields (name, predictions, error) in input order.
+    """
+    inputs = iter(inputs)
+    while True:
+        chunk, names = [], []
+        for name, loader in inputs:
+            try:
+                chunk.append(Image.open(io.BytesIO(loader())).convert("RGB"))
+                names.append(name)
+            except Exception as e:
+                yield name, None, f"Could not decode image: {e}"
+            if len(chunk) == batch_size:
+                break
+        if not chunk:
+            return
+        try:
+            results = backend.detect_batch(chunk, confidence)
+        except Exception as e:
+            for name in names:
+                yield name, None, str(e)
+            continue
+        yield from ((name, predictions, None) for name, predictions in zip(names, results))
+
+
+def _dedup_batch(inputs, run, deduper: FrameDeduper, stats: dict):
+    """
+    Pass only images that differ from the previously sent one to `run`
+    (a `_run_batch`-style generator over (name, loader) pairs); each
+    near-duplicate is yielded with its predecessor's result once that
+    arrives. `stats["reused"]` counts the skipped images.
+    """
+    followers, results = {}, {}
+    leader = None
+
+    def leaders():
+        nonlocal leader
+        for name, loader in inputs:
+            data = loader()
+            try:
+                sig = signature_bytes(data)
+            except ValueError:
+                sig = None
+            if sig is not None and leader is not None and deduper.match(sig, "batch") is not None:
+                followers[leader].append(name)
+                stats["reused"] += 1
+                continue
+            leader = name
+            followers[name] = []
+            if sig is not None:
+                deduper.store(sig, None, context="batch")
+            else:
+                deduper.reset()  # an undecodable leader must not leave the one before it matchable
+            yield name, (lambda data=data: data)
+
+    def flush():
+        for name in [n for n in followers if n in results]:
+            dups = followers[name]
+            while dups:
+                yield (dups.pop(0), *results[name])
+            if name != leader:  # the current leader may still gain followers
+                del followers[name], results[name]
+
+    for name, predictions, error in run(leaders()):
+        results[name] = (predictions, error)
+        yield name, predictions, error
+        yield from flush()
+    yield from flush()
+
+
+def _render_batch(model: str, version: str, api_key: str, threshold: int, use_cache: bool,
+                  max_side: int = DEFAULT_MAX_SIDE, backend=None):
+    files = st.file_uploader("Upload images or ZIP archives", type=["jpg", "jpeg", "png", "zip"],
+                             accept_multiple_files=True)
+    if backend is None:
+        max_in_flight = st.slider("Requests in flight", 1, 16, 4,
+                                  help="Concurrent Roboflow requests")
+    else:
+        max_in_flight = st.slider("Images per forward pass", 1, 32, 8,
+                                  help="Local inference batch size")
+    dedup = st.checkbox("Skip near-duplicate images", False,
+                        help="For frame dumps and bursts: an image that barely differs from the previous "
+                             "one reuses its detections instead of being sent")
+    dedup_distance = st.slider("Max hash distance (bits of 64)", 0, 16, DEFAULT_MAX_DISTANCE,
+                               key="rf_batch_dedup_bits") if dedup else None
+    if not files:
+        return
+
+    inputs = list(_iter_batch_inputs(files))
+    label = f"{model}/{version}" if backend is None else f"local {backend.runtime}"
+    st.caption(f"{len(inputs)} image(s) queued for `{label}`.")
+    if not inputs or not st.button("Run Batch 🎯"):
+        return
 
+    # Results stream to a JSONL file on disk — nothing per image is kept in memory
+    out = tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False)
+    # Plus one columnar Parquet table of every box when pyarrow is installed
+    boxes_path = out.name[:-len(".jsonl")] + ".parquet"
+    try:
+        boxes = DetectionsWriter(boxes_path)
+    except RuntimeError:
+        boxes = None
+    counts, failures, done = Counter(), 0, 0
+    progress = st.progress(0.0, text="Starting…")
+    if backend is None:
+        def run(items):
+            return _run_batch(items, model, version, api_key, threshold, max_in_flight, use_cache, max_side)
+    else:
+        def run(items):
+            return _run_local_batch(items, backend, threshold, max_in_flight)
+    dedup_stats = {"reused": 0}
+    if dedup:
+        results = _dedup_batch(inputs, run, FrameDeduper(dedup_distance), dedup_stats)
+    else:
+        results = run(inputs)
+    with out, track("roboflow_batch", model=label, max_in_flight=max_in_flight) as event:
+        for name, predictions, error in results:
+            done += 1
+            if error:
+                failures += 1
+                out.write(json.dumps({"image": name, "error": error}) + "\n")
+            else:
+                dets = Detections.from_predictions(predictions, data_keys=("class_id",), keep_source=True)
+                dets = dets.filter(min_confidence=threshold / 100)
+                counts.update(dets.counts())
+                out.write(json.dumps({"image": name, "predictions": dets.to_predictions()}) + "\n")
+                if boxes is not None:
+                    boxes.write(dets, image=name)
+            progress.progress(done / len(inputs), text=f"{done} / {len(inputs)} — {name}")
+        if boxes is not None:
+            boxes.close()
+        event.update(images=done, failed=failures, boxes=sum(counts.values()), reused=dedup_stats["reused"])
+
+    st.subheader("Batch Summary")
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Images", done)
+    m2.metric("Detections", sum(counts.values()))
+    m3.metric("Failed", failures)
+    if dedup:
+        st.caption(f"♻️ {dedup_stats['reused']} of {done} image(s) were near-duplicates and reused the previous "
+                   f"image's detections ({dedup_stats['reused'] / max(done, 1):.0%} hit rate).")
+    if counts:
+        st.dataframe([{"Class": c, "Count": n} for c, n in counts.most_common()],
+                     use_container_width=True, hide_index=True)
+
+    c1, c2, c3 = st.columns(3)
+    with open(out.name, "rb") as fh:
+        c1.download_button("⬇ Download Predictions JSONL", fh, file_name="predictions.jsonl")
+    os.unlink(out.name)
+    _download_button(dict(counts), "class_counts.json", "⬇ Download Class Counts", container=c2)
+    if boxes is not None and boxes.boxes:
+        with open(boxes_path, "rb") as fh:
+            c3.download_button("⬇ Download Boxes Parquet", fh, file_name="boxes.parquet")
+    if os.path.exists(boxes_path):
+        os.unlink(boxes_path)
+
+
+def _show_results(image: Image.Image, predictions: list, threshold: int, nms_iou: float):
+    """Annotated image, per-class summary and downloads."""
+    with stage("draw"):
+        annotated, dets = _draw_predictions(image, predictions, threshold, nms_iou)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.image(image, caption="Original", use_container_width=True)
+    with col2:
+        st.image(annotated, caption="Annotated", use_container_width=True)
 
-def _run_inference(image: Image.Image, model: str, version: str, api_key: str, confidence: int) -> list:
-    """Call Roboflow infer REST endpoint directly — no SDK required."""
-    url = f"{ROBOFLOW_INFER_URL}/{model}/{version}"
-    b64 = _image_to_base64(image)
+    counts = dets.counts()
+    st.subheader("Detection Summary")
+    cols = st.columns(min(len(counts), 4))
+    for i, (cls, cnt) in enumerate(counts.items()):
+        cols[i % len(cols)].metric(cls.title(), cnt)
 
-    resp = requests.post(
-        url,
-        params={"api_key": api_key, "confidence": confidence / 100},
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data=b64,
-        timeout=30,
+    st.divider()
+    c1, c2 = st.columns(2)
+    with c1:
+        _download_button(annotated, "annotated.png", "⬇ Download Annotated Image")
+    with c2:
+        _download_button(dets, "predictions.json", "⬇ Download Predictions JSON")
+
+    st.success("✅ Detection complete.")
+
+
+def _render_fanout(image: Image.Image, configs: list, api_key: str, threshold: int, nms_iou: float,
+                   use_cache: bool, source_bytes: bytes = None):
+    """Run several presets concurrently on one encode and show the merged result."""
+    models = [(c["model"], c["version"]) for c in configs]
+    max_side = max(c["input_size"] for c in configs)
+
+    with st.spinner(f"Running {len(models)} models in parallel…"):
+        start = time.perf_counter()
+        with track("roboflow_detect", model="fanout", models=[f"{m}/{v}" for m, v in models]) as event, \
+                stage("detect"):
+            predictions, per_model = run_fanout(
+                image, models, api_key, threshold, max_side, source_bytes,
+                cache=get_result_cache() if use_cache else None,
+            )
+            event.update(boxes=len(predictions), failed=sum(r["error"] is not None for r in per_model.values()))
+        wall_ms = (time.perf_counter() - start) * 1000
+
+    for name, r in per_model.items():
+        if r["error"]:
+            st.error(f"`{name}` failed: {r['error'][:300]}")
+
+    st.subheader("Per-model Latency")
+    st.dataframe(
+        [{"Model": name, "Boxes": r["boxes"], "Latency (ms)": r["ms"], "Cached": r["cached"]}
+         for name, r in per_model.items()],
+        use_container_width=True, hide_index=True,
     )
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("predictions", [])
+    sequential_ms = sum(r["ms"] or 0 for r in per_model.values())
+    st.caption(f"Wall time {wall_ms:.0f} ms · sum of model latencies {sequential_ms:.0f} ms · "
+               f"merged with class-aware NMS (IoU {FANOUT_MERGE_IOU})")
+
+    if not predictions:
+        st.warning("No objects detected. Try lowering the confidence threshold.")
+        return
+    _show_results(image, predictions, threshold, nms_iou)
 
 
-def _draw_predictions(image: Image.Image, predictions: list, threshold: int) -> tuple:
-    annotated = image.copy()
-    draw = ImageDraw.Draw(annotated)
-    colors = {}
-    filtered = []
+def _render_tiled(image: Image.Image, backend, label: str, threshold: int, nms_iou: float,
+                  tile: int, overlap: float, max_in_flight: int):
+    """Tiled inference for small objects; bypasses the whole-image result cache."""
+    def infer(crop, box):
+        return backend.detect(crop, threshold)
+
+    with st.spinner(f"Running `{label}` on tiles…"):
+        try:
+            with track("roboflow_detect", model=label, backend=backend.name, tiled=True) as event, \
+                    stage("detect"):
+                predictions, stats = run_tiled(image, infer, tile, overlap, max_in_flight)
+                event.update(boxes=len(predictions), tiles=stats["requests"])
+        except Exception as e:
+            st.error(f"Tiled inference failed: {e}")
+            return
+
+    st.caption(
+        f"🧩 {stats['sent']} of {stats['tiles']} tile(s) sent ({stats['skipped']} near-empty skipped)"
+        f"{' + full-image pass' if stats['full_pass'] else ''} · {stats['failed']} failed · "
+        f"{stats['raw_boxes']} → {stats['merged_boxes']} boxes after seam NMS · "
+        f"tile p50 {stats['tile_p50_ms']} ms · wall {stats['wall_ms']:.0f} ms"
+    )
+    if not predictions:
+        st.warning("No objects detected. Try lowering the confidence threshold.")
+        return
+    _show_results(image, predictions, threshold, nms_iou)
+
+
+def _job_queue_config():
+    """Owner/project/service key for the background queue, or None when not configured."""
+    cfg = {}
+    for key in ("SUPABASE_URL", "SUPABASE_SERVICE_KEY", "CV_OWNER_ID", "CV_PROJECT_ID"):
+        cfg[key] = st.secrets.get(key) or os.getenv(key)
+    return cfg if all(cfg.values()) else None
+
+
+@st.cache_resource
+def _job_client(url: str, key: str):
+    return jobs.service_client(url, key)
 
-    for pred in predictions:
-        conf = pred.get("confidence", 0) * 100
-        if conf < threshold:
-            continue
 
-        cls = pred.get("class", "object")
-        filtered.append(pred)
+@st.cache_resource
+def _lookup_client(url: str, key: str):
+    return jobs.service_client(url, key, timeout=REMOTE_LOOKUP_TIMEOUT)
 
-        if cls not in colors:
-            colors[cls] = tuple(random.choices(range(50, 230), k=3))
 
-        x, y, w, h = pred["x"], pred["y"], pred["width"], pred["height"]
-        left, top     = int(x - w / 2), int(y - h / 2)
-        right, bottom = int(x + w / 2), int(y + h / 2)
+def _jobs_active(rows) -> bool:
+    return any(r["status"] not in jobs.TERMINAL_STATUSES for r in rows)
 
-        draw.rectangle([left, top, right, bottom], outline=colors[cls], width=3)
-        label = f"{cls} {conf:.1f}%"
-        text_y = max(0, top - 18)
-        draw.rectangle([left, text_y, left + len(label) * 7, text_y + 16], fill=colors[cls])
-        draw.text((left + 2, text_y), label, fill="black", font=FONT)
 
-    return annotated, filtered
+def _render_jobs(client):
+    """Background job table; it only polls while a job is still queued or processing."""
+    if st.session_state.get("rf_jobs_active", True):
+        _poll_jobs(client)
+    else:
+        _jobs_table(client, jobs.get_jobs(client, st.session_state.get("rf_jobs", [])))
+
+
+@st.fragment(run_every="3s")
+def _poll_jobs(client):
+    rows = jobs.get_jobs(client, st.session_state.get("rf_jobs", []))
+    _jobs_table(client, rows)
+    if not _jobs_active(rows):
+        # Every job is terminal: one full rerun swaps in the static table and the timer stops
+        st.session_state["rf_jobs_active"] = False
+        st.rerun()
+
+
+def _jobs_table(client, rows):
+    st.subheader("Background Jobs")
+    st.dataframe(
+        [
+            {
+                "Job": r["id"][:8],
+                "Model": r["model_name"],
+                "Status": r["status"],
+                "Detections": len((r.get("results") or {}).get("predictions", [])) if r["status"] == "completed" else None,
+                "Error": r.get("error_message"),
+            }
+            for r in sorted(rows, key=lambda r: r["created_at"], reverse=True)
+        ],
+        use_container_width=True, hide_index=True,
+    )
+    for r in rows:
+        if r["status"] == "queued":
+            if st.button(f"Cancel {r['id'][:8]}", key=f"cancel_{r['id']}"):
+                jobs.cancel(client, r["id"])
 
 
-def _download_button(obj, filename, label):
+def _download_button(obj, filename, label, container=st):
+    if isinstance(obj, Detections):
+        obj = obj.to_predictions()
     if isinstance(obj, (dict, list)):
-        import json
         buf = io.BytesIO(json.dumps(obj, indent=2).encode())
     else:
         buf = io.BytesIO()
-        obj.save(buf, format="PNG")
+        Image.fromarray(obj).save(buf, format="PNG")
     buf.seek(0)
-    st.download_button(label, buf, file_name=filename)
+    container.download_button(label, buf, file_name=filename)
 
 
 def render():
@@ -101,6 +498,11 @@ def render():
     st.sidebar.subheader("Model Settings")
     model_label = st.sidebar.selectbox("Preset model", list(PRESET_MODELS.keys()))
     model_cfg = PRESET_MODELS[model_label]
+    fanout_labels = st.sidebar.multiselect(
+        "Fan-out: run several presets", [label for label, cfg in PRESET_MODELS.items() if cfg],
+        help="Pick two or more to run them concurrently on one upload and merge the boxes",
+    )
+    fanout = [PRESET_MODELS[label] for label in fanout_labels] if len(fanout_labels) > 1 else None
 
     custom_model = custom_version = None
     if model_cfg is None:
@@ -108,72 +510,160 @@ def render():
         custom_version = st.sidebar.text_input("Version", placeholder="1")
         if custom_input and custom_version:
             custom_model = custom_input
+        max_side = st.sidebar.number_input("Upload max side (px)", 320, 4096, DEFAULT_MAX_SIDE, 32,
+                                           help="Images are shrunk to this before upload")
+    else:
+        max_side = model_cfg["input_size"]
+
+    backend = None
+    if model_cfg and model_cfg.get("onnx"):
+        where = st.sidebar.radio("Backend", ["Roboflow API", "Local CPU (ONNX)"], horizontal=True,
+                                 help="Run this preset on the hosted API or on a local exported model")
+        if where != "Roboflow API":
+            try:
+                backend = local_backend(model_cfg["onnx"], model_cfg["input_size"])
+                st.sidebar.caption(f"Local model `{model_cfg['onnx']}` via {backend.runtime}")
+            except Exception as e:
+                st.sidebar.warning(f"{e}. Using the Roboflow API instead.")
 
     threshold = st.sidebar.slider("Confidence threshold (%)", 0, 100, 40)
+    nms_iou   = st.sidebar.slider("Overlap suppression (IoU)", 0.05, 1.0, 1.0, 0.05,
+                                  help="Merge overlapping boxes of the same class; 1.0 = off")
+    tiled = st.sidebar.checkbox("Tiled inference (small objects)", False,
+                                help="Split large images into overlapping model-sized tiles; "
+                                     "near-empty tiles are skipped")
+    if tiled:
+        tile = st.sidebar.slider("Tile size (px)", 320, 1536, min(max(int(max_side), 320), 1536), 32)
+        overlap = st.sidebar.slider("Tile overlap", 0.0, 0.5, DEFAULT_OVERLAP, 0.05)
+        max_in_flight = st.sidebar.slider("Max tiles in flight", 1, 16, DEFAULT_MAX_IN_FLIGHT)
+    use_cache = backend is None and st.sidebar.checkbox(
+        "Reuse cached results", True, help="Skip the API call for an identical image and model settings"
+    )
+    if use_cache:
+        cs = get_result_cache().stats()
+        st.sidebar.caption(
+            f"Cache: {cs['memory_hits'] + cs['disk_hits'] + cs['remote_hits']} hit(s) · "
+            f"{cs['misses']} miss(es) · {cs['disk_entries']} stored"
+        )
+
+    queue_cfg = _job_queue_config()
+    background = queue_cfg is not None and backend is None and st.sidebar.checkbox(
+        "Run in background queue", False, help="Queue the analysis and keep working while it runs"
+    )
+    job_client = _job_client(queue_cfg["SUPABASE_URL"], queue_cfg["SUPABASE_SERVICE_KEY"]) if queue_cfg else None
+
+    # Resolve model/version
+    if model_cfg:
+        model, version = model_cfg["model"], model_cfg["version"]
+    elif custom_model and custom_version:
+        model, version = custom_model, custom_version
+    else:
+        model = version = None
 
     # Input
-    mode = st.radio("Input source", ["Upload Image", "Webcam"], horizontal=True)
-    image = None
+    mode = st.radio("Input source", ["Upload Image", "Webcam", "Batch"], horizontal=True)
+    image = source_bytes = deduper = None
+
+    if mode == "Batch":
+        if model is None:
+            st.info("Enter a model ID and version in the sidebar.")
+            return
+        _render_batch(model, version, ROBOFLOW_KEY, threshold, use_cache, max_side, backend)
+        return
 
     if mode == "Upload Image":
         f = st.file_uploader("Upload image", type=["jpg", "jpeg", "png"])
         if f:
-            image = Image.open(f).convert("RGB")
+            source_bytes = f.getvalue()
+            image = _decode(f)
     else:
         cam = st.camera_input("Take a photo")
+        deduper = dedup_controls("roboflow_detect")
         if cam:
-            image = Image.open(cam).convert("RGB")
+            source_bytes = cam.getvalue()
+            image = _decode(cam)
+
+    # Shown with or without an upload, so queued jobs stay visible after the input is cleared
+    if job_client is not None and st.session_state.get("rf_jobs"):
+        _render_jobs(job_client)
 
     if image is None:
         return
 
     st.image(image, caption="Input image", use_container_width=True)
 
-    # Resolve model/version
-    if model_cfg:
-        model, version = model_cfg["model"], model_cfg["version"]
-    elif custom_model and custom_version:
-        model, version = custom_model, custom_version
-    else:
+    if model is None and not fanout:
         st.info("Enter a model ID and version in the sidebar.")
         return
 
     if not st.button("Run Detection 🎯"):
         return
 
-    with st.spinner(f"Running `{model}/{version}`…"):
+    if fanout:
+        if background:
+            st.caption("Fan-out runs in the foreground; the background queue takes one model per job.")
+        _render_fanout(image, fanout, ROBOFLOW_KEY, threshold, nms_iou, use_cache, source_bytes)
+        return
+
+    if background:
         try:
-            predictions = _run_inference(image, model, version, ROBOFLOW_KEY, threshold)
-        except requests.HTTPError as e:
-            st.error(f"Roboflow API error {e.response.status_code}: {e.response.text[:300]}")
-            return
+            job_id = jobs.enqueue(
+                job_client, queue_cfg["CV_OWNER_ID"], queue_cfg["CV_PROJECT_ID"], "object_detection",
+                source_bytes,
+                {"model": model, "version": version, "confidence": threshold, "max_side": max_side},
+                model_provider="roboflow", model_name=f"{model}/{version}",
+                input_source=mode.lower(), checksum=image_digest(image),
+            )
         except Exception as e:
-            st.error(f"Request failed: {e}")
+            st.error(f"Could not queue analysis: {e}")
             return
+        st.session_state.setdefault("rf_jobs", []).append(job_id)
+        st.session_state["rf_jobs_active"] = True
+        st.toast(f"Queued analysis `{job_id[:8]}` — results appear under Background Jobs.")
+        st.rerun()
+
+    label = f"{model}/{version}" if backend is None else f"{model_cfg['onnx']} ({backend.runtime})"
+    if tiled:
+        _render_tiled(image, backend or RoboflowBackend(model, version, ROBOFLOW_KEY, tile), label,
+                      threshold, nms_iou, tile, overlap, max_in_flight)
+        return
+
+    # Near-identical webcam captures reuse the last analysed frame's detections
+    context = (label, threshold, max_side)
+    sig = signature(np.asarray(image)) if deduper is not None else None
+    reused = deduper.match(sig, context) if deduper is not None else None
+    if reused is not None:
+        predictions, cached = reused[0], False
+        st.caption("♻️ Near-identical to the last analysed frame — reused its detections, no API call made.")
+    else:
+        with st.spinner(f"Running `{label}`…"):
+            try:
+                with track("roboflow_detect", model=label, backend=(backend or RoboflowBackend).name) as event, \
+                        stage("detect"):
+                    if backend is not None:
+                        predictions, cached = backend.detect(image, threshold), False
+                    elif use_cache:
+                        predictions, cached = _cached_inference(image, model, version, ROBOFLOW_KEY, threshold,
+                                                                max_side, source_bytes, queue_cfg)
+                    else:
+                        predictions = run_inference(image, model, version, ROBOFLOW_KEY, threshold,
+                                                     max_side, source_bytes)
+                        cached = False
+                    event.update(boxes=len(predictions), cache_hit=cached)
+            except requests.HTTPError as e:
+                st.error(f"Roboflow API error {e.response.status_code}: {e.response.text[:300]}")
+                return
+            except Exception as e:
+                st.error(f"Request failed: {e}")
+                return
+        if deduper is not None:
+            deduper.store(sig, predictions, context=context)
+
+    if cached:
+        st.caption("⚡ Served from result cache — no API call made.")
 
     if not predictions:
         st.warning("No objects detected. Try lowering the confidence threshold.")
         return
 
-    annotated, filtered = _draw_predictions(image, predictions, threshold)
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.image(image, caption="Original", use_container_width=True)
-    with col2:
-        st.image(annotated, caption="Annotated", use_container_width=True)
-
-    counts = Counter(p["class"] for p in filtered)
-    st.subheader("Detection Summary")
-    cols = st.columns(min(len(counts), 4))
-    for i, (cls, cnt) in enumerate(counts.items()):
-        cols[i % len(cols)].metric(cls.title(), cnt)
-
-    st.divider()
-    c1, c2 = st.columns(2)
-    with c1:
-        _download_button(annotated, "annotated.png", "⬇ Download Annotated Image")
-    with c2:
-        _download_button(filtered, "predictions.json", "⬇ Download Predictions JSON")
-
-    st.success("✅ Detection complete.")
\ No newline at end of file
+    _show_results(image, predictions, threshold, nms_iou)
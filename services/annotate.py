@@ -0,0 +1,111 @@
+"""
+Shared box-and-label renderer for every detection module.
+
+Draws in place on RGB NumPy arrays with OpenCV primitives, so annotating
+costs no extra full-image copy. Class-label patches are rendered once per
+text and colour and cached; confidence scores, which almost never repeat,
+are drawn straight onto the image beside them. Class colours come from a
+stable hash so they are identical across reruns, and translucent fills are
+blended box by box, touching only each box's pixels.
+"""
+import colorsys
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+FONT_FACE = 0  # cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+FONT_THICKNESS = 1
+LABEL_PAD = 3
+
+
+def class_color(name: str) -> tuple:
+    """Deterministic, well-saturated RGB colour for a class name."""
+    h = int.from_bytes(hashlib.md5(str(name).encode()).digest()[:4], "little")
+    hue = (h % 360) / 360
+    r, g, b = colorsys.hsv_to_rgb(hue, 0.65 + (h >> 9) % 30 / 100, 0.95)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+
+def hex_to_rgb(value: str) -> tuple:
+    value = value.lstrip("#")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+@lru_cache(maxsize=1024)
+def _label_patch(text: str, color: tuple) -> np.ndarray:
+    """Pre-rendered label: black text on a filled background of `color`."""
+    (tw, th), baseline = cv2.getTextSize(text, FONT_FACE, FONT_SCALE, FONT_THICKNESS)
+    patch = np.empty((th + baseline + 2 * LABEL_PAD, tw + 2 * LABEL_PAD, 3), dtype=np.uint8)
+    patch[:] = color
+    cv2.putText(patch, text, (LABEL_PAD, LABEL_PAD + th), FONT_FACE, FONT_SCALE,
+                (0, 0, 0), FONT_THICKNESS, cv2.LINE_AA)
+    patch.setflags(write=False)
+    return patch
+
+
+def _draw_score(img: np.ndarray, text: str, color: tuple, x: int, y: int, height: int):
+    """Score text on a `color` background of the label's height, drawn directly at (x, y)."""
+    (tw, _), baseline = cv2.getTextSize(text, FONT_FACE, FONT_SCALE, FONT_THICKNESS)
+    cv2.rectangle(img, (x, y), (x + tw + 2 * LABEL_PAD - 1, y + height - 1), color, -1)
+    cv2.putText(img, text, (x + LABEL_PAD, y + height - LABEL_PAD - baseline), FONT_FACE, FONT_SCALE,
+                (0, 0, 0), FONT_THICKNESS, cv2.LINE_AA)
+
+
+def _blend_box(img: np.ndarray, x1: int, y1: int, x2: int, y2: int, color: tuple, alpha: float):
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2 + 1), min(h, y2 + 1)
+    if x2 > x1 and y2 > y1:
+        roi = img[y1:y2, x1:x2]
+        roi[:] = cv2.addWeighted(roi, 1 - alpha, np.full_like(roi, color), alpha, 0)
+
+
+def _blit(img: np.ndarray, patch: np.ndarray, x: int, y: int):
+    h, w = img.shape[:2]
+    ph, pw = patch.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + pw), min(h, y + ph)
+    if x1 > x0 and y1 > y0:
+        img[y0:y1, x0:x1] = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def draw_detections(img: np.ndarray, boxes, labels=None, colors=None, thickness: int = 2,
+                    fill_alpha: float = 0.0, scores=None) -> np.ndarray:
+    """
+    Draw (N, 4) xyxy boxes with optional labels onto an RGB uint8 array in place.
+    `colors` is one RGB tuple per box (defaults to green). `scores` (0–1)
+    are appended to the labels as percentages. With `fill_alpha` > 0, box
+    interiors get a translucent tint. Returns `img` for convenience.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4).round().astype(np.int32)
+    n = len(boxes)
+    if n == 0:
+        return img
+    colors = colors or [(0, 255, 100)] * n
+
+    if fill_alpha > 0:
+        for (x1, y1, x2, y2), color in zip(boxes, colors):
+            _blend_box(img, x1, y1, x2, y2, color, fill_alpha)
+
+    for (x1, y1, x2, y2), color in zip(boxes, colors):
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
+
+    if labels is not None:
+        percents = [f"{s * 100:.1f}%" for s in np.asarray(scores).tolist()] if scores is not None else [None] * n
+        for (x1, y1, _, _), color, label, percent in zip(boxes, colors, labels, percents):
+            if not label:
+                continue
+            patch = _label_patch(label, tuple(color))
+            top = max(0, y1 - patch.shape[0])
+            _blit(img, patch, x1, top)
+            if percent is not None:
+                _draw_score(img, percent, tuple(color), x1 + patch.shape[1], top, patch.shape[0])
+    return img
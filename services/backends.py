@@ -0,0 +1,237 @@
+"""
+Pluggable object-detection backends.
+
+A backend turns a PIL image into Roboflow-style prediction dicts
+({x, y, width, height, class, confidence}, centre format, original pixels),
+so the drawing, NMS, tiling and batch code never needs to know where the
+boxes came from.
+
+`RoboflowBackend` wraps the hosted API. `OnnxYoloBackend` runs an exported
+YOLO model on the CPU with `cv2.dnn` (or ONNX Runtime when it is installed):
+images are letterboxed to the model input, stacked into one NCHW blob per
+batch, and the raw output tensor is decoded with numpy in a single pass
+before class-aware NMS. Both YOLOv5-style (anchors, 5 + classes) and
+YOLOv8-style (4 + classes, anchors) output layouts are recognised.
+
+    yolo export model=yolov8n.pt format=onnx dynamic=True   # -> yolov8n.onnx
+"""
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from services.encoding import DEFAULT_MAX_SIDE
+from services.nms import batched_nms
+from services.roboflow import run_inference
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+DEFAULT_ONNX_PATH = os.environ.get("CV_YOLO_ONNX", os.path.join("models", "yolov8n.onnx"))
+DEFAULT_INPUT_SIZE = 640
+DEFAULT_NMS_IOU = 0.45
+LETTERBOX_FILL = 114
+MAX_CANDIDATES = 30000  # boxes above the confidence floor passed to NMS per image
+
+COCO_CLASSES = (
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog",
+    "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella",
+    "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", "kite",
+    "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle",
+    "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange",
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant",
+    "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone",
+    "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors",
+    "teddy bear", "hair drier", "toothbrush",
+)
+
+
+class DetectorBackend:
+    """Image(s) in, prediction dicts out. `confidence` is a percentage, as in the UI."""
+
+    name = "backend"
+
+    def detect(self, image: Image.Image, confidence: int, source_bytes: bytes = None) -> list:
+        raise NotImplementedError
+
+    def detect_batch(self, images: list, confidence: int) -> list:
+        """One prediction list per image; backends that can batch override this."""
+        return [self.detect(image, confidence) for image in images]
+
+
+class RoboflowBackend(DetectorBackend):
+    """Hosted Roboflow model; one HTTP request per image."""
+
+    name = "roboflow"
+
+    def __init__(self, model: str, version: str, api_key: str, max_side: int = DEFAULT_MAX_SIDE):
+        self.model, self.version, self.api_key, self.max_side = model, version, api_key, max_side
+
+    def detect(self, image, confidence, source_bytes=None):
+        return run_inference(image, self.model, self.version, self.api_key, confidence,
+                             self.max_side, source_bytes)
+
+
+# ---------------------------------------------------------------------------
+# Local YOLO (ONNX)
+# ---------------------------------------------------------------------------
+
+def letterbox(rgb: np.ndarray, size: int, fill: int = LETTERBOX_FILL) -> tuple:
+    """
+    Resize keeping aspect ratio and pad to `size` x `size`.
+    Returns (padded, scale, (pad_x, pad_y)) so boxes can be mapped back with
+    (v - pad) / scale.
+    """
+    h, w = rgb.shape[:2]
+    scale = min(size / w, size / h)
+    new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+    if (new_w, new_h) != (w, h):
+        interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        rgb = cv2.resize(rgb, (new_w, new_h), interpolation=interp)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = np.full((size, size, 3), fill, dtype=np.uint8)
+    padded[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = rgb
+    return padded, scale, (pad_x, pad_y)
+
+
+def decode_yolo(output: np.ndarray, num_classes: int, conf_floor: float) -> tuple:
+    """
+    Vectorised decode of one image's raw YOLO output into model-input pixels.
+    Accepts (4 + nc, A) [v8], (A, 4 + nc) or (A, 5 + nc) [v5, with objectness].
+    Returns (xyxy boxes, scores, class ids) above `conf_floor`.
+    """
+    out = np.asarray(output, dtype=np.float32)
+    out = out.reshape(out.shape[-2], out.shape[-1]) if out.ndim > 2 else out
+    if out.shape[0] in (4 + num_classes, 5 + num_classes) and out.shape[1] not in (4 + num_classes, 5 + num_classes):
+        out = out.T  # v8 exports are channel-first
+    if out.shape[1] == 5 + num_classes:
+        class_scores = out[:, 5:] * out[:, 4:5]
+    elif out.shape[1] == 4 + num_classes:
+        class_scores = out[:, 4:]
+    else:
+        raise ValueError(f"Unexpected YOLO output shape {output.shape} for {num_classes} classes")
+
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_scores)), class_ids]
+    keep = scores >= conf_floor
+    if np.count_nonzero(keep) > MAX_CANDIDATES:
+        keep[np.argsort(-scores)[MAX_CANDIDATES:]] = False
+    cx, cy, w, h = out[keep, :4].T
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, scores[keep], class_ids[keep]
+
+
+def _to_predictions(boxes, scores, class_ids, class_names) -> list:
+    return [
+        {
+            "x": float((x0 + x1) / 2), "y": float((y0 + y1) / 2),
+            "width": float(x1 - x0), "height": float(y1 - y0),
+            "class": class_names[c] if c < len(class_names) else str(c),
+            "class_id": int(c), "confidence": float(s),
+        }
+        for (x0, y0, x1, y1), s, c in zip(boxes.tolist(), scores.tolist(), class_ids.tolist())
+    ]
+
+
+class OnnxYoloBackend(DetectorBackend):
+    """
+    CPU YOLO from an exported ONNX file. Models exported with a dynamic batch
+    axis run a whole batch per forward pass; fixed-batch exports fall back
+    to one image per pass automatically.
+    """
+
+    name = "onnx"
+
+    def __init__(self, path: str = DEFAULT_ONNX_PATH, input_size: int = DEFAULT_INPUT_SIZE,
+                 class_names=COCO_CLASSES, nms_iou: float = DEFAULT_NMS_IOU, runtime: str = "auto"):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"ONNX model not found at {path!r}; export one with "
+                                    "`yolo export model=yolov8n.pt format=onnx dynamic=True` "
+                                    "or point CV_YOLO_ONNX at it")
+        self.path, self.input_size, self.nms_iou = path, input_size, nms_iou
+        self.class_names = tuple(class_names)
+        self._lock = threading.Lock()  # cv2.dnn nets are not safe to run concurrently
+        self._batched = True
+        self._session = self._net = None
+
+        if runtime in ("auto", "onnxruntime"):
+            try:
+                import onnxruntime as ort
+                self._session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+                self._input_name = self._session.get_inputs()[0].name
+            except ImportError:
+                if runtime == "onnxruntime":
+                    raise
+        if self._session is None:
+            if cv2 is None:
+                raise RuntimeError(f"OpenCV is unavailable: {_import_error}")
+            self._net = cv2.dnn.readNetFromONNX(path)
+            self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.runtime = "onnxruntime" if self._session is not None else "cv2.dnn"
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        if self._session is not None:
+            return self._session.run(None, {self._input_name: blob})[0]
+        self._net.setInput(blob)
+        return self._net.forward()
+
+    def _infer(self, blob: np.ndarray) -> np.ndarray:
+        """Raw outputs for an NCHW blob, one leading row per image."""
+        with self._lock:
+            if self._batched or len(blob) == 1:
+                try:
+                    out = self._forward(blob)
+                    if out.shape[0] == len(blob):
+                        return out
+                except Exception:
+                    if len(blob) == 1:
+                        raise
+                self._batched = False  # fixed-batch export; stop trying whole batches
+            return np.concatenate([self._forward(blob[i:i + 1]) for i in range(len(blob))])
+
+    def detect(self, image, confidence, source_bytes=None):
+        return self.detect_batch([image], confidence)[0]
+
+    def detect_batch(self, images, confidence):
+        if not images:
+            return []
+        boxed = [letterbox(np.asarray(img.convert("RGB")), self.input_size) for img in images]
+        # uint8 HWC -> float NCHW in [0, 1], one contiguous blob for the batch
+        blob = np.ascontiguousarray(np.stack([b[0] for b in boxed]).transpose(0, 3, 1, 2), dtype=np.float32)
+        blob /= 255.0
+        outputs = self._infer(blob)
+
+        floor = confidence / 100
+        results = []
+        for image, out, (_, scale, (pad_x, pad_y)) in zip(images, outputs, boxed):
+            boxes, scores, class_ids = decode_yolo(out, len(self.class_names), floor)
+            if len(boxes):
+                keep = batched_nms(boxes, scores, class_ids, self.nms_iou)
+                boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+                boxes = (boxes - [pad_x, pad_y, pad_x, pad_y]) / scale
+                boxes = boxes.clip(0, [image.width, image.height, image.width, image.height])
+                visible = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])  # not entirely in padding
+                boxes, scores, class_ids = boxes[visible], scores[visible], class_ids[visible]
+            results.append(_to_predictions(boxes, scores, class_ids, self.class_names))
+        return results
+
+
+_local_backends = {}
+_local_lock = threading.Lock()
+
+
+def local_backend(path: str = DEFAULT_ONNX_PATH, input_size: int = DEFAULT_INPUT_SIZE,
+                  class_names=COCO_CLASSES) -> OnnxYoloBackend:
+    """Process-wide `OnnxYoloBackend` per model file, loaded on first use."""
+    key = (os.path.abspath(path), input_size)
+    with _local_lock:
+        if key not in _local_backends:
+            _local_backends[key] = OnnxYoloBackend(path, input_size, class_names)
+        return _local_backends[key]
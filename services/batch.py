@@ -0,0 +1,506 @@
+"""
+Offline bulk detection without the Streamlit runtime.
+
+    python -m services.batch faces photos/ "shots/**/*.jpg" --out faces.jsonl
+    python -m services.batch motion clip.mp4 --every-n 2 --out motion.parquet
+    ROBOFLOW_API_KEY=... python -m services.batch roboflow photos/ --model-id coco/3
+    python -m services.batch onnx photos/ --onnx-path models/yolov8n.onnx --out objects.jsonl
+    python -m services.batch roboflow frames/ --dedup-distance 4 --out objects.jsonl
+
+Inputs are files, directories or globs; images and videos are told apart by
+extension. Work is spread over a process pool sized to the usable cores.
+Long videos are split into frame ranges for stateless detectors, and files
+above `MMAP_MIN_BYTES` are decoded straight from a memory map. Results are
+streamed to JSONL (or Parquet when pyarrow is installed). Each output record
+covers one image, frame or frame pair. With `--dedup-distance`, an image or
+video frame that is a near-duplicate of the previous one analysed (see
+services.dedup) reuses its results; such records carry `reused_from`.
+
+`run()` is the library entry point; it yields the same records.
+"""
+import argparse
+import glob
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+from PIL import Image
+
+from services.encoding import DEFAULT_MAX_BYTES, DEFAULT_MAX_SIDE
+from services.faces import DEFAULT_FAST_MIN_FACE
+from services.motion import BACKGROUND_MODELS
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+MMAP_MIN_BYTES = 8 * 1024 * 1024
+VIDEO_CHUNK_FRAMES = 600
+
+
+def usable_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# --------------------------------------------------
+# Inputs
+# --------------------------------------------------
+def expand_inputs(patterns, recursive: bool = False) -> list:
+    """Files, directories and globs -> sorted unique list of image/video paths."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            walker = os.walk(pattern) if recursive else [(pattern, [], os.listdir(pattern))]
+            for root, _, names in walker:
+                paths.extend(os.path.join(root, n) for n in names)
+        elif any(c in pattern for c in "*?["):
+            paths.extend(glob.glob(pattern, recursive=True))
+        else:
+            paths.append(pattern)
+    wanted = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+    return sorted({p for p in paths if os.path.isfile(p) and p.lower().endswith(wanted)})
+
+
+def is_video(path: str) -> bool:
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def load_image(path: str) -> np.ndarray:
+    """Decode an image file to RGB; large files are decoded from a memory map instead of a copy."""
+    if os.path.getsize(path) >= MMAP_MIN_BYTES:
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            del buf  # the map cannot close while a view is exported
+    else:
+        bgr = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"Could not decode image: {path}")
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def _video_frames(path, start=0, stop=None, every_n=1):
+    """Yield (frame_index, RGB frame) for frames [start, stop) of a video."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        idx = start
+        while stop is None or idx < stop:
+            if (idx - start) % every_n:
+                if not cap.grab():
+                    break
+            else:
+                ok, bgr = cap.read()
+                if not ok:
+                    break
+                yield idx, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            idx += 1
+    finally:
+        cap.release()
+
+
+def _frame_count(path) -> int:
+    cap = cv2.VideoCapture(path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    finally:
+        cap.release()
+
+
+# --------------------------------------------------
+# Detectors: name -> fn(rgb, params, path) -> results dict
+# --------------------------------------------------
+def _boxes(rects) -> list:
+    return [[int(v) for v in r] for r in rects]
+
+
+def _faces(rgb, params, path=None) -> dict:
+    from services.faces import find_faces, to_equalized_gray
+    faces, _ = find_faces(
+        to_equalized_gray(rgb), params["scale_factor"], params["min_neighbors"], params["min_size"],
+        params["cascades"], params.get("fast_max_dim"), fast_min_face=params["fast_min_face"],
+    )
+    return {"faces": _boxes(faces)}
+
+
+def _source_bytes(path):
+    # Small upright JPEGs are uploaded as-is by encode_image
+    if path and not is_video(path) and os.path.getsize(path) <= DEFAULT_MAX_BYTES:
+        with open(path, "rb") as fh:
+            return fh.read()
+    return None
+
+
+def _roboflow(rgb, params, path=None) -> dict:
+    from services.roboflow import run_inference
+    model, _, version = params["model_id"].partition("/")
+    predictions = run_inference(
+        Image.fromarray(rgb), model, version or "1", os.environ["ROBOFLOW_API_KEY"],
+        params["confidence"], params["max_side"], _source_bytes(path),
+    )
+    return {"predictions": predictions}
+
+
+def _workflow(rgb, params, path=None) -> dict:
+    from services.roboflow import run_workflow
+    predictions = run_workflow(
+        Image.fromarray(rgb), os.environ["ROBOFLOW_API_KEY"], os.environ["GOOGLE_API_KEY"],
+        params["classes"], True, _source_bytes(path),
+    )
+    return {"predictions": predictions}
+
+
+def _onnx(rgb, params, path=None) -> dict:
+    from services.backends import local_backend
+    # Loaded once per worker process and reused for every later task
+    predictions = local_backend(params["onnx_path"]).detect(Image.fromarray(rgb), params["confidence"])
+    return {"predictions": predictions}
+
+
+FRAME_DETECTORS = {"faces": _faces, "roboflow": _roboflow, "workflow": _workflow, "onnx": _onnx}
+DETECTORS = sorted([*FRAME_DETECTORS, "motion"])
+
+
+def _count(results) -> int:
+    for key in ("faces", "predictions", "boxes"):
+        if key in results:
+            return len(results[key])
+    return 0
+
+
+def _motion_results(mask, contours, min_area) -> dict:
+    significant = [c for c in contours if cv2.contourArea(c) >= min_area]
+    return {
+        "motion_pct": round(float(np.count_nonzero(mask) / mask.size * 100), 3),
+        "boxes": _boxes(cv2.boundingRect(c) for c in significant),
+    }
+
+
+# --------------------------------------------------
+# Tasks (run in worker processes)
+# --------------------------------------------------
+def _record(detector, source, frame, start, results=None, error=None) -> dict:
+    return {
+        "source": source,
+        "frame": frame,
+        "detector": detector,
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+        "count": _count(results) if results else 0,
+        "results": results,
+        "error": error,
+    }
+
+
+def _deduper(params):
+    from services.dedup import FrameDeduper
+    return FrameDeduper(params["dedup_distance"]) if params.get("dedup_distance") is not None else None
+
+
+def _run_images(detector, paths, params) -> list:
+    """Consecutive images in order; near-duplicates are recognised from a reduced decode and never fully decoded."""
+    from services.dedup import signature_bytes
+    deduper, records = _deduper(params), []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            with open(path, "rb") as fh:
+                sig = signature_bytes(fh.read())
+            hit = deduper.match(sig)
+            if hit is not None:
+                records.append(_record(detector, path, None, start, hit[0]) | {"reused_from": hit[1]})
+                continue
+            results = FRAME_DETECTORS[detector](load_image(path), params, path)
+            deduper.store(sig, results, path)
+            records.append(_record(detector, path, None, start, results))
+        except Exception as e:
+            logger.debug("image failed: %s", traceback.format_exc())
+            records.append(_record(detector, path, None, start, error=f"{type(e).__name__}: {e}"))
+    return records
+
+
+def _run_task(task) -> list:
+    """One task = an image, a run of images (dedup), an image pair (motion), or a video frame range."""
+    detector, kind, source, params = task
+    start = time.perf_counter()
+    try:
+        if kind == "image":
+            results = FRAME_DETECTORS[detector](load_image(source), params, source)
+            return [_record(detector, source, None, start, results)]
+        if kind == "images":
+            return _run_images(detector, source, params)
+        if kind == "pair":
+            from services.motion import detect_motion, to_gray_blur
+            a, b = load_image(source[0]), load_image(source[1])
+            if a.shape != b.shape:
+                b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_AREA)
+            _, mask, _, _, contours = detect_motion(to_gray_blur(a), to_gray_blur(b), params["threshold"])
+            return [_record(detector, source[1], None, start, _motion_results(mask, contours, params["min_area"]))
+                    | {"reference": source[0]}]
+        if kind == "video_motion":
+            from services.motion import Background, to_gray_blur
+            background = Background(params["model"], params["threshold"], params["learning_rate"])
+            records = []
+            for idx, frame in _video_frames(source, every_n=params["every_n"]):
+                frame_start = time.perf_counter()
+                mask = background.mask(to_gray_blur(frame))
+                if mask is None:
+                    continue
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                records.append(_record(detector, source, idx, frame_start,
+                                       _motion_results(mask, contours, params["min_area"])))
+            return records
+        # kind == "video": a frame range for a stateless detector
+        path, first, last = source
+        deduper, records = _deduper(params), []
+        for idx, frame in _video_frames(path, first, last, params["every_n"]):
+            frame_start = time.perf_counter()
+            if deduper is None:
+                records.append(_record(detector, path, idx, frame_start, FRAME_DETECTORS[detector](frame, params)))
+                continue
+            from services.dedup import signature
+            results, reused_from = deduper.process(
+                signature(frame), lambda: FRAME_DETECTORS[detector](frame, params), f"{path}#{idx}"
+            )
+            record = _record(detector, path, idx, frame_start, results)
+            records.append(record | {"reused_from": reused_from} if reused_from else record)
+        return records
+    except Exception as e:
+        logger.debug("task failed: %s", traceback.format_exc())
+        error = f"{type(e).__name__}: {e}"
+        if kind == "pair":
+            return [_record(detector, source[1], None, start, error=error) | {"reference": source[0]}]
+        return [_record(detector, source[0] if kind == "video" else source, None, start, error=error)]
+
+
+def plan_tasks(detector: str, paths: list, params: dict, video_chunk: int = VIDEO_CHUNK_FRAMES) -> list:
+    """Split inputs into independent tasks for the pool."""
+    tasks = []
+    images = [p for p in paths if not is_video(p)]
+    videos = [p for p in paths if is_video(p)]
+    if detector == "motion":
+        # Consecutive images (in sorted order) are compared as frame pairs
+        tasks += [(detector, "pair", (a, b), params) for a, b in zip(images, images[1:])]
+        tasks += [(detector, "video_motion", v, params) for v in videos]
+        return tasks
+    if params.get("dedup_distance") is not None:
+        # Near-duplicates are judged against the previous image, so keep runs of consecutive images together
+        chunk = video_chunk or len(images) or 1
+        tasks += [(detector, "images", images[i:i + chunk], params) for i in range(0, len(images), chunk)]
+    else:
+        tasks += [(detector, "image", p, params) for p in images]
+    for v in videos:
+        total = _frame_count(v) or None
+        if total is None or not video_chunk:
+            tasks.append((detector, "video", (v, 0, None), params))
+            continue
+        # Chunk boundaries stay on the every_n grid so no frame is analysed twice
+        step = max(params["every_n"], video_chunk - video_chunk % params["every_n"])
+        tasks += [(detector, "video", (v, s, min(s + step, total)), params) for s in range(0, total, step)]
+    return tasks
+
+
+def _init_worker():
+    if cv2 is not None:
+        cv2.setNumThreads(1)  # one process per core already; avoid oversubscription
+
+
+def run(detector: str, inputs, params: dict, workers: int = None, recursive: bool = False,
+        video_chunk: int = VIDEO_CHUNK_FRAMES):
+    """
+    Run `detector` over files/directories/globs in `inputs`, yielding result
+    records as tasks finish (not in input order). `params` is the dict built
+    by `default_params()` with any overrides.
+    """
+    if cv2 is None:
+        raise RuntimeError(f"OpenCV is not available: {_import_error}")
+    tasks = plan_tasks(detector, expand_inputs(inputs, recursive), params, video_chunk)
+    workers = min(workers or usable_cores(), max(1, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            yield from _run_task(task)
+        return
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker) as pool:
+        for records in pool.imap_unordered(_run_task, tasks, chunksize=max(1, len(tasks) // (workers * 8))):
+            yield from records
+
+
+def default_params(**overrides) -> dict:
+    params = {
+        "scale_factor": 1.1, "min_neighbors": 5, "min_size": 30,
+        "cascades": ("frontal", "alt2", "profile"), "fast_max_dim": None, "fast_min_face": DEFAULT_FAST_MIN_FACE,
+        "threshold": 25, "min_area": 500, "model": "Running average", "learning_rate": 0.05,
+        "model_id": "coco/3", "confidence": 40, "max_side": DEFAULT_MAX_SIDE, "classes": [],
+        "onnx_path": os.environ.get("CV_YOLO_ONNX", os.path.join("models", "yolov8n.onnx")),
+        "every_n": 1, "dedup_distance": None,
+    }
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+# --------------------------------------------------
+# Output
+# --------------------------------------------------
+class JsonlWriter:
+    def __init__(self, path):
+        self._fh = sys.stdout if path == "-" else open(path, "w")
+
+    def write(self, record):
+        self._fh.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self._fh is not sys.stdout:
+            self._fh.close()
+
+
+class ParquetWriter:
+    """Flat columns plus `results` as a JSON string; written in row groups of `batch_rows`."""
+
+    def __init__(self, path, batch_rows=1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        self._pa = pa
+        self._schema = pa.schema([
+            ("source", pa.string()), ("reference", pa.string()), ("frame", pa.int64()),
+            ("detector", pa.string()), ("ms", pa.float64()), ("count", pa.int64()),
+            ("results", pa.string()), ("error", pa.string()), ("reused_from", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+        self.batch_rows = batch_rows
+
+    def write(self, record):
+        self._rows.append({**record, "reference": record.get("reference"), "reused_from": record.get("reused_from"),
+                           "results": json.dumps(record["results"]) if record["results"] is not None else None})
+        if len(self._rows) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def open_writer(path: str, fmt: str = None):
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "jsonl")
+    return ParquetWriter(path) if fmt == "parquet" else JsonlWriter(path)
+
+
+def record_detections(record):
+    """A record's boxes as `Detections` (faces get class "face", confidence 1), or None."""
+    from services.detections import Detections
+    from services.nms import xywh_to_xyxy
+
+    results = record["results"] or {}
+    if "predictions" in results:
+        return Detections.from_predictions(results["predictions"], data_keys=("class_id",))
+    if "faces" in results:
+        n = len(results["faces"])
+        return Detections(xywh_to_xyxy(results["faces"]), np.ones(n), np.zeros(n), ["face"])
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a detector over images, directories, globs or videos.")
+    parser.add_argument("detector", choices=DETECTORS)
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns")
+    parser.add_argument("--out", default="-", help="Output path (.jsonl or .parquet); '-' for stdout")
+    parser.add_argument("--format", choices=["jsonl", "parquet"])
+    parser.add_argument("--boxes", help="Also write every box as a row of this Parquet file (columnar, compact)")
+    parser.add_argument("--workers", type=int, help=f"Worker processes (default: usable cores, {usable_cores()})")
+    parser.add_argument("--recursive", action="store_true", help="Descend into subdirectories")
+    parser.add_argument("--every-n", type=int, help="Analyse every Nth video frame")
+    parser.add_argument("--dedup-distance", type=int,
+                        help="Reuse results for images/frames within this many dHash bits of the previous one")
+    parser.add_argument("--video-chunk", type=int, default=VIDEO_CHUNK_FRAMES,
+                        help="Frames per parallel video task for stateless detectors (0 = whole video)")
+    faces = parser.add_argument_group("faces")
+    faces.add_argument("--scale-factor", type=float)
+    faces.add_argument("--min-neighbors", type=int)
+    faces.add_argument("--min-size", type=int)
+    faces.add_argument("--cascades", nargs="+")
+    faces.add_argument("--fast-max-dim", type=int)
+    faces.add_argument("--fast-min-face", type=int,
+                       help=f"Smallest face kept on the fast path (default {DEFAULT_FAST_MIN_FACE})")
+    motion = parser.add_argument_group("motion")
+    motion.add_argument("--threshold", type=int)
+    motion.add_argument("--min-area", type=int)
+    motion.add_argument("--model", choices=BACKGROUND_MODELS)
+    motion.add_argument("--learning-rate", type=float)
+    remote = parser.add_argument_group("roboflow / workflow")
+    remote.add_argument("--model-id", help="Roboflow model as name/version")
+    remote.add_argument("--confidence", type=int)
+    remote.add_argument("--max-side", type=int)
+    remote.add_argument("--classes", nargs="+")
+    parser.add_argument_group("onnx").add_argument("--onnx-path", help="Exported YOLO model (default: $CV_YOLO_ONNX)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+
+    params = default_params(**{
+        k: getattr(args, k) for k in (
+            "scale_factor", "min_neighbors", "min_size", "cascades", "fast_max_dim", "fast_min_face", "threshold",
+            "min_area", "model", "learning_rate", "model_id", "confidence", "max_side", "classes", "every_n",
+            "onnx_path", "dedup_distance",
+        )
+    })
+    if args.cascades:
+        params["cascades"] = tuple(args.cascades)
+
+    writer = open_writer(args.out, args.format)
+    if args.boxes:
+        from services.detections import DetectionsWriter
+        boxes = DetectionsWriter(args.boxes)
+    else:
+        boxes = None
+    start = time.perf_counter()
+    records = errors = reused = 0
+    try:
+        for record in run(args.detector, args.inputs, params, args.workers, args.recursive, args.video_chunk):
+            writer.write(record)
+            records += 1
+            errors += record["error"] is not None
+            reused += "reused_from" in record
+            dets = record_detections(record) if boxes is not None else None
+            if dets is not None:
+                frame = record["frame"] if record["frame"] is not None else -1  # -1 for still images
+                boxes.write(dets, source=record["source"], frame=frame)
+    finally:
+        writer.close()
+        if boxes is not None:
+            boxes.close()
+    elapsed = time.perf_counter() - start
+    logger.info("%d record(s), %d error(s) in %.1f s (%.1f/s)", records, errors, elapsed,
+                records / elapsed if elapsed else 0)
+    if params["dedup_distance"] is not None:
+        logger.info("%d near-duplicate(s) reused earlier results (%.0f%% hit rate)", reused,
+                    reused * 100 / records if records else 0)
+    return 1 if errors and errors == records else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
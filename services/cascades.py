@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+CASCADE_FILES = {
+    "frontal": "haarcascade_frontalface_default.xml",
+    "alt2":    "haarcascade_frontalface_alt2.xml",
+    "profile": "haarcascade_profileface.xml",
+}
+
+# Detection passes: name -> (cascade, run on horizontally mirrored image).
+# The profile cascade is trained on left-facing profiles only, so the mirrored
+# pass is what catches faces turned the other way.
+CASCADE_PASSES = {
+    "frontal":        ("frontal", False),
+    "alt2":           ("alt2", False),
+    "profile":        ("profile", False),
+    "profile_mirror": ("profile", True),
+}
+DEFAULT_PASSES = ("frontal", "alt2", "profile")
+
+
+class CascadeRegistry:
+    """
+    Process-wide pool of Haar cascade classifiers.
+
+    Parsing the cascade XML is expensive, so each classifier is built once and
+    reused across reruns and sessions. A CascadeClassifier is not safe to share
+    between threads while detecting, so callers check an instance out with
+    `acquire()` and the pool only grows when several threads detect at once.
+    """
+
+    def __init__(self, files=None):
+        self._files = dict(files or CASCADE_FILES)
+        self._lock = threading.Lock()
+        self._free = {name: [] for name in self._files}
+        self._stats = {name: {"loads": 0, "load_ms": 0.0, "hits": 0} for name in self._files}
+
+    def _build(self, name):
+        if cv2 is None:
+            raise RuntimeError(f"OpenCV is not available: {_import_error}")
+        start = time.perf_counter()
+        clf = cv2.CascadeClassifier(cv2.data.haarcascades + self._files[name])
+        if clf.empty():
+            raise RuntimeError(f"Failed to load cascade '{name}' ({self._files[name]})")
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats[name]["loads"] += 1
+            self._stats[name]["load_ms"] += elapsed
+        return clf
+
+    @contextmanager
+    def acquire(self, name):
+        """Check out a classifier for exclusive use by the calling thread."""
+        if name not in self._files:
+            raise KeyError(f"Unknown cascade '{name}'")
+        with self._lock:
+            clf = self._free[name].pop() if self._free[name] else None
+            if clf is not None:
+                self._stats[name]["hits"] += 1
+        if clf is None:
+            clf = self._build(name)
+        try:
+            yield clf
+        finally:
+            with self._lock:
+                self._free[name].append(clf)
+
+    def warm(self, names=None):
+        """Build one instance of each cascade ahead of the first request."""
+        for name in names or self._files:
+            with self.acquire(name):
+                pass
+
+    def stats(self) -> dict:
+        """Per-cascade load count, total load time (ms), pool hits and pool size."""
+        with self._lock:
+            return {
+                name: {**s, "pooled": len(self._free[name])}
+                for name, s in self._stats.items()
+            }
+
+
+# Module globals survive Streamlit reruns, so this is shared by every session
+# in the worker process.
+REGISTRY = CascadeRegistry()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=min(len(CASCADE_PASSES), os.cpu_count() or 1),
+                thread_name_prefix="cascade",
+            )
+        return _executor
+
+
+def _run_pass(name, gray, params, flipped=None, weighting="neighbors"):
+    cascade, mirrored = CASCADE_PASSES[name]
+    image = flipped if mirrored else gray
+    start = time.perf_counter()
+    with REGISTRY.acquire(cascade) as clf:
+        if weighting == "level":
+            boxes, _, scores = clf.detectMultiScale3(image, outputRejectLevels=True, **params)
+        else:
+            boxes, scores = clf.detectMultiScale2(image, **params)
+    boxes = [list(map(int, b)) for b in boxes] if len(boxes) else []
+    scores = [float(s) for s in np.ravel(scores)] if len(boxes) else []
+    if mirrored:
+        width = gray.shape[1]
+        boxes = [[width - x - w, y, w, h] for x, y, w, h in boxes]
+    return boxes, scores, (time.perf_counter() - start) * 1000
+
+
+def detect_parallel(gray, passes=DEFAULT_PASSES, weighting="neighbors", **params):
+    """
+    Run the selected cascade passes concurrently on one grayscale image.
+    detectMultiScale releases the GIL, so wall time tracks the slowest pass.
+
+    `weighting` picks the per-box score: "neighbors" (merged neighbour count,
+    detectMultiScale2) or "level" (final-stage levelWeights, detectMultiScale3).
+    Returns (merged [x, y, w, h] boxes, merged scores, per-pass results) where
+    each per-pass entry is {"boxes": [...], "scores": [...], "ms": float}; the
+    merged lists keep pass order and are not deduplicated.
+    """
+    unknown = [p for p in passes if p not in CASCADE_PASSES]
+    if unknown:
+        raise KeyError(f"Unknown cascade pass(es): {', '.join(unknown)}")
+
+    flipped = None
+    if any(CASCADE_PASSES[p][1] for p in passes):
+        flipped = cv2.flip(gray, 1)
+
+    if len(passes) == 1:
+        results = {passes[0]: _run_pass(passes[0], gray, params, flipped, weighting)}
+    else:
+        executor = _get_executor()
+        futures = {p: executor.submit(_run_pass, p, gray, params, flipped, weighting) for p in passes}
+        results = {p: f.result() for p, f in futures.items()}
+
+    merged, merged_scores = [], []
+    per_pass = {}
+    for p, (boxes, scores, ms) in results.items():
+        merged.extend(boxes)
+        merged_scores.extend(scores)
+        per_pass[p] = {"boxes": boxes, "scores": scores, "ms": ms}
+    return merged, merged_scores, per_pass
@@ -0,0 +1,182 @@
+"""
+Near-duplicate frame skipping for repeated detection on similar frames.
+
+A frame's signature is a 64-bit difference hash (dHash: is each pixel of a
+9x8 greyscale thumbnail brighter than its right-hand neighbour?) plus a
+64x48 blurred thumbnail. The hash catches global changes (new scene, pan,
+exposure) and shrugs off JPEG noise and sensor jitter; the thumbnail is
+compared with the motion module's absdiff-and-threshold test, which catches
+a small object moving that an 8x8 hash averages away. Together they cost a
+few milliseconds on a 720p frame, far below any detector.
+
+`FrameDeduper` remembers the signature and detections of the last frame that
+was actually processed. A frame within `max_distance` hash bits and
+`max_change_pct` changed thumbnail pixels of it reuses those detections
+instead of running the detector (or paying for an API call). After
+`max_reuse` consecutive reuses a frame is processed anyway, so slow drift
+cannot pin a stale result forever. A `context` (model, settings, …) must also
+match, so changing a setting always reprocesses. `stats()` reports the hit
+rate and recent distances for tuning the thresholds.
+"""
+import collections
+import threading
+
+import numpy as np
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+HASH_SIZE = 8
+THUMB_SIZE = (64, 48)
+PIXEL_THRESHOLD = 25  # grey-level change that counts a thumbnail pixel as changed, as in motion detection
+DEFAULT_MAX_DISTANCE = 4  # bits of 64
+DEFAULT_MAX_CHANGE_PCT = 0.5
+DEFAULT_MAX_REUSE = 30
+
+Signature = collections.namedtuple("Signature", "hash thumb")
+
+
+def _gray(frame) -> np.ndarray:
+    arr = np.asarray(frame)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY) if arr.ndim == 3 else arr
+
+
+def _shrink(gray: np.ndarray, size) -> np.ndarray:
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def dhash(frame, hash_size: int = HASH_SIZE) -> int:
+    """dHash of an RGB or greyscale uint8 array (or PIL image)."""
+    gray = _gray(frame)
+    if gray.shape[1] > THUMB_SIZE[0] * 2:
+        gray = _shrink(gray, THUMB_SIZE)  # area-averaging straight to 9x8 is slow on large frames
+    small = _shrink(gray, (hash_size + 1, hash_size))
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def signature(frame) -> Signature:
+    """Hash and blurred thumbnail of an RGB or greyscale uint8 array (or PIL image)."""
+    small = _shrink(_gray(frame), THUMB_SIZE)
+    return Signature(dhash(small), cv2.GaussianBlur(small, (3, 3), 0))
+
+
+def signature_bytes(data: bytes) -> Signature:
+    """Signature straight from encoded image bytes; JPEGs are decoded at a quarter size."""
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return signature(gray)
+
+
+def change_pct(a: np.ndarray, b: np.ndarray, threshold: int = PIXEL_THRESHOLD) -> float:
+    """Percentage of thumbnail pixels whose absolute difference exceeds `threshold`."""
+    return float(np.count_nonzero(cv2.absdiff(a, b) > threshold)) * 100 / a.size
+
+
+class FrameDeduper:
+    """Reuses the last processed frame's result for near-identical frames."""
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, max_change_pct: float = DEFAULT_MAX_CHANGE_PCT,
+                 max_reuse: int = DEFAULT_MAX_REUSE):
+        self.max_distance = max_distance
+        self.max_change_pct = max_change_pct
+        self.max_reuse = max_reuse
+        self._last = None  # (signature, context, result, ref)
+        self._run = 0
+        self._lock = threading.Lock()
+        self._distances = collections.deque(maxlen=256)
+        self._changes = collections.deque(maxlen=256)
+        self._stats = {"frames": 0, "reused": 0}
+
+    def match(self, sig: Signature, context=None):
+        """(result, ref) of the last processed frame if this one is a near-duplicate, else None."""
+        with self._lock:
+            self._stats["frames"] += 1
+            if self._last is None or self._last[1] != context:
+                return None
+            last = self._last[0]
+            distance = hamming(sig.hash, last.hash)
+            change = change_pct(sig.thumb, last.thumb)
+            self._distances.append(distance)
+            self._changes.append(change)
+            if distance > self.max_distance or change > self.max_change_pct or self._run >= self.max_reuse:
+                return None
+            self._run += 1
+            self._stats["reused"] += 1
+            return self._last[2], self._last[3]
+
+    def store(self, sig: Signature, result, ref=None, context=None):
+        """Record a frame that was actually processed."""
+        with self._lock:
+            self._last = (sig, context, result, ref)
+            self._run = 0
+
+    def process(self, sig: Signature, compute, ref=None, context=None) -> tuple:
+        """`compute()` unless the frame is a near-duplicate. Returns (result, reused_ref or None)."""
+        hit = self.match(sig, context)
+        if hit is not None:
+            return hit
+        result = compute()
+        self.store(sig, result, ref, context)
+        return result, None
+
+    def reset(self):
+        with self._lock:
+            self._last = None
+            self._run = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            frames, reused = self._stats["frames"], self._stats["reused"]
+            distances, changes = np.array(self._distances), np.array(self._changes)
+        return {
+            "frames": frames,
+            "reused": reused,
+            "hit_rate": round(reused / frames, 3) if frames else 0.0,
+            "distance_p50": float(np.percentile(distances, 50)) if distances.size else None,
+            "distance_p90": float(np.percentile(distances, 90)) if distances.size else None,
+            "change_pct_p50": round(float(np.percentile(changes, 50)), 2) if changes.size else None,
+            "change_pct_p90": round(float(np.percentile(changes, 90)), 2) if changes.size else None,
+        }
+
+
+def session_deduper(key: str, max_distance: int = DEFAULT_MAX_DISTANCE,
+                    max_change_pct: float = DEFAULT_MAX_CHANGE_PCT) -> FrameDeduper:
+    """The current Streamlit session's deduper for `key`, created on first use."""
+    import streamlit as st
+
+    state_key = f"_dedup_{key}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = FrameDeduper(max_distance, max_change_pct)
+    deduper = st.session_state[state_key]
+    deduper.max_distance, deduper.max_change_pct = max_distance, max_change_pct
+    return deduper
+
+
+def dedup_controls(key: str):
+    """Toggle, threshold and hit-rate readout for a webcam input; returns the session deduper or None."""
+    import streamlit as st
+
+    c1, c2 = st.columns([1, 2])
+    if not c1.checkbox("Skip near-duplicate frames", True, key=f"{key}_dedup",
+                       help="Reuse the last detections when a capture barely differs from the last one analysed"):
+        return None
+    distance = c2.slider("Max hash distance (bits of 64)", 0, 16, DEFAULT_MAX_DISTANCE, key=f"{key}_dedup_bits")
+    deduper = session_deduper(key, distance)
+    ds = deduper.stats()
+    if ds["distance_p50"] is not None:
+        st.caption(
+            f"Reused {ds['reused']} of {ds['frames']} frame(s) ({ds['hit_rate']:.0%}) · recent distance "
+            f"p50 {ds['distance_p50']:.0f} / p90 {ds['distance_p90']:.0f} bits · changed pixels "
+            f"p50 {ds['change_pct_p50']}% / p90 {ds['change_pct_p90']}%"
+        )
+    return deduper
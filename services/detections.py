@@ -0,0 +1,350 @@
+"""
+Compact struct-of-arrays container for detection results.
+
+Prediction dicts repeat every key for every box and cost several hundred
+bytes each as Python objects. `Detections` holds the same data as four
+NumPy columns: xyxy float32 boxes, float32 confidences, int32 class ids and
+a class-name vocabulary, plus optional per-box `data` columns (the fan-out
+"model" tag, a model's own "class_id"). Filters are vectorised masks, and
+export is to Arrow/Parquet or a flat binary blob without per-box Python
+objects. `to_predictions` is the JSON adapter: containers built with
+`from_predictions(..., keep_source=True)` return the surviving original
+dicts untouched (every Roboflow field, unrounded); others rebuild
+{x, y, width, height, class, confidence} dicts from the columns.
+"""
+import json
+import struct
+
+import numpy as np
+
+from services.nms import batched_nms, nms, predictions_to_xyxy
+
+_MAGIC = b"DETS"
+_VERSION = 1
+_ALIGN = 8
+
+
+def _missing(value) -> bool:
+    """None, or a float NaN (how a numeric column with gaps comes back from NumPy)."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _column(chunked) -> np.ndarray:
+    """Arrow column -> NumPy; columns with nulls become object arrays holding None, not NaN."""
+    if chunked.null_count:
+        return np.array(chunked.to_pylist(), dtype=object)
+    return chunked.to_numpy(zero_copy_only=False)
+
+
+def _object_array(values) -> np.ndarray:
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+def _vocab_codes(values) -> tuple:
+    """Strings -> (vocabulary in first-seen order, int32 codes)."""
+    vocab, codes = {}, np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        codes[i] = vocab.setdefault(v, len(vocab))
+    return list(vocab), codes
+
+
+class Detections:
+    """N boxes as parallel arrays; index with a mask, slice or index array."""
+
+    __slots__ = ("xyxy", "confidence", "class_id", "classes", "data", "source")
+
+    def __init__(self, xyxy, confidence, class_id, classes, data=None, source=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        self.class_id = np.asarray(class_id, dtype=np.int32).reshape(-1)
+        self.classes = list(classes)
+        self.data = {k: np.asarray(v) for k, v in (data or {}).items()}
+        self.source = None if source is None else _object_array(source)
+        n = len(self.xyxy)
+        if len(self.confidence) != n or len(self.class_id) != n or any(len(v) != n for v in self.data.values()) \
+                or (self.source is not None and len(self.source) != n):
+            raise ValueError("Detections columns must all have one entry per box")
+
+    @classmethod
+    def empty(cls, classes=()) -> "Detections":
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), classes)
+
+    @classmethod
+    def from_predictions(cls, predictions: list, data_keys=(), keep_source: bool = False) -> "Detections":
+        """
+        Build from Roboflow-style centre-format dicts. `data_keys` names extra
+        per-box fields to keep as columns (missing values become None);
+        `keep_source` also carries the dicts themselves so `to_predictions`
+        can hand back exactly what the API returned.
+        """
+        if not predictions:
+            return cls.empty()
+        classes, class_id = _vocab_codes([p.get("class", "object") for p in predictions])
+        data = {
+            key: np.array([p.get(key) for p in predictions])
+            for key in data_keys if any(key in p for p in predictions)
+        }
+        return cls(predictions_to_xyxy(predictions), [p.get("confidence", 0) for p in predictions],
+                   class_id, classes, data, predictions if keep_source else None)
+
+    @classmethod
+    def concat(cls, parts: list) -> "Detections":
+        """Join several containers, merging their vocabularies; sources survive only if every part has one."""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        vocab = {}
+        remapped = []
+        for part in parts:
+            lookup = np.array([vocab.setdefault(name, len(vocab)) for name in part.classes], dtype=np.int32)
+            remapped.append(lookup[part.class_id])
+        keys = set().union(*(p.data for p in parts))
+        data = {
+            k: np.concatenate([p.data[k] if k in p.data else np.full(len(p), None) for p in parts])
+            for k in keys
+        }
+        source = None
+        if all(p.source is not None for p in parts):
+            source = np.concatenate([p.source for p in parts])
+        return cls(np.concatenate([p.xyxy for p in parts]), np.concatenate([p.confidence for p in parts]),
+                   np.concatenate(remapped), list(vocab), data, source)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __getitem__(self, index) -> "Detections":
+        return Detections(self.xyxy[index], self.confidence[index], self.class_id[index], self.classes,
+                          {k: v[index] for k, v in self.data.items()},
+                          None if self.source is None else self.source[index])
+
+    def __repr__(self):
+        return f"Detections({len(self)} boxes, {len(self.classes)} classes)"
+
+    @property
+    def class_names(self) -> np.ndarray:
+        return np.asarray(self.classes, dtype=object)[self.class_id] if len(self) else np.zeros(0, dtype=object)
+
+    @property
+    def nbytes(self) -> int:
+        return self.xyxy.nbytes + self.confidence.nbytes + self.class_id.nbytes + \
+            sum(v.nbytes for v in self.data.values())
+
+    # ------------------------------------------------------------------
+    # Vectorised filters
+    # ------------------------------------------------------------------
+
+    def filter(self, min_confidence: float = None, classes=None, region=None, min_area: float = None) -> "Detections":
+        """
+        Boxes with confidence >= `min_confidence` (0–1), class in `classes`,
+        centre inside `region` (x0, y0, x1, y1) and area >= `min_area`.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if min_confidence is not None:
+            keep &= self.confidence >= np.float32(min_confidence)
+        if classes is not None:
+            wanted = set(classes)
+            keep &= np.isin(self.class_id, [i for i, name in enumerate(self.classes) if name in wanted])
+        if region is not None:
+            x0, y0, x1, y1 = region
+            cx = (self.xyxy[:, 0] + self.xyxy[:, 2]) / 2
+            cy = (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2
+            keep &= (cx >= x0) & (cx <= x1) & (cy >= y0) & (cy <= y1)
+        if min_area is not None:
+            keep &= self.areas() >= min_area
+        return self if keep.all() else self[keep]
+
+    def areas(self) -> np.ndarray:
+        return (self.xyxy[:, 2] - self.xyxy[:, 0]) * (self.xyxy[:, 3] - self.xyxy[:, 1])
+
+    def nms(self, iou_thresh: float = 0.5, class_aware: bool = True) -> "Detections":
+        """Most confident box of each overlapping group, in descending confidence order."""
+        if len(self) < 2:
+            return self
+        if class_aware:
+            keep = batched_nms(self.xyxy, self.confidence, self.class_id, iou_thresh)
+        else:
+            keep = nms(self.xyxy, self.confidence, iou_thresh)
+        return self[keep]
+
+    def counts(self) -> dict:
+        """{class name: box count}, most frequent first."""
+        totals = np.bincount(self.class_id, minlength=len(self.classes))
+        order = np.argsort(-totals, kind="stable")
+        return {self.classes[i]: int(totals[i]) for i in order if totals[i]}
+
+    # ------------------------------------------------------------------
+    # JSON adapter
+    # ------------------------------------------------------------------
+
+    def to_predictions(self) -> list:
+        """
+        Roboflow-style dicts: copies of the kept source dicts when there are
+        any, otherwise rebuilt from the columns and rounded to what float32
+        actually holds.
+        """
+        if self.source is not None:
+            return [dict(p) for p in self.source]
+        xyxy = self.xyxy.astype(np.float64)
+        centre = np.round((xyxy[:, :2] + xyxy[:, 2:]) / 2, 2).tolist()
+        size = np.round(xyxy[:, 2:] - xyxy[:, :2], 2).tolist()
+        conf = np.round(self.confidence.astype(np.float64), 4).tolist()
+        names = self.class_names.tolist()
+        extra = {k: v.tolist() for k, v in self.data.items()}
+        predictions = []
+        for i in range(len(self)):
+            p = {"x": centre[i][0], "y": centre[i][1], "width": size[i][0], "height": size[i][1],
+                 "class": names[i], "confidence": conf[i]}
+            p.update((k, v[i]) for k, v in extra.items() if not _missing(v[i]))
+            predictions.append(p)
+        return predictions
+
+    # ------------------------------------------------------------------
+    # Arrow / Parquet
+    # ------------------------------------------------------------------
+
+    def to_arrow(self, **constant_columns):
+        """
+        pyarrow Table with `box` (fixed-size list of 4 float32), `confidence`
+        and a dictionary-encoded `class`. Numeric columns wrap the NumPy
+        buffers without copying. Keyword arguments add a constant column each
+        (e.g. image=name).
+        """
+        import pyarrow as pa
+
+        columns = {
+            "box": pa.FixedSizeListArray.from_arrays(pa.array(np.ascontiguousarray(self.xyxy).reshape(-1)), 4),
+            "confidence": pa.array(self.confidence),
+            "class": pa.DictionaryArray.from_arrays(pa.array(self.class_id), pa.array(self.classes, pa.string())),
+        }
+        for key, values in self.data.items():
+            columns[key] = pa.array(values if values.dtype != object else values.tolist())
+        for key, value in constant_columns.items():
+            columns[key] = pa.array([value] * len(self))
+        return pa.table(columns)
+
+    @classmethod
+    def from_arrow(cls, table) -> "Detections":
+        import pyarrow as pa
+
+        box = table.column("box").combine_chunks()
+        labels = table.column("class").combine_chunks()
+        if not pa.types.is_dictionary(labels.type):
+            labels = labels.dictionary_encode()
+        core = {"box", "confidence", "class"}
+        return cls(
+            box.flatten().to_numpy().reshape(-1, 4),
+            table.column("confidence").to_numpy(),
+            labels.indices.to_numpy(),
+            labels.dictionary.to_pylist(),
+            {name: _column(table.column(name)) for name in table.column_names if name not in core},
+        )
+
+    def to_parquet(self, path: str, **constant_columns):
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(**constant_columns), path)
+
+    # ------------------------------------------------------------------
+    # Binary blob
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        """
+        Self-describing blob: magic, version, a small JSON header (vocabulary
+        and column layout), then each column's raw little-endian buffer.
+        String data columns are stored as int32 codes plus a vocabulary.
+        """
+        columns = [("xyxy", self.xyxy, None), ("confidence", self.confidence, None),
+                   ("class_id", self.class_id, None)]
+        for key, values in self.data.items():
+            if values.dtype.kind in "OUS":
+                vocab, codes = _vocab_codes(values.tolist())
+                columns.append(("data." + key, codes, vocab))
+            else:
+                columns.append(("data." + key, values, None))
+
+        layout, buffers = [], []
+        for name, arr, vocab in columns:
+            arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+            layout.append({"name": name, "dtype": arr.dtype.str, "shape": arr.shape, "vocab": vocab})
+            buffers.append(arr.tobytes())
+        header = json.dumps({"n": len(self), "classes": self.classes, "columns": layout}).encode()
+
+        out = bytearray(_MAGIC + struct.pack("<HI", _VERSION, len(header)) + header)
+        for buf in buffers:
+            out += b"\0" * (-len(out) % _ALIGN) + buf
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, blob) -> "Detections":
+        """Inverse of `to_bytes`; numeric columns are read-only views of `blob`."""
+        blob = memoryview(blob)
+        if bytes(blob[:4]) != _MAGIC:
+            raise ValueError("Not a Detections blob")
+        version, header_len = struct.unpack_from("<HI", blob, 4)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported Detections blob version {version}")
+        offset = 10 + header_len
+        header = json.loads(bytes(blob[10:offset]))
+
+        columns = {}
+        for col in header["columns"]:
+            offset += -offset % _ALIGN
+            dtype = np.dtype(col["dtype"])
+            count = int(np.prod(col["shape"]))
+            arr = np.frombuffer(blob, dtype=dtype, count=count, offset=offset).reshape(col["shape"])
+            offset += count * dtype.itemsize
+            if col["vocab"] is not None:
+                arr = np.asarray(col["vocab"], dtype=object)[arr] if len(arr) else np.zeros(0, dtype=object)
+            columns[col["name"]] = arr
+
+        return cls(columns["xyxy"], columns["confidence"], columns["class_id"], header["classes"],
+                   {k[5:]: v for k, v in columns.items() if k.startswith("data.")})
+
+
+class DetectionsWriter:
+    """Streams many images' detections into one Parquet file, a row group per `batch_rows` boxes."""
+
+    def __init__(self, path: str, batch_rows: int = 100_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.batch_rows = batch_rows
+        self._writer = None
+        self._tables, self._rows = [], 0
+        self.boxes = 0
+
+    def write(self, detections: Detections, **constant_columns):
+        if not len(detections):
+            return
+        self._tables.append(detections.to_arrow(**constant_columns))
+        self._rows += len(detections)
+        self.boxes += len(detections)
+        if self._rows >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._tables:
+            return
+        table = self._pa.concat_tables(self._tables, promote_options="permissive")
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        schema = self._writer.schema
+        # The file schema is fixed by the first row group; later optional columns are dropped or null-filled
+        table = self._pa.table([
+            table.column(f.name).cast(f.type) if f.name in table.column_names
+            else self._pa.nulls(len(table), f.type)
+            for f in schema
+        ], schema=schema)
+        self._writer.write_table(table)
+        self._tables, self._rows = [], 0
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,102 @@
+"""
+Image encoding for remote detector uploads.
+
+Upload size dominates end-to-end latency for large phone photos, so images
+are shrunk to the model's input size (or a configured maximum side) and
+JPEG quality is lowered step by step until the payload fits a byte budget.
+An upload that is already a small, upright JPEG is sent as-is. Predictions
+come back in the coordinates of the encoded image; `rescale_predictions`
+maps them back to original pixels.
+"""
+import base64
+import io
+import logging
+import threading
+import time
+
+from PIL import Image
+
+from services.profiling import payload, stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIDE = 1280
+DEFAULT_MAX_BYTES = 400 * 1024
+QUALITY_STEPS = (90, 80, 70, 60)
+
+_stats_lock = threading.Lock()
+ENCODE_STATS = {"uploads": 0, "passthrough": 0, "bytes_sent": 0, "bytes_original": 0, "encode_ms": 0.0}
+
+
+def _is_upright_jpeg(data: bytes) -> bool:
+    if not data or data[:2] != b"\xff\xd8":
+        return False
+    try:
+        # EXIF orientation would make the server's pixel grid differ from ours
+        return Image.open(io.BytesIO(data)).getexif().get(0x0112, 1) == 1
+    except Exception:
+        return False
+
+
+def encode_image(image: Image.Image, max_side: int = DEFAULT_MAX_SIDE, source_bytes: bytes = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> tuple:
+    """
+    Encode an image for upload as base64 JPEG.
+    Returns (base64 string, scale) where scale = encoded size / original size.
+    """
+    with stage("encode"):
+        b64, scale, nbytes = _encode(image, max_side, source_bytes, max_bytes)
+    payload("upload_bytes", nbytes)
+    return b64, scale
+
+
+def _encode(image, max_side, source_bytes, max_bytes):
+    start = time.perf_counter()
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height)) if max_side else 1.0
+
+    if scale == 1.0 and source_bytes and len(source_bytes) <= max_bytes and _is_upright_jpeg(source_bytes):
+        data, quality, passthrough = source_bytes, None, True
+    else:
+        if scale < 1.0:
+            image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        for quality in QUALITY_STEPS:
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=quality)
+            data = buf.getvalue()
+            if len(data) <= max_bytes:
+                break
+        passthrough = False
+
+    b64 = base64.b64encode(data).decode("utf-8")
+    elapsed = (time.perf_counter() - start) * 1000
+
+    with _stats_lock:
+        ENCODE_STATS["uploads"] += 1
+        ENCODE_STATS["passthrough"] += passthrough
+        ENCODE_STATS["bytes_sent"] += len(data)
+        ENCODE_STATS["bytes_original"] += len(source_bytes) if source_bytes else width * height * 3
+        ENCODE_STATS["encode_ms"] += elapsed
+    logger.info(
+        "encoded %dx%d -> scale %.3f, quality %s, %d bytes in %.1f ms%s",
+        width, height, scale, quality, len(data), elapsed, " (passthrough)" if passthrough else "",
+    )
+    return b64, scale, len(data)
+
+
+def rescale_predictions(predictions: list, scale: float) -> list:
+    """Map centre-format predictions from encoded-image pixels back to original pixels."""
+    if scale == 1.0:
+        return predictions
+    inv = 1 / scale
+    return [
+        {**p, **{k: p[k] * inv for k in ("x", "y", "width", "height") if k in p}}
+        for p in predictions
+    ]
+
+
+def encode_stats() -> dict:
+    with _stats_lock:
+        return dict(ENCODE_STATS)
@@ -0,0 +1,120 @@
+"""
+Haar-cascade face detection without any UI dependency.
+
+Used by the Streamlit face module, the background job workers and the
+offline batch CLI. Images are RGB arrays (or PIL images); boxes are
+(x, y, w, h) in original pixels.
+"""
+import time
+
+import numpy as np
+from PIL import Image
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+from services.cascades import DEFAULT_PASSES, detect_parallel
+from services.nms import nms, xywh_to_xyxy
+
+# Smallest training window among the bundled cascades (frontalface_default is 24×24);
+# a face must still span this many pixels after downscaling to be detectable.
+CASCADE_WINDOW = 24
+# Smallest face (original pixels) the fast path keeps by default: a 4000 px photo can
+# then shrink to ~0.3x. Faces between `min_size` and this are the price of the speed-up.
+DEFAULT_FAST_MIN_FACE = 80
+
+
+def to_equalized_gray(image):
+    """Accepts a PIL image or an RGB array."""
+    rgb = np.asarray(image.convert("RGB")) if isinstance(image, Image.Image) else image
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    return cv2.equalizeHist(gray)  # Improves detection in varied lighting
+
+
+def fast_path_scale(shape, min_face: int, max_dim: int) -> float:
+    """
+    Downscale factor for the fast path: shrink the long side towards `max_dim`,
+    but never so far that a `min_face` face falls below the cascade window.
+    """
+    long_side = max(shape[:2])
+    if long_side <= max_dim:
+        return 1.0
+    return min(1.0, max(max_dim / long_side, CASCADE_WINDOW / min_face))
+
+
+def _refine_on_crops(gray, boxes, cascades, params):
+    """Re-detect each candidate on a full-resolution crop around it, tightening the box."""
+    h_img, w_img = gray.shape[:2]
+    refined, scores = [], []
+    for x, y, w, h in boxes:
+        m = int(0.25 * max(w, h))
+        x0, y0 = max(0, x - m), max(0, y - m)
+        x1, y1 = min(w_img, x + w + m), min(h_img, y + h + m)
+        crop = gray[y0:y1, x0:x1]
+        lo = max(CASCADE_WINDOW, int(0.8 * min(w, h)))
+        hi = min(crop.shape[0], crop.shape[1], int(1.25 * max(w, h)) + 1)
+        found, found_scores = [], []
+        if hi > lo:
+            found, found_scores, _ = detect_parallel(
+                crop, cascades, **{**params, "minSize": (lo, lo), "maxSize": (hi, hi)}
+            )
+        if found:
+            best = int(np.argmax(found_scores))
+            fx, fy, fw, fh = found[best]
+            refined.append([x0 + fx, y0 + fy, fw, fh])
+            scores.append(found_scores[best])
+        else:
+            # Keep the coarse box — refinement tightens, it does not veto
+            refined.append([x, y, w, h])
+            scores.append(0.0)
+    return refined, scores
+
+
+def find_faces(gray, scale_factor: float, min_neighbors: int, min_size: int,
+                cascades=DEFAULT_PASSES, fast_max_dim: int = None, refine: bool = False,
+                fast_min_face: int = DEFAULT_FAST_MIN_FACE):
+    """
+    Detect faces on an equalized grayscale image.
+    With `fast_max_dim` set, large images are detected on a downscaled copy and
+    the boxes mapped back to full resolution, optionally refined on crops. The
+    copy is kept large enough for faces of `fast_min_face` px (or `min_size`,
+    if larger); smaller faces are not found on the fast path.
+    Returns list of (x, y, w, h) rects and timings (ms) per pass plus "refine".
+    """
+    min_face = max(min_size, fast_min_face or 0)
+    scale = fast_path_scale(gray.shape, min_face, fast_max_dim) if fast_max_dim else 1.0
+    work = gray
+    if scale < 1.0:
+        work = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    scaled_min = max(CASCADE_WINDOW, round(min_size * scale)) if scale < 1.0 else min_size
+    params = dict(
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=(scaled_min, scaled_min),
+        flags=cv2.CASCADE_SCALE_IMAGE,
+    )
+
+    # Classifiers come from the process-wide pool — XML is parsed once per worker.
+    # Passes run concurrently, so latency is set by the slowest cascade.
+    all_faces, scores, per_pass = detect_parallel(work, cascades, **params)
+    timings = {name: r["ms"] for name, r in per_pass.items()}
+
+    # Deduplicate overlapping boxes across passes, keeping the best-supported one
+    keep = nms(xywh_to_xyxy(all_faces), scores, iou_thresh=0.3)
+    unique = [all_faces[i] for i in keep]
+
+    if scale < 1.0:
+        unique = [[round(v / scale) for v in box] for box in unique]
+        if refine and unique:
+            start = time.perf_counter()
+            unique, refined_scores = _refine_on_crops(gray, unique, cascades, params)
+            keep = nms(xywh_to_xyxy(unique), refined_scores, iou_thresh=0.3)
+            unique = [unique[i] for i in sorted(keep)]
+            timings["refine"] = (time.perf_counter() - start) * 1000
+
+    return unique, timings
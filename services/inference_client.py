@@ -0,0 +1,183 @@
+"""
+Shared HTTP client for the remote detectors (Roboflow infer and workflows).
+
+One pooled keep-alive `requests.Session` lives for the whole worker process,
+so reruns and sessions reuse TCP/TLS connections. Inference POSTs are paid
+and not idempotent, so only failures where the upstream did no work are
+retried, with jittered exponential backoff: connection errors (including
+connect timeouts) and 429/503 (honouring Retry-After). Read timeouts and
+other 5xx go straight back to the caller. Each endpoint has its own
+concurrency limit and retry budget, and latencies are recorded in a
+fixed-bucket histogram.
+"""
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.profiling import payload
+
+RETRY_STATUSES = {429, 503}  # the upstream refused the request, so nothing was run or billed
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+
+def redact(message: str) -> str:
+    """Mask API keys in error text; connection errors quote the full request URL."""
+    return re.sub(r"(api_key=)[^&\s'\"]+", r"\1***", message)
+
+
+def _retry_after(resp) -> float:
+    """Seconds to wait from a Retry-After header, or None."""
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms):
+        self.requests += 1
+        self.total_ms += ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-th latency quantile."""
+        if not self.requests:
+            return None
+        target, seen = q * self.requests, 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean_ms": round(self.total_ms / self.requests, 1) if self.requests else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "histogram": {
+                (f"<={b:g}" if b != float("inf") else f">{LATENCY_BUCKETS_MS[-2]:g}"): n
+                for b, n in zip(LATENCY_BUCKETS_MS, self.counts)
+            },
+        }
+
+
+class InferenceClient:
+    """
+    Pooled HTTP client with retries, per-endpoint concurrency limits and
+    latency histograms. `endpoint` names group requests for limits, retry
+    budgets (`retries`, else `max_retries`) and stats.
+    """
+
+    def __init__(self, pool_size=16, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 concurrency=None, default_concurrency=8, retries=None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_concurrency = default_concurrency
+        self._limits = dict(concurrency or {})
+        self._retries = dict(retries or {})
+        self._semaphores = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, name):
+        with self._lock:
+            if name not in self._semaphores:
+                limit = self._limits.get(name, self.default_concurrency)
+                self._semaphores[name] = threading.BoundedSemaphore(limit)
+                self._stats[name] = _EndpointStats()
+            return self._semaphores[name], self._stats[name]
+
+    def _backoff(self, attempt, resp=None):
+        # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        hinted = _retry_after(resp)
+        return max(delay, min(hinted, self.backoff_max)) if hinted is not None else delay
+
+    def post(self, url, endpoint="default", timeout=30, **kwargs) -> requests.Response:
+        """
+        POST with retries on 429/503 and connection errors; a read timeout
+        is raised at once, since the upstream may still be running (and
+        billing) the request. Returns the final response; callers still
+        `raise_for_status()`.
+        """
+        semaphore, stats = self._endpoint(endpoint)
+        max_retries = self._retries.get(endpoint, self.max_retries)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            resp, error = None, None
+            with semaphore:
+                try:
+                    resp = self.session.post(url, timeout=timeout, **kwargs)
+                except requests.ConnectionError as e:  # includes ConnectTimeout, not ReadTimeout
+                    error = e
+                except requests.Timeout:
+                    with self._lock:
+                        stats.observe((time.perf_counter() - start) * 1000)
+                        stats.errors += 1
+                    raise
+            elapsed = (time.perf_counter() - start) * 1000
+
+            retryable = error is not None or resp.status_code in RETRY_STATUSES
+            with self._lock:
+                stats.observe(elapsed)
+                if retryable:
+                    stats.errors += 1
+            if not retryable or attempt >= max_retries:
+                if error is not None:
+                    raise error
+                payload(f"{endpoint}_response_bytes", len(resp.content))
+                return resp
+
+            with self._lock:
+                stats.retries += 1
+            time.sleep(self._backoff(attempt, resp))
+            attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: s.as_dict() for name, s in self._stats.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> InferenceClient:
+    """Process-wide client shared by every session, so connections stay warm across reruns."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(concurrency={"roboflow-infer": 8, "roboflow-workflow": 4},
+                                      retries={"roboflow-workflow": 1})
+        return _client
@@ -0,0 +1,264 @@
+"""
+Background analysis jobs backed by `public.analyses`.
+
+The UI uploads the input image to the `images` storage bucket, inserts the
+row (status `queued`) and its `image_metadata`, then polls the row instead
+of blocking. Worker processes claim rows atomically through the
+`claim_analyses` RPC (SKIP LOCKED, and only rows whose image_metadata
+exists), run the matching handler and write `results`, moving the row
+through processing -> completed / failed. A row cancelled while running is
+left cancelled.
+
+Run workers against the local stack from `supabase start`:
+
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_KEY=<service_role key> \
+    ROBOFLOW_API_KEY=... python -m services.jobs --workers 4
+"""
+import argparse
+import io
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+import uuid
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_BUCKET = "images"
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+# Stored extension / content type by PIL format; uploads are JPEG or PNG, and
+# JPEG variants (MPO from phone cameras, …) are stored as plain JPEG
+STORED_TYPES = {"PNG": ("png", "image/png")}
+DEFAULT_STORED_TYPE = ("jpg", "image/jpeg")
+
+
+def service_client(url: str = None, key: str = None, timeout: float = None):
+    """Supabase client with the service role key — workers bypass RLS. `timeout` bounds PostgREST calls."""
+    from supabase import ClientOptions, create_client
+    options = ClientOptions(postgrest_client_timeout=timeout) if timeout else None
+    return create_client(url or os.environ["SUPABASE_URL"], key or os.environ["SUPABASE_SERVICE_KEY"], options)
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+# --------------------------------------------------
+# Producer side (UI)
+# --------------------------------------------------
+def enqueue(client, owner_id: str, project_id: str, analysis_type: str, image_bytes: bytes,
+            parameters: dict, model_provider: str = None, model_name: str = None,
+            input_source: str = "upload", checksum: str = None) -> str:
+    """
+    Store the input image and queue an analysis. Returns the analysis id.
+    `checksum` (the pixel digest) is recorded on image_metadata so completed
+    results can later be found by the result cache.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    ext, content_type = STORED_TYPES.get(image.format, DEFAULT_STORED_TYPE)
+    analysis_id = str(uuid.uuid4())
+    path = f"{owner_id}/{analysis_id}.{ext}"
+    bucket = client.storage.from_(IMAGE_BUCKET)
+    # Image first: claim_analyses only takes rows whose image_metadata exists, so a
+    # worker never sees the row before its input is in place
+    bucket.upload(path, image_bytes, {"content-type": content_type})
+    inserted = False
+    try:
+        client.table("analyses").insert({
+            "id": analysis_id,
+            "project_id": project_id,
+            "owner_id": owner_id,
+            "analysis_type": analysis_type,
+            "input_source": input_source,
+            "model_provider": model_provider,
+            "model_name": model_name,
+            "parameters": parameters,
+            "status": "queued",
+        }).execute()
+        inserted = True
+        client.table("image_metadata").insert({
+            "owner_id": owner_id,
+            "project_id": project_id,
+            "analysis_id": analysis_id,
+            "storage_bucket": IMAGE_BUCKET,
+            "storage_path": path,
+            "content_type": content_type,
+            "file_size_bytes": len(image_bytes),
+            "width": image.width,
+            "height": image.height,
+            "checksum_sha256": checksum,
+        }).execute()
+    except Exception:
+        # Leave nothing half-enqueued behind
+        try:
+            if inserted:
+                client.table("analyses").delete().eq("id", analysis_id).execute()
+            bucket.remove([path])
+        except Exception as e:
+            logger.warning("cleanup after failed enqueue of %s failed: %s", analysis_id, e)
+        raise
+    return analysis_id
+
+
+def get_jobs(client, ids: list) -> list:
+    if not ids:
+        return []
+    return (
+        client.table("analyses")
+        .select("id, status, analysis_type, model_name, results, error_message, "
+                "created_at, started_at, completed_at")
+        .in_("id", list(ids))
+        .execute()
+        .data
+    )
+
+
+def cancel(client, analysis_id: str):
+    (client.table("analyses")
+     .update({"status": "cancelled", "completed_at": _now()})
+     .eq("id", analysis_id)
+     .in_("status", ["queued", "processing"])
+     .execute())
+
+
+# --------------------------------------------------
+# Handlers: analysis_type -> fn(image, parameters) -> results dict
+# --------------------------------------------------
+def _object_detection(image: Image.Image, params: dict) -> dict:
+    from services.roboflow import DEFAULT_MAX_SIDE, run_inference
+    predictions = run_inference(
+        image, params["model"], params["version"], os.environ["ROBOFLOW_API_KEY"],
+        params["confidence"], params.get("max_side", DEFAULT_MAX_SIDE),
+    )
+    return {"predictions": predictions}
+
+
+def _face_detection(image: Image.Image, params: dict) -> dict:
+    from services.faces import find_faces, to_equalized_gray
+    faces, timings = find_faces(
+        to_equalized_gray(image), params.get("scale_factor", 1.1), params.get("min_neighbors", 5),
+        params.get("min_size", 30), params.get("cascades", ("frontal", "alt2", "profile")),
+    )
+    return {"faces": faces, "timings_ms": timings}
+
+
+HANDLERS = {
+    "object_detection": _object_detection,
+    "face_detection": _face_detection,
+}
+
+
+# --------------------------------------------------
+# Worker side
+# --------------------------------------------------
+def claim(client, worker_id: str, limit: int = 1, types: list = None) -> list:
+    return client.rpc(
+        "claim_analyses", {"p_worker_id": worker_id, "p_limit": limit, "p_types": types}
+    ).execute().data or []
+
+
+def _finish(client, analysis_id: str, fields: dict):
+    # Guarded on status so a job cancelled mid-run stays cancelled
+    (client.table("analyses")
+     .update({**fields, "completed_at": _now()})
+     .eq("id", analysis_id)
+     .eq("status", "processing")
+     .execute())
+
+
+def process(client, job: dict):
+    handler = HANDLERS.get(job["analysis_type"])
+    try:
+        if handler is None:
+            raise ValueError(f"No handler for analysis type '{job['analysis_type']}'")
+        meta = (
+            client.table("image_metadata").select("storage_bucket, storage_path")
+            .eq("analysis_id", job["id"]).limit(1).execute().data
+        )
+        if not meta:
+            raise ValueError("Input image metadata not found")
+        data = client.storage.from_(meta[0]["storage_bucket"]).download(meta[0]["storage_path"])
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+
+        start = time.perf_counter()
+        results = handler(image, job["parameters"])
+        results["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _finish(client, job["id"], {"status": "completed", "results": results})
+    except Exception as e:
+        logger.warning("analysis %s failed: %s", job["id"], e)
+        try:
+            _finish(client, job["id"], {
+                "status": "failed",
+                "error_message": f"{type(e).__name__}: {e}"[:1000],
+                "results": {"traceback": traceback.format_exc(limit=5)},
+            })
+        except Exception as finish_error:
+            # Left in `processing`; requeue_stale_analyses picks it up later
+            logger.error("could not mark analysis %s failed: %s", job["id"], finish_error)
+
+
+def work(worker_id: str = None, types: list = None, poll_interval: float = 2.0, stop=None):
+    """Claim-and-run loop for one worker process. `stop` is an optional Event."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    client = service_client()
+    logger.info("worker %s started", worker_id)
+    while stop is None or not stop.is_set():
+        try:
+            jobs = claim(client, worker_id, 1, types)
+        except Exception as e:
+            logger.warning("claim failed: %s", e)
+            jobs = []
+        if not jobs:
+            time.sleep(poll_interval)
+            continue
+        for job in jobs:
+            try:
+                process(client, job)
+            except Exception:
+                # One job must never take the worker down with it
+                logger.exception("worker %s: unexpected error on analysis %s", worker_id, job.get("id"))
+
+
+def start_pool(workers: int, types: list = None, poll_interval: float = 2.0):
+    """Start `workers` worker processes. Returns (processes, stop event)."""
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    procs = [
+        ctx.Process(target=work, kwargs={"types": types, "poll_interval": poll_interval, "stop": stop},
+                    name=f"analysis-worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    return procs, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background analysis workers.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--types", nargs="*", choices=sorted(HANDLERS), default=None)
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--stale-after", default="10 minutes",
+                        help="Requeue jobs stuck in processing longer than this on startup")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(message)s")
+
+    requeued = service_client().rpc("requeue_stale_analyses", {"p_timeout": args.stale_after}).execute().data
+    logger.info("requeued %s stale job(s)", requeued)
+
+    procs, stop = start_pool(args.workers, args.types, args.poll_interval)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for p in procs:
+            p.join(timeout=args.poll_interval + 5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Live video processing off the Streamlit script thread.
+
+A `LiveProcessor` takes frames from a capture thread (cv2.VideoCapture on a
+device index, MJPEG/RTSP URL or a looped test video) or from a
+streamlit-webrtc callback. Frames go through a small bounded queue that
+drops the oldest frame when full, so the worker always handles recent
+frames. The worker adapts two knobs to the target FPS. Frame skip follows
+the ratio of capture rate to target rate. Processing width shrinks while
+per-frame work exceeds the frame budget and grows back when there is
+headroom. The UI only reads `snapshot()` from a fragment, so a slow detector
+never blocks a rerun.
+
+The capture runs on the server, so the page only accepts a camera device
+index unless stream hosts are allowlisted in `CV_LIVE_STREAM_HOSTS`
+(comma-separated host or host:port, from secrets or the environment).
+Local paths are never accepted as a capture source.
+"""
+import collections
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import streamlit as st
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+try:
+    import av
+    from streamlit_webrtc import webrtc_streamer
+except Exception:
+    webrtc_streamer = None
+
+ADAPT_EVERY = 5  # processed frames between adjustments
+IDLE_TIMEOUT = 30  # seconds without a snapshot before a processor stops itself
+RESIZE_STEP = 0.85
+STREAM_SCHEMES = ("http", "https", "rtsp")
+
+
+class LiveProcessor:
+    """
+    Runs `process(rgb_frame) -> (annotated_frame, info_dict)` on a worker thread.
+    `info_dict` values are shown as metrics next to the stream.
+    """
+
+    def __init__(self, process, target_fps=10, max_width=960, min_width=240, queue_size=2):
+        self.process = process
+        self.settings = None
+        self.source_kind = None
+        self.target_fps = target_fps
+        self.max_width = max_width
+        self.min_width = min_width
+        self.width = max_width
+        self.skip = 1
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._latest = (None, {})
+        self._seen = 0
+        self._ema_ms = None
+        self._captured_at = collections.deque(maxlen=60)
+        self._done_at = collections.deque(maxlen=60)
+        self._latency_ms = collections.deque(maxlen=120)
+        self._process_ms = collections.deque(maxlen=120)
+        self._counts = {"captured": 0, "skipped": 0, "dropped": 0, "processed": 0, "errors": 0}
+        self._last_read = time.monotonic()
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def start(self, source=None, owned_path=None):
+        """Start the worker, plus a capture thread when `source` is given."""
+        self._spawn(self._work)
+        if source is not None:
+            self._spawn(self._capture, source, owned_path)
+        return self
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True, name=f"live-{target.__name__}")
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Signal the threads to exit; only waits for them when `timeout` is given."""
+        self._stop.set()
+        if timeout is not None:
+            for thread in self._threads:
+                thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, frame) -> bool:
+        """Offer a frame without blocking; returns False if it was skipped."""
+        now = time.perf_counter()
+        with self._lock:
+            self._counts["captured"] += 1
+            self._captured_at.append(now)
+            self._seen += 1
+            if self._seen % self.skip:
+                self._counts["skipped"] += 1
+                return False
+        item = (now, frame)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()  # stale: the worker fell behind
+                    with self._lock:
+                        self._counts["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def _capture(self, source, owned_path=None):
+        cap = cv2.VideoCapture(source)
+        try:
+            if not cap.isOpened():
+                self.error = f"Could not open live source: {source}"
+                return
+            # Files are paced at their native rate and looped, like a camera
+            is_file = isinstance(source, str) and os.path.exists(source)
+            fps = cap.get(cv2.CAP_PROP_FPS) if is_file else 0
+            interval = 1 / fps if fps and fps > 0 else 0
+            next_at = time.perf_counter()
+            while not self._stop.is_set():
+                ok, bgr = cap.read()
+                if not ok:
+                    if is_file and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                        continue
+                    self.error = "Live source ended."
+                    return
+                self.submit(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+                if interval:
+                    next_at += interval
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+        finally:
+            cap.release()
+            if owned_path:
+                os.unlink(owned_path)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _work(self):
+        processed = 0
+        while not self._stop.is_set():
+            if time.monotonic() - self._last_read > IDLE_TIMEOUT:
+                self._stop.set()  # the session went away
+                break
+            try:
+                captured_at, frame = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            start = time.perf_counter()
+            h, w = frame.shape[:2]
+            if w > self.width:
+                frame = cv2.resize(frame, (self.width, max(1, round(h * self.width / w))),
+                                   interpolation=cv2.INTER_AREA)
+            try:
+                annotated, info = self.process(frame)
+            except Exception as e:
+                with self._lock:
+                    self._counts["errors"] += 1
+                self.error = str(e)
+                continue
+            done = time.perf_counter()
+
+            with self._lock:
+                self._latest = (annotated, info)
+                self._counts["processed"] += 1
+                self._done_at.append(done)
+                self._latency_ms.append((done - captured_at) * 1000)
+                self._process_ms.append((done - start) * 1000)
+
+            processed += 1
+            ms = (done - start) * 1000
+            self._ema_ms = ms if self._ema_ms is None else 0.7 * self._ema_ms + 0.3 * ms
+            # Far over budget: react every frame rather than waiting a full cycle
+            if processed % ADAPT_EVERY == 0 or self._ema_ms > 2000 / self.target_fps:
+                self._adapt()
+
+    def _adapt(self):
+        budget_ms = 1000 / self.target_fps
+        with self._lock:
+            capture_fps = _rate(self._captured_at)
+        if capture_fps:
+            self.skip = int(np.clip(capture_fps // self.target_fps, 1, 30))
+
+        width = min(self.width, self.max_width)
+        if self._ema_ms > budget_ms * 1.1:
+            # Detector cost scales with pixel count, i.e. with width²
+            width = int(width * np.clip((budget_ms / self._ema_ms) ** 0.5, 0.5, RESIZE_STEP))
+        elif self._ema_ms < budget_ms * 0.6:
+            width = int(width / RESIZE_STEP) + 1
+        width = int(np.clip(width, self.min_width, self.max_width))
+        if width != self.width:
+            self.width = width
+            self._ema_ms = None  # measure the new size afresh
+
+    # ------------------------------------------------------------------
+    # Reader side
+    # ------------------------------------------------------------------
+
+    def latest_frame(self):
+        with self._lock:
+            return self._latest[0]
+
+    def snapshot(self):
+        """Latest (annotated frame, info, stats); never waits on the worker."""
+        self._last_read = time.monotonic()
+        with self._lock:
+            frame, info = self._latest
+            latency = np.array(self._latency_ms)
+            work = np.array(self._process_ms)
+            stats = {
+                **self._counts,
+                "fps": _rate(self._done_at),
+                "capture_fps": _rate(self._captured_at),
+                "latency_p50_ms": float(np.percentile(latency, 50)) if latency.size else None,
+                "latency_p95_ms": float(np.percentile(latency, 95)) if latency.size else None,
+                "process_p50_ms": float(np.percentile(work, 50)) if work.size else None,
+                "width": self.width,
+                "skip": self.skip,
+                "error": self.error,
+            }
+        return frame, info, stats
+
+
+def _rate(timestamps) -> float:
+    if len(timestamps) < 2 or timestamps[-1] == timestamps[0]:
+        return None
+    return (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+
+
+# ---------------------------------------------------------------------------
+# Streamlit panel
+# ---------------------------------------------------------------------------
+
+def allowed_stream_hosts() -> set:
+    """Hosts (or host:port) a live stream URL may point at; empty means device indexes only."""
+    try:
+        raw = st.secrets.get("CV_LIVE_STREAM_HOSTS")
+    except Exception:
+        raw = None
+    raw = raw or os.getenv("CV_LIVE_STREAM_HOSTS", "")
+    return {h.strip().lower() for h in raw.split(",") if h.strip()}
+
+
+def parse_capture_source(text: str, allowed_hosts=frozenset()):
+    """
+    Device index, or a stream URL whose scheme is in STREAM_SCHEMES and
+    whose host (or host:port) is allowlisted. Raises ValueError otherwise.
+    """
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    parts = urlsplit(text)
+    if parts.scheme.lower() not in STREAM_SCHEMES or not parts.hostname:
+        raise ValueError("Enter a camera device index (e.g. 0) or an http(s)/rtsp stream URL")
+    host = parts.hostname.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        raise ValueError("Invalid port in stream URL") from None
+    if host not in allowed_hosts and (port is None or f"{host}:{port}" not in allowed_hosts):
+        raise ValueError(f"Stream host {host!r} is not in CV_LIVE_STREAM_HOSTS")
+    return text
+
+
+SOURCE_FILE = "Video file (looped)"
+SOURCE_CAPTURE = "Camera index / MJPEG URL"
+SOURCE_WEBRTC = "Browser camera (WebRTC)"
+
+
+def _fmt_ms(v):
+    return f"{v:.0f} ms" if v is not None else "—"
+
+
+@st.fragment(run_every=0.5)
+def _live_view(state_key, show_frame=True):
+    proc = st.session_state.get(state_key)
+    if proc is None:
+        return
+    frame, info, stats = proc.snapshot()
+    if stats["error"]:
+        st.error(stats["error"])
+    if show_frame and frame is not None:
+        st.image(frame, caption=f"{frame.shape[1]}×{frame.shape[0]}", use_container_width=True)
+
+    cols = st.columns(4 + len(info))
+    cols[0].metric("Achieved FPS", f"{stats['fps']:.1f}" if stats["fps"] else "—",
+                   help=f"Target {proc.target_fps} FPS, source {stats['capture_fps'] or 0:.1f} FPS")
+    cols[1].metric("Latency p50", _fmt_ms(stats["latency_p50_ms"]), help="Capture → annotated frame")
+    cols[2].metric("Latency p95", _fmt_ms(stats["latency_p95_ms"]))
+    cols[3].metric("Width / skip", f"{stats['width']} px / {stats['skip']}")
+    for col, (label, value) in zip(cols[4:], info.items()):
+        col.metric(label, value)
+    st.caption(
+        f"Processed {stats['processed']} · skipped {stats['skipped']} · dropped stale {stats['dropped']}"
+        f" · errors {stats['errors']} · detector {_fmt_ms(stats['process_p50_ms'])} p50"
+    )
+    if not proc.running:
+        st.session_state.pop(state_key, None)
+
+
+def _render_webrtc(key, state_key, make_process, settings, target_fps, max_width):
+    proc = st.session_state.get(state_key)
+    if proc is None or not proc.running:
+        proc = LiveProcessor(make_process(), target_fps, max_width).start()
+        proc.settings, proc.source_kind = settings, SOURCE_WEBRTC
+        st.session_state[state_key] = proc
+
+    def callback(frame):
+        # Runs on streamlit-webrtc's thread: hand the frame over and return the newest result
+        img = frame.to_ndarray(format="rgb24")
+        proc.submit(img)
+        out = proc.latest_frame()
+        return av.VideoFrame.from_ndarray(out if out is not None else img, format="rgb24")
+
+    ctx = webrtc_streamer(key=f"{key}_webrtc", video_frame_callback=callback, async_processing=True,
+                          media_stream_constraints={"video": True, "audio": False})
+    if ctx.state.playing:
+        _live_view(state_key, show_frame=False)
+
+
+def render_live(key: str, make_process, settings=()):
+    """
+    Live-stream panel: source picker, target FPS, start/stop and a metrics view.
+    `make_process()` builds a fresh per-stream frame processor; it is rebuilt
+    whenever `settings` changes while streaming.
+    """
+    if cv2 is None:
+        st.error("Live streaming requires OpenCV.")
+        if _import_error:
+            st.code(_import_error, language="text")
+        return
+
+    state_key = f"_live_{key}"
+    sources = [SOURCE_FILE, SOURCE_CAPTURE] + ([SOURCE_WEBRTC] if webrtc_streamer else [])
+    c1, c2, c3 = st.columns(3)
+    kind = c1.selectbox("Live source", sources, key=f"{key}_live_source",
+                        help=None if webrtc_streamer else "Install streamlit-webrtc for browser camera input")
+    target_fps = c2.slider("Target FPS", 1, 30, 10, key=f"{key}_live_fps")
+    max_width = c3.slider("Max processing width (px)", 240, 1920, 960, 16, key=f"{key}_live_width")
+
+    proc = st.session_state.get(state_key)
+    if proc is not None and proc.source_kind != kind:
+        proc.stop()
+        st.session_state.pop(state_key, None)
+        proc = None
+    if proc is not None:
+        proc.target_fps, proc.max_width = target_fps, max_width
+        if proc.settings != settings:
+            proc.process, proc.settings = make_process(), settings
+
+    if kind == SOURCE_WEBRTC:
+        _render_webrtc(key, state_key, make_process, settings, target_fps, max_width)
+        return
+
+    if kind == SOURCE_FILE:
+        f = st.file_uploader("Test video", type=["mp4", "avi", "mov", "mkv", "mjpeg"], key=f"{key}_live_video")
+        source = f
+    else:
+        hosts = allowed_stream_hosts()
+        if hosts:
+            text = st.text_input("Device index or stream URL", "0", key=f"{key}_live_url",
+                                 help="e.g. 0 for the first camera, or a URL on " + ", ".join(sorted(hosts)))
+        else:
+            text = st.text_input("Camera device index", "0", key=f"{key}_live_url",
+                                 help="Stream URLs are disabled until CV_LIVE_STREAM_HOSTS allowlists their hosts")
+        try:
+            source = parse_capture_source(text, hosts)
+        except ValueError as e:
+            st.warning(str(e))
+            source = None
+
+    b1, b2 = st.columns(2)
+    if b1.button("▶ Start", key=f"{key}_live_start", disabled=source is None):
+        if proc is not None:
+            proc.stop()
+        owned_path = None
+        if kind == SOURCE_FILE:
+            # VideoCapture needs a real path; the capture thread deletes it on stop
+            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(f.name)[1], delete=False) as tmp:
+                f.seek(0)
+                shutil.copyfileobj(f, tmp)
+                source = owned_path = tmp.name
+        proc = LiveProcessor(make_process(), target_fps, max_width).start(source, owned_path)
+        proc.settings, proc.source_kind = settings, kind
+        st.session_state[state_key] = proc
+    if b2.button("⏹ Stop", key=f"{key}_live_stop", disabled=proc is None):
+        proc.stop()
+        st.session_state.pop(state_key, None)
+        proc = None
+
+    if proc is None:
+        st.info("Choose a source and press Start.")
+        return
+    _live_view(state_key)
@@ -0,0 +1,208 @@
+"""
+Frame-differencing and background-subtraction motion detection without any
+UI dependency. Frames are RGB arrays; used by the Streamlit motion module,
+the offline benchmarks and the batch CLI.
+"""
+import os
+
+import numpy as np
+
+_import_error = None
+try:
+    import cv2
+except Exception as e:
+    cv2 = None
+    _import_error = str(e)
+
+
+def to_gray_blur(image_array):
+    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+    return cv2.GaussianBlur(gray, (21, 21), 0)
+
+
+def detect_motion(frame_a, frame_b, threshold=25):
+    """
+    Compare two blurred grayscale frames.
+    Returns: diff image, binary mask, contour-annotated colour image, motion %
+    """
+    diff = cv2.absdiff(frame_a, frame_b)
+    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    mask = cv2.dilate(mask, None, iterations=2)
+
+    # Motion percentage
+    motion_pct = (np.count_nonzero(mask) / mask.size) * 100
+
+    # Draw contours on a blank colour canvas
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    canvas = np.zeros((*mask.shape, 3), dtype=np.uint8)
+    cv2.drawContours(canvas, contours, -1, (0, 255, 100), 2)
+
+    return diff, mask, canvas, motion_pct, contours
+
+
+def parse_regions(text: str) -> dict:
+    """
+    Parse regions of interest, one per line: `name: x,y x,y x,y …` with
+    coordinates as fractions of frame width/height. Two points make a rectangle.
+    """
+    regions = {}
+    for n, line in enumerate(text.strip().splitlines(), start=1):
+        if not line.strip():
+            continue
+        name, _, coords = line.rpartition(":")
+        try:
+            pts = [tuple(float(v) for v in p.split(",")) for p in coords.split()]
+        except ValueError:
+            raise ValueError(f"Line {n}: expected `name: x,y x,y …`")
+        if len(pts) == 2:
+            (x1, y1), (x2, y2) = pts
+            pts = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        if len(pts) < 3 or any(len(p) != 2 or not (0 <= p[0] <= 1 and 0 <= p[1] <= 1) for p in pts):
+            raise ValueError(f"Line {n}: need 2+ points with coordinates between 0 and 1")
+        regions[name.strip() or f"Region {n}"] = np.array(pts, dtype=np.float64)
+    return regions
+
+
+def fast_motion(frame_a, frame_b, threshold=25, min_area=500, grid_width=160, regions=None):
+    """
+    Coarse motion analysis on a downsampled grid, restricted to regions of interest.
+    Frames are cropped to the regions' bounding box before downsampling, so
+    pixels outside every region are never processed. Blobs come from one
+    connectedComponentsWithStats call per region instead of a contour loop.
+    Areas (px²) and boxes (x, y, w, h) are reported in full-resolution pixels.
+    """
+    h, w = frame_a.shape[:2]
+    if not regions:
+        regions = {"Frame": np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float64)}
+
+    polys = {name: pts * (w, h) for name, pts in regions.items()}
+    allpts = np.vstack(list(polys.values()))
+    x0, y0 = np.clip(np.floor(allpts.min(axis=0)), 0, (w, h)).astype(int)
+    x1, y1 = np.clip(np.ceil(allpts.max(axis=0)), 0, (w, h)).astype(int)
+    x1, y1 = max(x1, x0 + 1), max(y1, y0 + 1)
+
+    scale = min(1.0, grid_width / w)
+    gw, gh = max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale))
+
+    def prep(frame):
+        gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY)
+        gray = cv2.resize(gray, (gw, gh), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    diff = cv2.absdiff(prep(frame_a), prep(frame_b))
+    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    mask = cv2.dilate(mask, None, iterations=1)
+
+    area_scale = 1 / (scale * scale)
+    results = {}
+    for name, poly in polys.items():
+        roi = np.zeros_like(mask)
+        cv2.fillPoly(roi, [np.round((poly - (x0, y0)) * scale).astype(np.int32)], 255)
+        roi_px = np.count_nonzero(roi)
+        region_mask = cv2.bitwise_and(mask, roi)
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(region_mask, connectivity=8)
+        stats = stats[1:].astype(np.float64)  # drop background label
+        areas = stats[:, cv2.CC_STAT_AREA] * area_scale
+        keep = areas >= min_area
+        boxes = stats[keep, :4] / scale + (x0, y0, 0, 0)
+
+        results[name] = {
+            "motion_pct": (np.count_nonzero(region_mask) / roi_px * 100) if roi_px else 0.0,
+            "areas": areas[keep],
+            "boxes": boxes.round().astype(int),
+        }
+    return results
+
+
+BACKGROUND_MODELS = ["Running average", "MOG2", "KNN"]
+
+
+def iter_video_frames(source, every_n: int = 1, max_width: int = None):
+    """
+    Yield (frame_index, RGB frame) from a video path or any iterable of frames.
+    Frames are decoded one at a time, so memory does not grow with clip length.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        cap = cv2.VideoCapture(str(source))
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {source}")
+        try:
+            idx = 0
+            while True:
+                if idx % every_n:
+                    # grab() skips decoding frames we are not going to analyse
+                    if not cap.grab():
+                        break
+                    idx += 1
+                    continue
+                ok, bgr = cap.read()
+                if not ok:
+                    break
+                frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                if max_width and frame.shape[1] > max_width:
+                    h = round(frame.shape[0] * max_width / frame.shape[1])
+                    frame = cv2.resize(frame, (max_width, h), interpolation=cv2.INTER_AREA)
+                yield idx, frame
+                idx += 1
+        finally:
+            cap.release()
+    else:
+        for idx, frame in enumerate(source):
+            if idx % every_n == 0:
+                yield idx, frame
+
+
+class Background:
+    """
+    Incrementally updated background model for a stream of blurred gray frames.
+    `mask(blur)` returns the binary foreground mask, or None while the
+    running average is still being seeded by the first frame.
+    """
+
+    def __init__(self, model="Running average", threshold=25, learning_rate=0.05):
+        self.threshold = threshold
+        self.learning_rate = learning_rate
+        self.average = None
+        self.subtractor = None
+        if model == "MOG2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
+        elif model == "KNN":
+            self.subtractor = cv2.createBackgroundSubtractorKNN(detectShadows=True)
+
+    def mask(self, blur):
+        if self.subtractor is not None:
+            fg = self.subtractor.apply(blur, learningRate=self.learning_rate)
+            # Shadows are marked 127 — treat only confident foreground as motion
+            _, mask = cv2.threshold(fg, 200, 255, cv2.THRESH_BINARY)
+        else:
+            if self.average is None:
+                self.average = blur.astype(np.float32)
+                return None
+            diff = cv2.absdiff(blur, cv2.convertScaleAbs(self.average))
+            _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+            cv2.accumulateWeighted(blur, self.average, self.learning_rate)
+        return cv2.dilate(mask, None, iterations=2)
+
+
+def stream_motion(frames, threshold=25, min_contour_area=500, model="Running average",
+                   learning_rate=0.05):
+    """
+    Frame-by-frame motion detection against an incrementally updated background.
+    `frames` yields (index, RGB frame) pairs, e.g. from `iter_video_frames`.
+    Only the background model is kept between frames, so memory is constant.
+    Yields dicts with frame index, motion %, significant contours and the mask.
+    """
+    background = Background(model, threshold, learning_rate)
+
+    for idx, frame in frames:
+        mask = background.mask(to_gray_blur(frame))
+        if mask is None:
+            continue
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        yield {
+            "frame": idx,
+            "motion_pct": (np.count_nonzero(mask) / mask.size) * 100,
+            "contours": [c for c in contours if cv2.contourArea(c) >= min_contour_area],
+            "mask": mask,
+        }
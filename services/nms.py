@@ -0,0 +1,98 @@
+"""
+Vectorized non-maximum suppression shared by the face and Roboflow modules.
+
+Boxes are NumPy arrays of shape (N, 4). Face detections use (x, y, w, h);
+Roboflow predictions use centre format, converted with `predictions_to_xyxy`.
+"""
+import numpy as np
+
+
+def xywh_to_xyxy(boxes) -> np.ndarray:
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.column_stack([b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]])
+
+
+def predictions_to_xyxy(predictions: list) -> np.ndarray:
+    """Roboflow {x, y, width, height} centre boxes -> (N, 4) corner array."""
+    if not predictions:
+        return np.zeros((0, 4))
+    c = np.array([[p["x"], p["y"], p["width"], p["height"]] for p in predictions], dtype=np.float64)
+    half_w, half_h = c[:, 2] / 2, c[:, 3] / 2
+    return np.column_stack([c[:, 0] - half_w, c[:, 1] - half_h, c[:, 0] + half_w, c[:, 1] + half_h])
+
+
+def iou_matrix(a, b) -> np.ndarray:
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays -> (N, M)."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def nms(boxes, scores=None, iou_thresh: float = 0.3) -> np.ndarray:
+    """
+    Greedy IoU-based NMS on (N, 4) xyxy boxes.
+    Boxes are visited in descending score order (input order when scores is
+    None, matching the old keep-first behaviour). Returns kept indices.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if scores is None:
+        order = np.arange(n)
+    else:
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        ix1 = np.maximum(x1[i], x1[rest])
+        iy1 = np.maximum(y1[i], y1[rest])
+        ix2 = np.minimum(x2[i], x2[rest])
+        iy2 = np.minimum(y2[i], y2[rest])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou <= iou_thresh]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, groups, iou_thresh: float = 0.3) -> np.ndarray:
+    """
+    NMS applied independently per group (class id, image id, …) in one pass.
+    Each group is shifted to a disjoint region so boxes from different groups
+    never overlap. Returns kept indices in descending score order.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, group_ids = np.unique(np.asarray(groups), return_inverse=True)
+    # Span, not max: raw model output and edge boxes can have negative coordinates
+    offset = boxes.max() - boxes.min() + 1
+    shifted = boxes + (group_ids.reshape(-1) * offset)[:, None]
+    return nms(shifted, scores, iou_thresh)
+
+
+def nms_predictions(predictions: list, iou_thresh: float = 0.5, class_aware: bool = True) -> list:
+    """Filter Roboflow-style prediction dicts, keeping the most confident of each overlap."""
+    if len(predictions) < 2:
+        return list(predictions)
+    boxes = predictions_to_xyxy(predictions)
+    scores = [p.get("confidence", 0) for p in predictions]
+    if class_aware:
+        keep = batched_nms(boxes, scores, [p.get("class", "object") for p in predictions], iou_thresh)
+    else:
+        keep = nms(boxes, scores, iou_thresh)
+    return [predictions[i] for i in sorted(keep)]
@@ -0,0 +1,106 @@
+"""
+Opt-in latency profiling for Streamlit reruns.
+
+`computervision.render` opens a `RunProfile` for each rerun while profiling
+mode is on. Code anywhere on the script thread can then wrap work in
+`stage("detect")` or record `payload("upload_bytes", n)`; with no active
+profile both are no-ops. Work handed to a thread pool is submitted as
+`bind(fn)` so it records into the submitting thread's profile. First-import cost of each lazily loaded module is
+kept process-wide in `IMPORT_TIMES`, since it is only paid once per worker.
+"""
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+IMPORT_TIMES = {}
+_local = threading.local()
+
+
+class RunProfile:
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self.stages = []
+        self.payloads = {}
+        self._lock = threading.Lock()  # payloads can arrive from several bound worker threads
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "stages": [{"stage": name, "ms": round(ms, 2)} for name, ms in self.stages],
+            "payloads": dict(self.payloads),
+        }
+
+
+def start_run(label: str) -> RunProfile:
+    _local.profile = RunProfile(label)
+    return _local.profile
+
+
+def end_run() -> RunProfile:
+    profile = getattr(_local, "profile", None)
+    _local.profile = None
+    return profile
+
+
+def current() -> RunProfile:
+    return getattr(_local, "profile", None)
+
+
+def bind(fn):
+    """`fn` wrapped to run under the calling thread's profile, for submitting to worker threads."""
+    profile = current()
+    if profile is None:
+        return fn
+
+    def run(*args, **kwargs):
+        previous = current()
+        _local.profile = profile
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.profile = previous
+
+    return run
+
+
+@contextmanager
+def stage(name: str):
+    profile = current()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages.append((name, (time.perf_counter() - start) * 1000))
+
+
+def payload(name: str, nbytes: int):
+    profile = current()
+    if profile is not None:
+        with profile._lock:
+            profile.payloads[name] = profile.payloads.get(name, 0) + int(nbytes)
+
+
+def timed_import(name: str):
+    """
+    Import a module, recording its first-import wall time and which new
+    top-level packages (cv2, numpy, …) it pulled in.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    before = {m.partition(".")[0] for m in sys.modules}
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = {
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+        "new_packages": sorted(
+            m for m in {m.partition(".")[0] for m in sys.modules} - before if not m.startswith("_")
+        ),
+    }
+    return module
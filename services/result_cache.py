@@ -0,0 +1,206 @@
+"""
+Content-addressed cache for remote detection results.
+
+Entries are keyed on a SHA-256 of the decoded pixels plus the model
+parameters, so re-running an identical image skips the network. Lookups go
+through an in-memory LRU, then an on-disk SQLite store, then (optionally,
+with a service-role client) the same owner's completed analyses in Supabase
+whose `image_metadata.checksum_sha256` matches the pixel digest.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from services.encoding import DEFAULT_MAX_SIDE
+
+CACHE_DIR = os.getenv("CV_CACHE_DIR", ".cache")
+
+
+def image_digest(image: Image.Image) -> str:
+    """SHA-256 of decoded pixels — identical for re-encoded copies of the same image."""
+    h = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def encode_side(size: tuple, max_side) -> int:
+    """Long side of the image actually uploaded for `max_side` (no upscaling; falsy = full size)."""
+    long_side = max(size)
+    return min(long_side, max_side) if max_side else long_side
+
+
+def result_key(digest: str, model: str, version: str, confidence, side: int) -> str:
+    """`side` is the effective upload size from `encode_side`, so 640 px and 2048 px runs never share results."""
+    return f"{digest}:{model}/{version}@{confidence}:{side}"
+
+
+class ResultCache:
+    """
+    Two-tier result cache: an in-memory LRU in front of a SQLite file.
+    The disk tier evicts least-recently-used rows once `max_bytes` is
+    exceeded, and entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, path=None, mem_entries=128, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path or os.path.join(CACHE_DIR, "results.sqlite")
+        self.mem_entries = mem_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "remote_hits": 0, "misses": 0}
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "create table if not exists results ("
+                " key text primary key, value text not null, size integer not null,"
+                " created_at real not null, accessed_at real not null)"
+            )
+            db.execute("create index if not exists results_accessed_at_idx on results(accessed_at)")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_entries:
+                self._mem.popitem(last=False)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key: str, remote=None):
+        """
+        Return cached predictions for `key`, or None.
+        `remote` is an optional zero-argument callable consulted after both
+        local tiers miss; a non-None result is written back locally.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._mem.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[1]
+
+        with self._connect() as db:
+            row = db.execute("select value, created_at from results where key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                db.execute("update results set accessed_at = ? where key = ?", (now, key))
+                value = json.loads(row[0])
+                self._remember(key, (row[1], value))
+                self._count("disk_hits")
+                return value
+
+        if remote is not None:
+            value = remote()
+            if value is not None:
+                self.put(key, value)
+                self._count("remote_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def contains(self, key: str) -> bool:
+        """Whether a local tier holds a live entry for `key`; no stats, no LRU update."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                return True
+        with self._connect() as db:
+            row = db.execute("select created_at from results where key = ?", (key,)).fetchone()
+        return bool(row) and now - row[0] <= self.ttl
+
+    def put(self, key: str, value):
+        now = time.time()
+        blob = json.dumps(value, separators=(",", ":"))
+        self._remember(key, (now, value))
+        with self._connect() as db:
+            db.execute(
+                "insert or replace into results (key, value, size, created_at, accessed_at)"
+                " values (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._evict(db, now)
+
+    def _evict(self, db, now):
+        db.execute("delete from results where created_at < ?", (now - self.ttl,))
+        total = db.execute("select coalesce(sum(size), 0) from results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk rows oldest-access first until back under budget
+        doomed = []
+        for key, size in db.execute("select key, size from results order by accessed_at"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        db.executemany("delete from results where key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._mem)
+        with self._connect() as db:
+            stats["disk_entries"], stats["disk_bytes"] = db.execute(
+                "select count(*), coalesce(sum(size), 0) from results"
+            ).fetchone()
+        return stats
+
+
+def supabase_lookup(client, owner_id: str, digest: str, model: str, version: str, confidence, side: int):
+    """
+    Find predictions from a completed analysis owned by `owner_id` of an
+    image whose `checksum_sha256` equals `digest` and whose model,
+    confidence and effective upload size match. `client` must bypass RLS
+    (service role). Returns the predictions list or None.
+    """
+    rows = (
+        client.table("image_metadata")
+        .select("analysis_id, width, height, analyses(status, model_name, parameters, results)")
+        .eq("owner_id", owner_id)
+        .eq("checksum_sha256", digest)
+        .not_.is_("analysis_id", "null")
+        .execute()
+        .data
+    )
+    for row in rows or []:
+        analysis = row.get("analyses") or {}
+        params = analysis.get("parameters") or {}
+        if (
+            analysis.get("status") == "completed"
+            and analysis.get("model_name") == f"{model}/{version}"
+            and params.get("confidence") == confidence
+            and row.get("width") and row.get("height")
+            and encode_side((row["width"], row["height"]), params.get("max_side", DEFAULT_MAX_SIDE)) == side
+            and "predictions" in (analysis.get("results") or {})
+        ):
+            return analysis["results"]["predictions"]
+    return None
+
+
+# Shared by every session in the worker process
+RESULT_CACHE = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global RESULT_CACHE
+    with _cache_lock:
+        if RESULT_CACHE is None:
+            RESULT_CACHE = ResultCache()
+        return RESULT_CACHE
@@ -0,0 +1,204 @@
+"""
+Roboflow-hosted detectors (model inference, multi-model fan-out and the
+Gemini workflow) without any UI dependency. Uploads go through the shared
+pooled `InferenceClient`; predictions are Roboflow centre-format dicts in
+original image pixels.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from services.encoding import DEFAULT_MAX_SIDE, encode_image, rescale_predictions
+from services.inference_client import get_client, redact
+from services.nms import nms_predictions
+from services.profiling import bind
+from services.result_cache import encode_side, image_digest, result_key
+from services.single_flight import RateLimiter, SingleFlight
+
+ROBOFLOW_INFER_URL = os.getenv("ROBOFLOW_INFER_URL", "https://detect.roboflow.com")
+
+WORKFLOW_ID  = "playground-gemini-3-flash-od"
+WORKSPACE    = "klhinnovation"
+WORKFLOW_URL = os.getenv("ROBOFLOW_WORKFLOW_URL", "https://serverless.roboflow.com")
+WORKFLOW_MAX_SIDE = 1536  # Gemini tiles larger inputs internally; more pixels only cost upload time
+
+# Shared by every session in the worker process
+WORKFLOW_FLIGHTS = SingleFlight()
+# Per-user budget in upstream workflow calls (a tiled run costs one per tile sent)
+WORKFLOW_LIMITER = RateLimiter(float(os.getenv("CV_WORKFLOW_CALLS_PER_MIN", "20")), per=60.0,
+                               burst=float(os.getenv("CV_WORKFLOW_BURST", "40")))
+
+
+def run_workflow(image: Image.Image, roboflow_key: str, google_key: str,
+                 classes: list, use_cache: bool, source_bytes: bytes = None) -> list:
+    """
+    Call Roboflow Workflow REST endpoint directly.
+    Predictions are returned in original image pixels.
+    """
+    url = f"{WORKFLOW_URL}/{WORKSPACE}/workflows/{WORKFLOW_ID}"
+    b64, scale = encode_image(image, WORKFLOW_MAX_SIDE, source_bytes)
+    return rescale_predictions(_post_workflow(url, b64, roboflow_key, google_key, classes, use_cache), scale)
+
+
+def workflow_key(digest: str, classes: list) -> str:
+    """Cache / coalescing key: same pixels, same class set, same workflow."""
+    return f"{digest}:workflow/{WORKSPACE}/{WORKFLOW_ID}@{','.join(sorted(classes))}"
+
+
+def run_workflow_shared(image: Image.Image, roboflow_key: str, google_key: str, classes: list,
+                        use_cache: bool, source_bytes: bytes = None, cache=None, digest: str = None) -> tuple:
+    """
+    `run_workflow` behind the local result cache (when `use_cache` and a
+    `ResultCache` is given) and process-wide request coalescing: concurrent
+    identical requests from any session share one upstream call. `digest` is
+    the image's `image_digest` when the caller already computed it.
+    Returns (predictions, source) where source is "cache", "shared" or "upstream".
+    """
+    key = workflow_key(digest or image_digest(image), classes)
+    if use_cache and cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached, "cache"
+
+    def call():
+        predictions = run_workflow(image, roboflow_key, google_key, classes, use_cache, source_bytes)
+        if use_cache and cache is not None:
+            cache.put(key, predictions)
+        return predictions
+
+    predictions, shared = WORKFLOW_FLIGHTS.do(key, call)
+    return predictions, "shared" if shared else "upstream"
+
+
+def _post_workflow(url: str, b64: str, roboflow_key: str, google_key: str,
+                   classes: list, use_cache: bool) -> list:
+    """POST an encoded image to the workflow and unwrap its predictions list."""
+    payload = {
+        "api_key": roboflow_key,
+        "inputs": {
+            "image": {"type": "base64", "value": b64},
+            "classes": classes,
+            "model_api_key": google_key,
+        },
+        "use_cache": use_cache,
+    }
+
+    resp = get_client().post(url, endpoint="roboflow-workflow", json=payload, timeout=60)
+    resp.raise_for_status()
+    data = resp.json()
+
+    # Roboflow workflow responses: {"outputs": [...]} or {"predictions": [...]}
+    if "outputs" in data:
+        outputs = data["outputs"]
+        if isinstance(outputs, list) and outputs:
+            item = outputs[0]
+            for key in ("predictions", "detections", "output"):
+                if key in item:
+                    val = item[key]
+                    if isinstance(val, dict):
+                        return val.get("predictions", [])
+                    if isinstance(val, list):
+                        return val
+    if "predictions" in data:
+        return data["predictions"]
+    return []
+
+
+def run_inference(image: Image.Image, model: str, version: str, api_key: str, confidence: int,
+                  max_side: int = DEFAULT_MAX_SIDE, source_bytes: bytes = None) -> list:
+    """
+    Call Roboflow infer REST endpoint directly — no SDK required.
+    The upload is shrunk to `max_side`; predictions are returned in original pixels.
+    """
+    b64, scale = encode_image(image, max_side, source_bytes)
+    return rescale_predictions(_post_infer(b64, model, version, api_key, confidence), scale)
+
+
+def _post_infer(b64: str, model: str, version: str, api_key: str, confidence: int) -> list:
+    """POST an encoded image to one model; predictions are in encoded-image pixels."""
+    resp = get_client().post(
+        f"{ROBOFLOW_INFER_URL}/{model}/{version}",
+        endpoint="roboflow-infer",
+        params={"api_key": api_key, "confidence": confidence / 100},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        data=b64,
+        timeout=30,
+    )
+    resp.raise_for_status()
+    return resp.json().get("predictions", [])
+
+
+# --------------------------------------------------
+# Multi-model fan-out
+# --------------------------------------------------
+FANOUT_MERGE_IOU = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Threads only wait on HTTP; the client's per-endpoint limit bounds real concurrency
+            _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="fanout")
+        return _executor
+
+
+def _timed_infer(b64, model, version, api_key, confidence):
+    start = time.perf_counter()
+    predictions = _post_infer(b64, model, version, api_key, confidence)
+    return predictions, (time.perf_counter() - start) * 1000
+
+
+def run_fanout(image: Image.Image, models: list, api_key: str, confidence: int,
+               max_side: int = DEFAULT_MAX_SIDE, source_bytes: bytes = None, cache=None,
+               merge_iou: float = FANOUT_MERGE_IOU) -> tuple:
+    """
+    Run several (model, version) pairs on one image concurrently.
+    The image is encoded once and the same payload is posted to every model,
+    so wall time tracks the slowest model rather than the sum. Predictions are
+    tagged with their "model", then merged with class-aware NMS at `merge_iou`.
+    With a `ResultCache`, cached models are served locally and only misses are
+    sent. A failing model is reported in its entry without failing the rest.
+    Returns (merged predictions, {"model/version": {"ms", "boxes", "cached", "error"}}).
+    """
+    per_model, results, pending = {}, {}, []
+    digest = image_digest(image) if cache is not None else None
+    side = encode_side(image.size, max_side)
+    for model, version in models:
+        name = f"{model}/{version}"
+        cached = cache.get(result_key(digest, model, version, confidence, side)) if cache is not None else None
+        if cached is not None:
+            results[name] = cached
+            per_model[name] = {"ms": 0.0, "boxes": len(cached), "cached": True, "error": None}
+        else:
+            pending.append((model, version))
+
+    if pending:
+        b64, scale = encode_image(image, max_side, source_bytes)
+        executor = _get_executor()
+        futures = {
+            (model, version): executor.submit(bind(_timed_infer), b64, model, version, api_key, confidence)
+            for model, version in pending
+        }
+        for (model, version), future in futures.items():
+            name = f"{model}/{version}"
+            try:
+                predictions, ms = future.result()
+            except Exception as e:
+                per_model[name] = {"ms": None, "boxes": 0, "cached": False,
+                                   "error": redact(f"{type(e).__name__}: {e}")}
+                continue
+            predictions = rescale_predictions(predictions, scale)
+            if cache is not None:
+                cache.put(result_key(digest, model, version, confidence, side), predictions)
+            results[name] = predictions
+            per_model[name] = {"ms": round(ms, 1), "boxes": len(predictions), "cached": False, "error": None}
+
+    tagged = [{**p, "model": name} for name, preds in results.items() for p in preds]
+    return nms_predictions(tagged, merge_iou, class_aware=True), per_model
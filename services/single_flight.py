@@ -0,0 +1,119 @@
+"""
+Request coalescing and per-user rate limiting for slow, paid upstream calls.
+
+`SingleFlight` merges concurrent calls that share a key: the first caller
+runs the function and every caller that arrives while it is in flight waits
+for, and receives, the same result (or exception). Nothing is kept once the
+call finishes; pair it with `ResultCache` for reuse after completion.
+
+`RateLimiter` is a token bucket per user id, so one busy session cannot
+queue up a stream of paid calls for everyone else.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Process-wide de-duplication of identical in-flight calls."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "shared": 0, "failed": 0}
+
+    def do(self, key, fn) -> tuple:
+        """
+        Run `fn()` unless a call with `key` is already in flight, in which
+        case wait for that one. Returns (result, shared).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["shared"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self, key=None) -> int:
+        """Number of in-flight calls, or of callers attached to `key`'s call (0 if none)."""
+        with self._lock:
+            if key is None:
+                return len(self._calls)
+            call = self._calls.get(key)
+            return 0 if call is None else call.waiters + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached; retry in {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket per user: `rate` tokens per `per` seconds, holding at most
+    `burst`. Idle users are forgotten least-recently-used past `max_users`.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, burst: float = None, max_users: int = 10_000):
+        self.rate = rate / per
+        self.burst = float(burst if burst is not None else rate)
+        self.max_users = max_users
+        self._buckets = OrderedDict()  # user -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _tokens(self, user, now) -> float:
+        tokens, updated = self._buckets.get(user, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def acquire(self, user, cost: float = 1.0):
+        """Take `cost` tokens from `user`'s bucket or raise `RateLimited`."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(user, now)
+            if tokens < cost:
+                raise RateLimited((cost - tokens) / self.rate if self.rate else float("inf"))
+            self._buckets[user] = (tokens - cost, now)
+            self._buckets.move_to_end(user)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+
+    def remaining(self, user) -> float:
+        with self._lock:
+            return self._tokens(user, time.monotonic())
@@ -0,0 +1,104 @@
+"""
+Per-session memo cache for intermediate pipeline arrays.
+
+Streamlit reruns the whole script on every widget change. Caching each
+pipeline stage's output (decoded frame, grayscale, raw detections, …) under
+the input digest plus only the parameters that stage reads means a slider
+change recomputes just the stages downstream of it. Entries live in
+`st.session_state`, so sessions never share arrays. Eviction is
+least-recently-used by total bytes and entry count.
+
+Cached arrays are marked read-only; copy before drawing on them.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+STAGE_CACHE_MAX_BYTES = 192 * 1024 * 1024
+STAGE_CACHE_MAX_ENTRIES = 32
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def upload_digest(file) -> str:
+    """Digest of an uploaded file's raw bytes (st.file_uploader / st.camera_input)."""
+    return digest_bytes(file.getvalue())
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 64
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+class StageCache:
+    """LRU keyed on (stage, digest, params) and bounded by total array bytes."""
+
+    def __init__(self, max_bytes=STAGE_CACHE_MAX_BYTES, max_entries=STAGE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_or_compute(self, stage: str, digest: str, params: tuple, compute):
+        """Return the cached output for this stage/input/params, computing it on a miss."""
+        key = (stage, digest, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key][0]
+            self._stats["misses"] += 1
+
+        value = _freeze(compute())
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats["evictions"] += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "mb": round(self._bytes / 2 ** 20, 1)}
+
+
+def session_cache() -> StageCache:
+    """The current Streamlit session's stage cache, created on first use."""
+    import streamlit as st
+
+    if "_stage_cache" not in st.session_state:
+        st.session_state["_stage_cache"] = StageCache()
+    return st.session_state["_stage_cache"]
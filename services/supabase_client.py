@@ -1,10 +1,110 @@
+import threading
+import time
+
 import streamlit as st
 from supabase import Client, create_client
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
+HEALTH_INTERVAL = 30.0
+HEALTH_TIMEOUT = 5.0
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Client:
+    """
+    Process-wide Supabase client, created on first use rather than at import
+    so importing this module never touches secrets or the network.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+        return _client
+
+
+def __getattr__(name):
+    # Backwards compatible `from services.supabase_client import supabase`
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(name)
+
+
+class HealthMonitor:
+    """
+    Probes Supabase on a background thread every `interval` seconds and keeps
+    the latest result, so reruns read a cached status instead of waiting on a
+    network round trip.
+    """
+
+    def __init__(self, interval=HEALTH_INTERVAL, probe=None):
+        self.interval = interval
+        self._probe = probe or self._default_probe
+        self._status = {"ok": None, "checked_at": None, "latency_ms": None, "error": None}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = None  # the probe thread of the last check, possibly still hung
+        self._pending_since = None
+        self._thread = threading.Thread(target=self._run, name="supabase-health", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _default_probe():
+        get_client().table("profiles").select("id").limit(1).execute()
+
+    def _check(self):
+        if self._pending is not None and self._pending.is_alive():
+            # The last probe is still hung: report it rather than stack another thread behind it
+            with self._lock:
+                self._status = {
+                    **self._status,
+                    "ok": False,
+                    "checked_at": time.time(),
+                    "error": f"Probe still unanswered after {time.perf_counter() - self._pending_since:.0f}s",
+                }
+            return
+
+        start = time.perf_counter()
+        result = {"ok": True, "error": None}
+        # Run the probe on its own thread so a hung connection cannot stall the monitor
+        done = threading.Event()
+
+        def probe():
+            try:
+                self._probe()
+            except Exception as e:
+                result.update(ok=False, error=f"{type(e).__name__}: {e}")
+            finally:
+                done.set()
+
+        self._pending = threading.Thread(target=probe, name="supabase-health-probe", daemon=True)
+        self._pending_since = start
+        self._pending.start()
+        if not done.wait(HEALTH_TIMEOUT):
+            result.update(ok=False, error=f"Timed out after {HEALTH_TIMEOUT:.0f}s")
+        with self._lock:
+            self._status = {
+                **result,
+                "checked_at": time.time(),
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    def _run(self):
+        while True:
+            self._check()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Ask for an immediate re-probe; the result arrives asynchronously."""
+        self._wake.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self._status)
+
 
-supabase: Client = create_client(
-    SUPABASE_URL,
-    SUPABASE_KEY,
-)
\ No newline at end of file
+@st.cache_resource
+def get_health_monitor() -> HealthMonitor:
+    """One monitor per process, shared by every session."""
+    return HealthMonitor()
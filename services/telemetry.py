@@ -0,0 +1,187 @@
+"""
+Buffered telemetry writer for `public.analytics_events`.
+
+`emit()` only appends to a bounded in-memory queue and never blocks; a
+background thread drains it in bulk inserts whenever `batch_size` events are
+waiting or `flush_interval` seconds have passed. When the queue is full new
+events are dropped and counted, so telemetry cannot add latency to a
+request. Without Supabase credentials and an owner id the buffer is
+disabled and every call is a no-op.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+
+try:
+    from streamlit.runtime.scriptrunner_utils.exceptions import ScriptControlException
+except ImportError:  # older Streamlit, or none installed
+    try:
+        from streamlit.runtime.scriptrunner.script_runner import ScriptControlException
+    except ImportError:
+        class ScriptControlException(BaseException):
+            pass
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name):
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        return st.secrets.get(name)
+    except Exception:
+        return None
+
+
+def _supabase_client(url, key):
+    from supabase import create_client
+    return create_client(url, key)
+
+
+def streamlit_session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+
+class EventBuffer:
+    def __init__(self, client_factory=None, owner_id=None, project_id=None,
+                 max_queue=10_000, batch_size=200, flush_interval=5.0):
+        self.enabled = client_factory is not None and bool(owner_id)
+        self.owner_id = owner_id
+        self.project_id = project_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._client_factory = client_factory
+        self._client = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wake = threading.Event()
+        self._stats = {"emitted": 0, "dropped": 0, "sent": 0, "failed": 0, "flushes": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def emit(self, event_name: str, category: str = None, properties: dict = None,
+             session_id: str = None, analysis_id: str = None):
+        if not self.enabled:
+            return
+        event = {
+            "owner_id": self.owner_id,
+            "project_id": self.project_id,
+            "analysis_id": analysis_id,
+            "event_name": event_name,
+            "event_category": category,
+            "session_id": session_id,
+            "properties": properties or {},
+            "occurred_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["emitted"] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _drain(self) -> list:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Send everything currently queued. Called from the flush thread and at exit."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            try:
+                if self._client is None:
+                    self._client = self._client_factory()
+                self._client.table("analytics_events").insert(batch).execute()
+                with self._lock:
+                    self._stats["sent"] += len(batch)
+                    self._stats["flushes"] += 1
+            except Exception as e:
+                # Telemetry is best-effort: count the loss and move on
+                logger.warning("dropping %d telemetry event(s): %s", len(batch), e)
+                with self._lock:
+                    self._stats["failed"] += len(batch)
+                return
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "queued": self._queue.qsize(), "enabled": self.enabled}
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> EventBuffer:
+    """Process-wide buffer configured from env vars or Streamlit secrets."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            url, key = _setting("SUPABASE_URL"), _setting("SUPABASE_SERVICE_KEY")
+            factory = partial(_supabase_client, url, key) if url and key else None
+            _buffer = EventBuffer(factory, _setting("CV_OWNER_ID"), _setting("CV_PROJECT_ID"))
+        return _buffer
+
+
+def emit(event_name: str, category: str = None, properties: dict = None, **kwargs):
+    get_buffer().emit(event_name, category, properties, **kwargs)
+
+
+@contextmanager
+def track(module: str, **properties):
+    """
+    Emit detection_started / detection_completed (or detection_failed) around
+    a block, with latency. Keys set on the yielded dict (box counts, cache
+    hits, …) are added to the completion event. st.stop()/st.rerun() inside
+    the block pass straight through without either end event.
+    """
+    session_id = streamlit_session_id()
+    emit("detection_started", "detection", {"module": module, **properties}, session_id=session_id)
+    extra = {}
+    start = time.perf_counter()
+    try:
+        yield extra
+    except ScriptControlException:
+        raise
+    except Exception as e:
+        emit("detection_failed", "detection",
+             {"module": module, **properties, "error": type(e).__name__,
+              "latency_ms": round((time.perf_counter() - start) * 1000, 1)},
+             session_id=session_id)
+        raise
+    emit("detection_completed", "detection",
+         {"module": module, **properties, **extra,
+          "latency_ms": round((time.perf_counter() - start) * 1000, 1)},
+         session_id=session_id)
@@ -0,0 +1,135 @@
+"""
+Tiled (SAHI-style) inference for small objects in large images.
+
+A remote detector downsamples its input to the model resolution, so an
+object a few dozen pixels wide in a 12 MP photo disappears. `run_tiled`
+cuts the image into overlapping tiles no larger than the model input,
+skips tiles that are nearly uniform (sky, walls, water), sends the rest
+concurrently under a bounded in-flight limit, shifts each tile's
+predictions back to image coordinates and merges duplicates along the seams
+with class-aware NMS. An optional full-image pass keeps objects larger than
+a tile.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from services.inference_client import redact
+from services.nms import nms_predictions
+from services.profiling import bind
+
+DEFAULT_TILE = 640
+DEFAULT_OVERLAP = 0.2
+DEFAULT_MIN_STD = 4.0  # grey-level std below which a tile is considered empty
+DEFAULT_MAX_IN_FLIGHT = 4
+_VARIANCE_MAX_SIDE = 1024
+
+
+def _starts(length: int, tile: int, stride: int) -> list:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    return starts + [length - tile]  # last tile flush with the edge
+
+
+def plan_tiles(width: int, height: int, tile: int = DEFAULT_TILE, overlap: float = DEFAULT_OVERLAP) -> list:
+    """(x0, y0, x1, y1) boxes covering the image with `overlap` (fraction of `tile`) between neighbours."""
+    stride = max(1, int(tile * (1 - overlap)))
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in _starts(height, tile, stride)
+        for x in _starts(width, tile, stride)
+    ]
+
+
+def tile_std(image: Image.Image, tiles: list) -> np.ndarray:
+    """Grey-level standard deviation of each tile, measured on a downscaled copy."""
+    scale = min(1.0, _VARIANCE_MAX_SIDE / max(image.size))
+    small = image.convert("L")
+    if scale < 1.0:
+        small = small.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.BILINEAR)
+    gray = np.asarray(small, dtype=np.float32)
+    stds = []
+    for x0, y0, x1, y1 in tiles:
+        crop = gray[int(y0 * scale):max(int(y0 * scale) + 1, int(y1 * scale)),
+                    int(x0 * scale):max(int(x0 * scale) + 1, int(x1 * scale))]
+        stds.append(float(crop.std()))
+    return np.array(stds)
+
+
+def plan_requests(image: Image.Image, tile: int = DEFAULT_TILE, overlap: float = DEFAULT_OVERLAP,
+                  min_std: float = DEFAULT_MIN_STD, full_pass: bool = True) -> tuple:
+    """
+    (all tiles, boxes actually sent) for `run_tiled`; None in the second list
+    stands for the full-image pass. Lets callers price a run before making it.
+    """
+    tiles = plan_tiles(image.width, image.height, tile, overlap)
+    stds = tile_std(image, tiles)
+    jobs = [t for t, s in zip(tiles, stds) if s >= min_std]
+    if full_pass and len(tiles) > 1:
+        jobs.append(None)
+    return tiles, jobs
+
+
+def _offset(predictions: list, x0: int, y0: int) -> list:
+    return [{**p, "x": p["x"] + x0, "y": p["y"] + y0} for p in predictions]
+
+
+def run_tiled(image: Image.Image, infer, tile: int = DEFAULT_TILE, overlap: float = DEFAULT_OVERLAP,
+              max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, min_std: float = DEFAULT_MIN_STD,
+              full_pass: bool = True, merge_iou: float = 0.5, on_progress=None, plan: tuple = None) -> tuple:
+    """
+    Run `infer(PIL image, box) -> predictions` (centre-format, in that
+    image's pixels) over overlapping tiles and merge the results; `box` is
+    the tile's (x0, y0, x1, y1), or None for the full-image pass.
+    `on_progress(merged_so_far, done, total)` is called from the calling
+    thread as each tile finishes, for streaming partial results. `plan` is a
+    `plan_requests` result the caller already has (e.g. from pricing the run).
+    Returns (predictions in original pixels, stats dict).
+    """
+    start = time.perf_counter()
+    tiles, jobs = plan or plan_requests(image, tile, overlap, min_std, full_pass)
+    send = [t for t in jobs if t is not None]
+
+    image.load()  # decode once up front; worker threads then only crop
+
+    def one(box):
+        # Cropped lazily so at most `max_in_flight` tile copies exist at once
+        t0 = time.perf_counter()
+        preds = infer(image if box is None else image.crop(box), box)
+        return box, preds, (time.perf_counter() - t0) * 1000
+
+    predictions, tile_ms, errors = [], [], []
+    # At most `max_in_flight` requests are outstanding; the rest wait in the pool queue
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="tile") as pool:
+        futures = [pool.submit(bind(one), job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                box, preds, ms = future.result()
+            except Exception as e:
+                errors.append(redact(f"{type(e).__name__}: {e}"))
+                continue
+            predictions += preds if box is None else _offset(preds, box[0], box[1])
+            tile_ms.append(ms)
+            if on_progress is not None:
+                on_progress(nms_predictions(predictions, merge_iou, class_aware=True), done, len(jobs))
+
+    if errors and not tile_ms:
+        raise RuntimeError(f"All {len(jobs)} tile request(s) failed; first error: {errors[0]}")
+
+    merged = nms_predictions(predictions, merge_iou, class_aware=True)
+    return merged, {
+        "tiles": len(tiles),
+        "sent": len(send),
+        "skipped": len(tiles) - len(send),
+        "full_pass": None in jobs,
+        "requests": len(jobs),
+        "failed": len(errors),
+        "raw_boxes": len(predictions),
+        "merged_boxes": len(merged),
+        "tile_p50_ms": round(float(np.median(tile_ms)), 1) if tile_ms else None,
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,70 @@
+-- Background job queue on top of public.analyses.
+-- Workers (service role) claim queued rows atomically with SKIP LOCKED, so
+-- any number of worker processes can poll without double-processing a job.
+-- A row is only claimable once its input image_metadata row exists, so a
+-- job is never taken between the analyses insert and the metadata insert.
+
+create index analyses_queued_created_at_idx
+on public.analyses(created_at)
+where status = 'queued';
+
+create or replace function public.claim_analyses(
+  p_worker_id text,
+  p_limit integer default 1,
+  p_types text[] default null
+)
+returns setof public.analyses
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  update public.analyses as a
+     set status = 'processing',
+         started_at = now(),
+         error_message = null,
+         parameters = a.parameters || jsonb_build_object('worker_id', p_worker_id)
+   where a.id in (
+     select q.id
+       from public.analyses as q
+      where q.status = 'queued'
+        and (p_types is null or q.analysis_type = any(p_types))
+        and exists (select 1 from public.image_metadata as m where m.analysis_id = q.id)
+      order by q.created_at
+      limit greatest(p_limit, 1)
+      for update skip locked
+   )
+  returning a.*;
+end;
+$$;
+
+-- Put jobs whose worker died mid-run back on the queue.
+create or replace function public.requeue_stale_analyses(p_timeout interval default interval '10 minutes')
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  requeued integer;
+begin
+  update public.analyses
+     set status = 'queued',
+         started_at = null
+   where status = 'processing'
+     and started_at < now() - p_timeout;
+  get diagnostics requeued = row_count;
+  return requeued;
+end;
+$$;
+
+revoke execute on function public.claim_analyses(text, integer, text[]) from public, anon, authenticated;
+revoke execute on function public.requeue_stale_analyses(interval) from public, anon, authenticated;
+grant execute on function public.claim_analyses(text, integer, text[]) to service_role;
+grant execute on function public.requeue_stale_analyses(interval) to service_role;
+
+-- Queued jobs reference their input image in this bucket.
+insert into storage.buckets (id, name, public)
+values ('images', 'images', false)
+on conflict (id) do nothing;
@@ -0,0 +1,21 @@
+import numpy as np
+
+from services.annotate import _label_patch, draw_detections
+
+
+def test_fill_tints_only_box_pixels():
+    img = np.full((40, 60, 3), 100, dtype=np.uint8)
+    draw_detections(img, [[10, 10, 20, 20], [-5, 30, 70, 50]], colors=[(200, 0, 0), (0, 200, 0)],
+                    thickness=1, fill_alpha=0.5)
+    assert (img[15, 15] == [150, 50, 50]).all()
+    assert (img[35, 0] == [50, 150, 50]).all()
+    assert (img[5, 40] == 100).all()
+
+
+def test_label_cache_ignores_scores():
+    _label_patch.cache_clear()
+    img = np.zeros((100, 100, 3), dtype=np.uint8)
+    boxes = [[20, 20, 40, 40]] * 3
+    draw_detections(img, boxes, labels=["car"] * 3, colors=[(255, 0, 0)] * 3, scores=[0.91, 0.52, 0.33])
+    info = _label_patch.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
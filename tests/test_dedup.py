@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+import pytest
+
+from modules.roboflow_detect import _dedup_batch
+from services.dedup import FrameDeduper, change_pct, hamming, signature, signature_bytes
+
+_rng = np.random.default_rng(0)
+FRAME = cv2.GaussianBlur(_rng.integers(0, 256, (96, 128), dtype=np.uint8), (9, 9), 0)
+
+
+def _jpeg(frame) -> bytes:
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+def _run(pairs):
+    for name, loader in pairs:
+        data = loader()
+        yield (name, [{"image": name}], None) if data != b"bad" else (name, None, "decode error")
+
+
+def _batch(items):
+    stats = {"reused": 0}
+    inputs = [(name, lambda data=data: data) for name, data in items]
+    return {name: (preds, err) for name, preds, err in _dedup_batch(inputs, _run, FrameDeduper(), stats)}, stats
+
+
+def test_signature_survives_jpeg_but_sees_a_small_moving_object():
+    sig = signature(FRAME)
+    again = signature_bytes(_jpeg(FRAME))
+    assert hamming(sig.hash, again.hash) <= 4
+    assert change_pct(sig.thumb, signature(FRAME).thumb) == 0
+
+    moved = FRAME.copy()
+    moved[40:56, 60:76] = 255
+    assert change_pct(again.thumb, signature(moved).thumb) > 0.5
+
+
+def test_signature_bytes_rejects_garbage():
+    with pytest.raises(ValueError):
+        signature_bytes(b"not an image")
+
+
+def test_deduper_reuses_near_duplicate_until_context_changes():
+    deduper = FrameDeduper()
+    sig = signature(FRAME)
+    assert deduper.process(sig, lambda: "first", ref=1) == ("first", None)
+    assert deduper.process(signature(FRAME), lambda: "second") == ("first", 1)
+    assert deduper.process(sig, lambda: "third", context="other") == ("third", None)
+
+
+def test_deduper_max_reuse_forces_reprocess():
+    deduper = FrameDeduper(max_reuse=1)
+    sig = signature(FRAME)
+    deduper.store(sig, "a")
+    assert deduper.match(sig) is not None
+    assert deduper.match(sig) is None
+
+
+def test_dedup_batch_follows_leader():
+    results, stats = _batch([("a", _jpeg(FRAME)), ("b", _jpeg(FRAME))])
+    assert results["b"] == ([{"image": "a"}], None)
+    assert stats["reused"] == 1
+
+
+def test_dedup_batch_undecodable_leader_breaks_chain():
+    results, stats = _batch([("a", _jpeg(FRAME)), ("bad", b"bad"), ("c", _jpeg(FRAME))])
+    assert results["bad"] == (None, "decode error")
+    assert results["c"] == ([{"image": "c"}], None)
+    assert stats["reused"] == 0
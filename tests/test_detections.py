@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+
+from services.detections import Detections
+
+PREDICTIONS = [
+    {"x": 10, "y": 10, "width": 4, "height": 4, "class": "car", "confidence": 0.9, "class_id": 3, "model": "a/1"},
+    {"x": 20, "y": 20, "width": 6, "height": 2, "class": "person", "confidence": 0.8},
+]
+
+
+def test_arrow_round_trip_keeps_missing_values_absent():
+    dets = Detections.from_predictions(PREDICTIONS, data_keys=("class_id", "model"))
+    back = Detections.from_arrow(dets.to_arrow())
+    predictions = back.to_predictions()
+    assert predictions[0]["class_id"] == 3 and isinstance(predictions[0]["class_id"], int)
+    assert "class_id" not in predictions[1] and "model" not in predictions[1]
+    json.dumps(predictions, allow_nan=False)
+
+
+def test_to_predictions_skips_nan():
+    dets = Detections(np.zeros((1, 4)), [0.5], [0], ["car"], {"score": np.array([np.nan])})
+    assert "score" not in dets.to_predictions()[0]
+
+
+def test_bytes_round_trip():
+    dets = Detections.from_predictions(PREDICTIONS, data_keys=("class_id", "model"))
+    assert Detections.from_bytes(dets.to_bytes()).to_predictions() == dets.to_predictions()
+
+
+def test_kept_source_survives_filter_and_nms():
+    raw = [
+        {"x": 10.123, "y": 10, "width": 4, "height": 4, "class": "car", "confidence": 0.91234,
+         "detection_id": "a", "points": [{"x": 1, "y": 2}]},
+        {"x": 10.2, "y": 10, "width": 4, "height": 4, "class": "car", "confidence": 0.5, "detection_id": "b"},
+        {"x": 50, "y": 50, "width": 4, "height": 4, "class": "dog", "confidence": 0.2, "detection_id": "c"},
+    ]
+    dets = Detections.from_predictions(raw, keep_source=True).filter(min_confidence=0.3).nms(0.5)
+    assert dets.to_predictions() == [raw[0]]
+    assert Detections.concat([dets, dets]).to_predictions() == [raw[0], raw[0]]
+    assert Detections.from_arrow(dets.to_arrow()).to_predictions()[0]["x"] == 10.12
@@ -0,0 +1,97 @@
+import socket
+import time
+import types
+
+import pytest
+import requests
+
+from services import inference_client
+from services.inference_client import InferenceClient
+from tools import roboflow_stub
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping."""
+    delays = []
+    fake_time = types.SimpleNamespace(perf_counter=time.perf_counter, time=time.time, sleep=delays.append)
+    monkeypatch.setattr(inference_client, "time", fake_time)
+    return delays
+
+
+def _stub(**kwargs):
+    server = roboflow_stub.serve(0, **kwargs)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/coco/3"
+
+
+def _post(client, url, **kwargs):
+    return client.post(url, endpoint="test", json={}, **kwargs)
+
+
+def test_retries_429_and_503_then_succeeds(sleeps):
+    server, url = _stub(script=[429, 503])
+    client = InferenceClient(max_retries=3, backoff_base=0.01)
+    resp = _post(client, url)
+    assert resp.status_code == 200
+    assert server.RequestHandlerClass.served == 3
+    assert len(sleeps) == 2
+    assert client.stats()["test"]["retries"] == 2
+    server.shutdown()
+
+
+def test_gives_up_after_max_retries(sleeps):
+    server, url = _stub(script=[503] * 5)
+    client = InferenceClient(max_retries=2, backoff_base=0.01)
+    assert _post(client, url).status_code == 503
+    assert server.RequestHandlerClass.served == 3
+    server.shutdown()
+
+
+def test_per_endpoint_retry_budget(sleeps):
+    server, url = _stub(script=[429, 429, 429])
+    client = InferenceClient(max_retries=3, backoff_base=0.01, retries={"test": 0})
+    assert _post(client, url).status_code == 429
+    assert server.RequestHandlerClass.served == 1
+    server.shutdown()
+
+
+def test_server_error_is_not_retried(sleeps):
+    server, url = _stub(script=[500])
+    client = InferenceClient(max_retries=3, backoff_base=0.01)
+    assert _post(client, url).status_code == 500
+    assert server.RequestHandlerClass.served == 1
+    assert sleeps == []
+    server.shutdown()
+
+
+def test_read_timeout_is_not_retried(sleeps):
+    server, url = _stub(latency_ms=300)
+    client = InferenceClient(max_retries=3, backoff_base=0.01)
+    with pytest.raises(requests.ReadTimeout):
+        _post(client, url, timeout=0.05)
+    assert server.RequestHandlerClass.served == 1
+    assert sleeps == []
+    assert client.stats()["test"]["errors"] == 1
+    server.shutdown()
+
+
+def test_connection_error_is_retried(sleeps):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # closed once the block exits, so connections are refused
+    client = InferenceClient(max_retries=2, backoff_base=0.01)
+    with pytest.raises(requests.ConnectionError):
+        _post(client, f"http://127.0.0.1:{port}/coco/3", timeout=1)
+    assert len(sleeps) == 2
+
+
+def test_backoff_is_capped_and_honours_retry_after():
+    client = InferenceClient(backoff_base=0.5, backoff_max=2.0)
+    assert all(0 <= client._backoff(attempt) <= 2.0 for attempt in range(10))
+
+    class Resp:
+        headers = {"Retry-After": "1.5"}
+
+    assert client._backoff(0, Resp()) >= 1.5
+    Resp.headers = {"Retry-After": "60"}
+    assert client._backoff(0, Resp()) == 2.0
@@ -0,0 +1,25 @@
+import pytest
+
+from services.live import parse_capture_source
+
+
+def test_device_index_always_allowed():
+    assert parse_capture_source(" 1 ") == 1
+
+
+def test_allowlisted_stream_urls():
+    assert parse_capture_source("http://cam.local/video.mjpg", {"cam.local"}) == "http://cam.local/video.mjpg"
+    assert parse_capture_source("rtsp://10.0.0.5:554/s", {"10.0.0.5:554"}) == "rtsp://10.0.0.5:554/s"
+
+
+@pytest.mark.parametrize("text, hosts", [
+    ("http://169.254.169.254/latest/meta-data", set()),
+    ("/dev/video0", {"cam.local"}),
+    ("file:///etc/passwd", {"cam.local"}),
+    ("http://cam.local@internal/", {"cam.local"}),
+    ("http://cam.local:9000/", {"cam.local:8080"}),
+    ("-1", set()),
+])
+def test_rejects_unlisted_sources(text, hosts):
+    with pytest.raises(ValueError):
+        parse_capture_source(text, hosts)
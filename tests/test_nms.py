@@ -0,0 +1,24 @@
+import numpy as np
+
+from services.nms import batched_nms, nms_predictions
+
+
+def test_batched_nms_keeps_groups_apart_with_negative_coordinates():
+    boxes = [[0, 0, 30, 30], [-31, -31, -1, -1]]
+    keep = batched_nms(boxes, [0.9, 0.8], [0, 1], 0.3)
+    assert sorted(keep.tolist()) == [0, 1]
+
+
+def test_batched_nms_suppresses_within_group():
+    boxes = np.array([[-20, -20, 10, 10], [-19, -19, 11, 11], [-20, -20, 10, 10]])
+    keep = batched_nms(boxes, [0.5, 0.9, 0.7], ["a", "a", "b"], 0.5)
+    assert sorted(keep.tolist()) == [1, 2]
+
+
+def test_nms_predictions_class_aware_at_image_edge():
+    preds = [
+        {"x": -5, "y": -5, "width": 20, "height": 20, "class": "car", "confidence": 0.9},
+        {"x": -5, "y": -5, "width": 20, "height": 20, "class": "person", "confidence": 0.8},
+    ]
+    assert len(nms_predictions(preds, 0.5, class_aware=True)) == 2
+    assert len(nms_predictions(preds, 0.5, class_aware=False)) == 1
@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from services import profiling
+
+
+def _send(n):
+    profiling.payload("upload_bytes", n)
+
+
+def test_bound_workers_record_into_callers_profile():
+    profile = profiling.start_run("test")
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(profiling.bind(_send), [10] * 40))
+            pool.submit(_send, 5).result()  # unbound: no profile on the worker thread
+    finally:
+        profiling.end_run()
+    assert profile.payloads == {"upload_bytes": 400}
+
+
+def test_bind_without_profile_is_passthrough():
+    assert profiling.bind(_send) is _send
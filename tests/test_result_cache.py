@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from services import result_cache
+from services.result_cache import ResultCache, image_digest, supabase_lookup
+
+PREDICTIONS = [{"x": 1, "y": 2, "width": 3, "height": 4, "class": "car", "confidence": 0.9}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_image_digest_depends_on_pixels_not_encoding():
+    pixels = np.zeros((4, 4, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    assert image_digest(image) == image_digest(Image.fromarray(pixels.copy()))
+    pixels[0, 0] = 1
+    assert image_digest(image) != image_digest(Image.fromarray(pixels))
+
+
+def test_memory_then_disk_tiers(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    cache = ResultCache(path, mem_entries=1)
+    cache.put("a", PREDICTIONS)
+    cache.put("b", [])
+    assert cache.get("b") == []
+    assert cache.get("a") == PREDICTIONS  # evicted from memory, served from SQLite
+    assert ResultCache(path).get("a") == PREDICTIONS  # survives a new process-wide instance
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["disk_entries"]) == (1, 1, 2)
+
+
+def test_ttl_expiry(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "r.sqlite"), ttl=60)
+    cache.put("a", PREDICTIONS)
+    clock[0] += 61
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_evicts_least_recently_accessed(tmp_path, clock):
+    size = len(json.dumps(PREDICTIONS, separators=(",", ":")))
+    cache = ResultCache(str(tmp_path / "r.sqlite"), mem_entries=1, max_bytes=2 * size)
+    for key in ("a", "b"):
+        cache.put(key, PREDICTIONS)
+        clock[0] += 1
+    cache.get("a")  # disk hit refreshes "a"
+    clock[0] += 1
+    cache.put("c", PREDICTIONS)
+    assert cache.contains("a") and cache.contains("c")
+    assert not cache.contains("b")
+
+
+def test_remote_tier_writes_back(tmp_path):
+    cache = ResultCache(str(tmp_path / "r.sqlite"))
+    assert cache.get("a", remote=lambda: None) is None
+    assert cache.get("a", remote=lambda: PREDICTIONS) == PREDICTIONS
+    assert cache.get("a", remote=lambda: pytest.fail("local tiers should hit")) == PREDICTIONS
+    assert cache.stats()["remote_hits"] == 1
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows, self.filters = rows, {}
+        self.not_ = self
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def is_(self, column, value):
+        return self
+
+    def execute(self):
+        self.data = [r for r in self.rows if all(r.get(k) == v for k, v in self.filters.items())]
+        return self
+
+
+def _row(owner, side=(1280, 960), model="cars/2", status="completed"):
+    return {"owner_id": owner, "checksum_sha256": "d", "analysis_id": "x", "width": side[0], "height": side[1],
+            "analyses": {"status": status, "model_name": model, "parameters": {"confidence": 40},
+                         "results": {"predictions": PREDICTIONS}}}
+
+
+def test_supabase_lookup_is_scoped_to_owner_and_settings():
+    assert supabase_lookup(_Query([_row("other")]), "me", "d", "cars", "2", 40, 1280) is None
+    assert supabase_lookup(_Query([_row("me", status="failed")]), "me", "d", "cars", "2", 40, 1280) is None
+    assert supabase_lookup(_Query([_row("me", side=(4000, 3000))]), "me", "d", "cars", "2", 40, 4000) is None
+    assert supabase_lookup(_Query([_row("me")]), "me", "d", "cars", "2", 40, 1280) == PREDICTIONS
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from services import single_flight
+from services.single_flight import RateLimited, RateLimiter, SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flights, release, calls = SingleFlight(), threading.Event(), []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", slow))) for _ in range(4)]
+    threads[0].start()
+    while not flights.in_flight("k"):
+        pass
+    for t in threads[1:]:
+        t.start()
+    while flights.in_flight("k") < 4:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 3
+    assert flights.stats() == {"calls": 1, "shared": 3, "failed": 0, "in_flight": 0}
+
+
+def test_error_reaches_waiters_and_key_is_released():
+    flights, release = SingleFlight(), threading.Event()
+
+    def boom():
+        release.wait(5)
+        raise ValueError("upstream")
+
+    errors = []
+
+    def call():
+        try:
+            flights.do("k", boom)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    threads[0].start()
+    while not flights.in_flight("k"):
+        pass
+    threads[1].start()
+    while flights.in_flight("k") < 2:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert errors == ["upstream", "upstream"]
+    assert flights.do("k", lambda: 1) == (1, False)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(single_flight.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_rate_limiter_burst_then_refill(clock):
+    limiter = RateLimiter(6, per=60, burst=2)
+    limiter.acquire("a")
+    limiter.acquire("a")
+    with pytest.raises(RateLimited) as e:
+        limiter.acquire("a")
+    assert e.value.retry_after == pytest.approx(10)
+    limiter.acquire("b", 2)  # buckets are per user
+    clock[0] += 10
+    limiter.acquire("a")
+    assert limiter.remaining("a") == pytest.approx(0)
+
+
+def test_rate_limiter_forgets_least_recent_users(clock):
+    limiter = RateLimiter(1, per=60, max_users=2)
+    for user in ("a", "b", "c"):
+        limiter.acquire(user)
+    assert limiter.remaining("a") == 1  # evicted, so back to a full bucket
+    assert limiter.remaining("c") == 0
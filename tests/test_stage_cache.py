@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from services.stage_cache import StageCache
+
+
+def test_hit_skips_compute_and_freezes_arrays():
+    cache, calls = StageCache(), []
+
+    def compute():
+        calls.append(1)
+        return np.zeros(4)
+
+    first = cache.get_or_compute("gray", "d", (1,), compute)
+    assert cache.get_or_compute("gray", "d", (1,), compute) is first
+    cache.get_or_compute("gray", "d", (2,), compute)  # other params are another entry
+    assert len(calls) == 2
+    with pytest.raises(ValueError):
+        first[0] = 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_evicts_least_recently_used_by_bytes_and_entries():
+    cache = StageCache(max_bytes=3 * 800, max_entries=10)
+    for name in "abc":
+        cache.get_or_compute("s", name, (), lambda: np.zeros(100))
+    cache.get_or_compute("s", "a", (), lambda: pytest.fail("should hit"))
+    cache.get_or_compute("s", "d", (), lambda: np.zeros(100))  # pushes out "b", the least recent
+    assert cache.stats()["evictions"] == 1
+    cache.get_or_compute("s", "a", (), lambda: pytest.fail("should hit"))
+    recomputed = []
+    cache.get_or_compute("s", "b", (), lambda: recomputed.append(1) or np.zeros(1))
+    assert recomputed
+
+    small = StageCache(max_entries=2)
+    for name in "abc":
+        small.get_or_compute("s", name, (), lambda: 0)
+    assert small.stats()["entries"] == 2
+
+
+def test_oversized_value_is_returned_but_not_kept():
+    cache = StageCache(max_bytes=100)
+    value = cache.get_or_compute("s", "d", (), lambda: np.zeros(100))
+    assert value.shape == (100,)
+    assert cache.stats()["entries"] == 0
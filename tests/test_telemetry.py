@@ -0,0 +1,24 @@
+import pytest
+
+from services import telemetry
+
+
+@pytest.fixture
+def events(monkeypatch):
+    seen = []
+    monkeypatch.setattr(telemetry, "emit", lambda name, *a, **k: seen.append(name))
+    return seen
+
+
+def test_track_reports_errors(events):
+    with pytest.raises(ValueError):
+        with telemetry.track("m"):
+            raise ValueError
+    assert events == ["detection_started", "detection_failed"]
+
+
+def test_track_passes_script_control_through(events):
+    with pytest.raises(telemetry.ScriptControlException):
+        with telemetry.track("m"):
+            raise telemetry.ScriptControlException()
+    assert events == ["detection_started"]
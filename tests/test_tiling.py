@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from services.tiling import plan_requests, plan_tiles, run_tiled
+
+
+def _noise(width, height):
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+
+def test_plan_tiles_covers_image_with_edge_flush_tiles():
+    tiles = plan_tiles(1000, 500, tile=400, overlap=0.25)
+    assert {t[0] for t in tiles} == {0, 300, 600}
+    assert {t[1] for t in tiles} == {0, 100}
+    assert all(x1 - x0 == 400 and y1 - y0 == 400 for x0, y0, x1, y1 in tiles)
+    assert plan_tiles(300, 200, tile=400) == [(0, 0, 300, 200)]
+
+
+def test_plan_requests_skips_flat_tiles_and_adds_full_pass():
+    image = _noise(800, 400)
+    image.paste((90, 90, 90), (400, 0, 800, 400))  # right half is uniform
+    tiles, jobs = plan_requests(image, tile=400, overlap=0.0)
+    assert tiles == [(0, 0, 400, 400), (400, 0, 800, 400)]
+    assert jobs == [(0, 0, 400, 400), None]
+    assert plan_requests(image, tile=400, overlap=0.0, full_pass=False)[1] == [(0, 0, 400, 400)]
+
+
+def test_run_tiled_offsets_and_merges_seam_duplicates():
+    image = _noise(800, 400)
+
+    def infer(crop, box):
+        # One object at x=395 in image pixels; every tile containing it sees it, slightly jittered
+        if box is None or not box[0] <= 395 < box[2]:
+            return []
+        return [{"x": 395 - box[0] + (2 if box[0] else 0), "y": 50, "width": 40, "height": 40,
+                 "class": "car", "confidence": 0.6 if box[0] else 0.9}]
+
+    predictions, stats = run_tiled(image, infer, tile=400, overlap=0.5, max_in_flight=2)
+    assert len(predictions) == 1
+    assert predictions[0]["confidence"] == 0.9 and predictions[0]["x"] == 395
+    assert stats["tiles"] == 3 and stats["requests"] == 4 and stats["full_pass"]
+    assert stats["raw_boxes"] == 2 and stats["merged_boxes"] == 1
+
+
+def test_run_tiled_reports_partial_failures_and_raises_when_all_fail():
+    image = _noise(800, 400)
+
+    def flaky(crop, box):
+        if box is not None and box[0] > 0:
+            raise ConnectionError("reset")
+        return []
+
+    _, stats = run_tiled(image, flaky, tile=400, overlap=0.0)
+    assert stats["failed"] == 1 and stats["requests"] == 3
+
+    def broken(crop, box):
+        raise ConnectionError("down")
+
+    with pytest.raises(RuntimeError, match="All 3 tile request"):
+        run_tiled(image, broken, tile=400, overlap=0.0)
@@ -0,0 +1,149 @@
+"""
+Headless rerun benchmark: drives each module's render() through Streamlit's
+AppTest with synthetic uploads and reports cold-start and rerun latency plus
+per-stage timings from services.profiling.
+
+    python tools/benchmark_app.py --size 1920x1080 --reruns 5 --out bench.json
+
+Remote modules run against tools/roboflow_stub.py on a local port, so no
+API keys or network access are needed.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image
+
+MODULES = ["modules.face_detect", "modules.motion", "modules.roboflow_detect", "modules.gemini3_flash_app"]
+
+
+def _bench_script(module_name, images_b64):
+    # Runs inside AppTest: every st.file_uploader returns a synthetic image
+    import base64
+    import io
+
+    import streamlit as st
+
+    from services import profiling
+
+    class _Upload(io.BytesIO):
+        def __init__(self, data, name):
+            super().__init__(data)
+            self.name = name
+
+    def file_uploader(label, *args, key=None, **kwargs):
+        data = base64.b64decode(images_b64[1 if key == "motion_b" else 0])
+        return _Upload(data, "synthetic.png")
+
+    st.file_uploader = file_uploader
+
+    profile = profiling.start_run(module_name)
+    try:
+        with profiling.stage("import"):
+            module = profiling.timed_import(module_name)
+        with profiling.stage("render"):
+            module.render()
+    finally:
+        profiling.end_run()
+        st.session_state.setdefault("_bench_profiles", []).append(profile.as_dict())
+
+
+def synthetic_image(width, height, seed=0, shift=0) -> bytes:
+    """Smooth gradients plus a few solid shapes; `shift` moves the shapes (for motion)."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = np.stack([xx * 255 // max(width - 1, 1), yy * 255 // max(height - 1, 1),
+                    (xx + yy) * 255 // max(width + height - 2, 1)], axis=-1).astype(np.uint8)
+    for _ in range(6):
+        x, y = rng.integers(0, width - width // 8), rng.integers(0, height - height // 8)
+        img[y:y + height // 10, x + shift:x + shift + width // 10] = rng.integers(0, 255, 3)
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def bench_module(module_name, images_b64, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(_bench_script, args=(module_name, images_b64), default_timeout=300)
+    for key in ("ROBOFLOW_API_KEY", "GOOGLE_API_KEY"):
+        at.secrets[key] = "bench"
+
+    start = time.perf_counter()
+    at.run()
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    # Remote modules only call out when "Run Detection" is clicked
+    run_buttons = [b for b in at.button if b.label.startswith("Run")]
+    warm = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        if run_buttons:
+            run_buttons[0].click()
+        at.run()
+        warm.append((time.perf_counter() - start) * 1000)
+        run_buttons = [b for b in at.button if b.label.startswith("Run")]
+
+    profiles = at.session_state["_bench_profiles"] if "_bench_profiles" in at.session_state else []
+    stages = {}
+    for profile in profiles[1:]:
+        for s in profile["stages"]:
+            stages.setdefault(s["stage"], []).append(s["ms"])
+
+    return {
+        "cold_ms": round(cold_ms, 1),
+        "rerun_p50_ms": round(statistics.median(warm), 1) if warm else None,
+        "rerun_max_ms": round(max(warm), 1) if warm else None,
+        "stage_p50_ms": {k: round(statistics.median(v), 2) for k, v in stages.items()},
+        "payloads": profiles[-1]["payloads"] if profiles else {},
+        "exceptions": [e.value for e in at.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module reruns headlessly via AppTest.")
+    parser.add_argument("--size", default="1280x720", help="Synthetic image size WxH")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--modules", nargs="*", default=MODULES)
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    import roboflow_stub
+    server = roboflow_stub.serve(0)
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("ROBOFLOW_INFER_URL", stub_url)
+    os.environ.setdefault("ROBOFLOW_WORKFLOW_URL", stub_url)
+    os.environ.setdefault("CV_CACHE_DIR", tempfile.mkdtemp(prefix="cv-bench-"))
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    images_b64 = [
+        base64.b64encode(synthetic_image(width, height, seed=1)).decode(),
+        base64.b64encode(synthetic_image(width, height, seed=1, shift=width // 20)).decode(),
+    ]
+
+    from services import profiling
+    report = {"size": args.size, "reruns": args.reruns, "modules": {}}
+    for name in args.modules:
+        report["modules"][name] = bench_module(name, images_b64, args.reruns)
+    report["imports"] = profiling.IMPORT_TIMES
+    server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Local stub of the Roboflow infer and workflow endpoints for offline testing.
+
+    python tools/roboflow_stub.py --port 9001 --fail-rate 0.2 --latency-ms 150
+
+then point the app at it:
+
+    ROBOFLOW_INFER_URL=http://127.0.0.1:9001 \
+    ROBOFLOW_WORKFLOW_URL=http://127.0.0.1:9001 streamlit run app.py
+
+`POST /<model>/<version>` answers like detect.roboflow.com and
+`POST /<workspace>/workflows/<id>` like serverless.roboflow.com. A fraction
+of requests (--fail-rate) get a 429 or 503 so retry/backoff can be exercised;
+`serve(script=[...])` instead answers the first requests with the listed
+statuses, for deterministic tests.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_PREDICTIONS = [
+    {"x": 120.0, "y": 140.0, "width": 80.0, "height": 160.0, "confidence": 0.91, "class": "person"},
+    {"x": 320.0, "y": 200.0, "width": 140.0, "height": 90.0, "confidence": 0.78, "class": "car"},
+    {"x": 330.0, "y": 205.0, "width": 130.0, "height": 85.0, "confidence": 0.55, "class": "car"},
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    latency_ms = 0.0
+    script = ()
+    served = 0  # per server; requests_seen counts across all of them
+    requests_seen = 0
+    _lock = threading.Lock()
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        with StubHandler._lock:
+            StubHandler.requests_seen += 1
+            type(self).served += 1
+            seen = type(self).served
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if seen <= len(self.script):
+            status = self.script[seen - 1]
+            if status != 200:
+                headers = {"Retry-After": "0"} if status in (429, 503) else None
+                return self._send(status, {"message": f"Scripted {status}"}, headers)
+        elif random.random() < self.fail_rate:
+            if random.random() < 0.5:
+                return self._send(429, {"message": "Rate limited"}, {"Retry-After": "0"})
+            return self._send(503, {"message": "Service unavailable"})
+
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if len(parts) == 3 and parts[1] == "workflows":
+            return self._send(200, {"outputs": [{"predictions": {"predictions": STUB_PREDICTIONS}}]})
+        if len(parts) == 2:
+            return self._send(200, {"predictions": STUB_PREDICTIONS, "image": {"width": 640, "height": 480}})
+        self._send(404, {"message": f"Unknown route {self.path}"})
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(port=0, fail_rate=0.0, latency_ms=0.0, script=()):
+    """
+    Start the stub on a background thread; returns the server (use
+    `.server_address`). `server.RequestHandlerClass.served` counts this
+    server's requests.
+    """
+    handler = type("Handler", (StubHandler,), {"fail_rate": fail_rate, "latency_ms": latency_ms,
+                                               "script": tuple(script), "served": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.fail_rate, args.latency_ms)
+    print(f"Roboflow stub listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()